@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,126 @@ CORS_ALLOW_METHODS = [
 # Optional: Configure maximum upload size
 DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
+# Uploads are hashed while they are received; files above FILE_UPLOAD_MAX_MEMORY_SIZE
+# are spooled to a temporary file that is moved into UPLOAD_DIR instead of copied
+FILE_UPLOAD_HANDLERS = [
+    'loan_analyzer.utils.uploads.HashingMemoryFileUploadHandler',
+    'loan_analyzer.utils.uploads.HashingTemporaryFileUploadHandler',
+]
+# FILE_UPLOAD_TEMP_DIR = '/path/on/the/same/filesystem/as/UPLOAD_DIR'
+
+# Stored uploads older than UPLOAD_RETENTION_SECONDS are removed, then the oldest
+# ones until UPLOAD_DIR fits in UPLOAD_MAX_BYTES; files of pending jobs are kept.
+UPLOAD_DIR = BASE_DIR.parent / 'data'
+UPLOAD_MAX_BYTES = 2 * 1024 * 1024 * 1024
+UPLOAD_RETENTION_SECONDS = 24 * 3600
+# Files from this size on are queued as analysis jobs even without async=true
+UPLOAD_ASYNC_MIN_BYTES = 20 * 1024 * 1024
+
+# Load the analysis modules and fraud models at startup (LOAN_ANALYZER_PREWARM=1)
+# instead of on the first analysis request; they are loaded once per worker either way
+ANALYSIS_PREWARM = os.environ.get('LOAN_ANALYZER_PREWARM') == '1'
+
+# Fraud model registry
+# To serve several versions side by side:
+# FRAUD_MODEL_VERSIONS = {
+#     'v1': {'model_path': '/path/to/model.pkl', 'columns_path': '/path/to/column_names.pkl'},
+#     'v2': {'bundle_path': '/path/to/bundle'},  # written by `manage.py export_model`
+# }
+# FRAUD_MODEL_DEFAULT_VERSION = 'v1'
+FRAUD_MODEL_RELOAD_INTERVAL = 5  # seconds between checks for a changed model pickle
+# FRAUD_MODEL_N_JOBS = -1  # override the pickled forest's n_jobs (e.g. -1 for all cores)
+# Inference backend: 'sklearn', 'compiled' (flattened NumPy forest) or 'auto'
+# (compiled for batches up to FRAUD_COMPILED_MAX_ROWS rows, sklearn above)
+FRAUD_INFERENCE_BACKEND = 'auto'
+FRAUD_COMPILED_MAX_ROWS = 1000
+
+# Background analysis jobs (POST /api/upload/ with async=true)
+ANALYSIS_JOB_WORKERS = 2  # maximum number of statements analyzed at once
+ANALYSIS_JOB_HEARTBEAT = 30  # seconds between heartbeats of a running job
+ANALYSIS_JOB_TIMEOUT = 300  # seconds without a heartbeat after which a running job is requeued at startup
+
+# Async uploads (POST /api/upload/concurrent/ under an ASGI server) analyze statements
+# on a process pool; requests beyond ANALYSIS_PROCESS_MAX_PENDING statements get a 503
+ANALYSIS_PROCESS_WORKERS = 2
+ANALYSIS_PROCESS_MAX_PENDING = 8
+ANALYSIS_RETRY_AFTER = 5  # seconds, sent as Retry-After with the 503
+
+# Streamed uploads (POST /api/upload/stream/) score a PDF statement in batches of
+# ANALYSIS_STREAM_BATCH_SIZE transactions; velocity windows reach back one batch
+ANALYSIS_STREAM_BATCH_SIZE = 500
+
+# PDF text extraction
+# Statements with at least PDF_PARALLEL_MIN_PAGES pages are extracted page-parallel
+# on PDF_EXTRACT_WORKERS processes (defaults to min(4, CPU count); 1 disables it).
+PDF_PARALLEL_MIN_PAGES = 8
+# 'table' reads statements laid out as a table (header row with date, description,
+# debit/credit and balance columns) cell by cell and falls back to 'text', the
+# line-by-line regex parser, when no table header is found on the first page
+PDF_EXTRACTION_ENGINE = 'table'
+# Pages without a text layer (scanned statements) are rendered with pypdfium2 and
+# read with tesseract through pytesseract, when both are installed. OCR runs on its
+# own pool of OCR_WORKERS processes with a budget of OCR_PAGE_TIMEOUT seconds per
+# page (plus OCR_RENDER_TIMEOUT to render it); rendered pages are cached by page
+# fingerprint in OCR_IMAGE_CACHE_DIR.
+OCR_ENABLED = True
+OCR_WORKERS = 1
+OCR_PAGE_TIMEOUT = 30
+OCR_RENDER_TIMEOUT = 30
+OCR_DPI = 300
+OCR_LANGUAGE = 'eng'
+# TESSERACT_CMD = '/usr/bin/tesseract'
+OCR_IMAGE_CACHE_DIR = BASE_DIR.parent / 'cache' / 'page_images'
+OCR_IMAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+TABULAR_CHUNK_ROWS = 50000  # rows read at a time from CSV/XLSX statements
+
+# Largest transactions listed per file in upload reports; rank_by is 'amount',
+# 'fraud_probability' or 'balance_difference' (by size; overridable per request)
+REPORT_TOP_K = 5
+REPORT_RANK_BY = 'amount'
+
+# Uploads sent with an account_id are indexed in the Statement and Transaction
+# tables for the /api/accounts/<account_id>/ queries
+STATEMENT_INDEX_BATCH_SIZE = 1000  # transactions per bulk_create batch
+STATEMENT_QUERY_MAX_LIMIT = 1000  # most transactions returned by one query
+
+# Content-addressed cache of analysis results, keyed by the SHA-256 of the uploaded file
+RESULT_CACHE_DIR = BASE_DIR.parent / 'cache' / 'results'
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+RESULT_CACHE_TTL = 7 * 24 * 3600  # seconds
+
+# Incremental analysis: PDF pages are fingerprinted and their transactions, fraud
+# scores and partial summaries cached, so a re-uploaded statement that gained a
+# few pages only extracts and scores the new or changed pages
+INCREMENTAL_ANALYSIS = True
+PAGE_CACHE_DIR = BASE_DIR.parent / 'cache' / 'pages'
+PAGE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Logging: per-page and per-statement analysis details are logged at DEBUG,
+# set LOAN_ANALYZER_LOG_LEVEL=DEBUG to see them
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'default',
+        },
+    },
+    'loggers': {
+        'loan_analyzer': {
+            'handlers': ['console'],
+            'level': os.environ.get('LOAN_ANALYZER_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 # Application definition
 
@@ -101,6 +222,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Analysis job workers write to the same database from several threads
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class LoanAnalyzerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'loan_analyzer'
+
+    def ready(self):
+        # NumPy, pandas, pdfplumber and the fraud model are loaded by the first
+        # analysis, so management commands and health checks start fast;
+        # ANALYSIS_PREWARM loads them at startup instead
+        from .utils.conf import get_setting
+        if get_setting('ANALYSIS_PREWARM', False):
+            from .utils.warmup import prewarm
+            prewarm()
@@ -0,0 +1,129 @@
+import contextlib
+import io
+import re
+import time
+
+from ..utils.extract import parse_transactions
+from ..utils.line_classifier import AMOUNT_PATTERNS, DATE_PATTERNS, TRANSACTION_KEYWORDS, clean_amount
+from .synthetic import statement_lines
+
+
+def legacy_parse_transactions(lines):
+    """
+    The per-line parser as it was before LineClassifier: uncompiled pattern
+    strings, a second findall for the balance and one substring scan per
+    keyword. Kept as the "before" side of the benchmark and as a reference
+    for output parity. Balances are compared separately: the legacy parser
+    carried one seeded balance line by line, parse_transactions reconstructs
+    them per block (see balances.py).
+    """
+    date_pattern = '|'.join(DATE_PATTERNS)
+    amount_pattern = '|'.join(AMOUNT_PATTERNS)
+    current_balance = None
+
+    for line in lines:
+        if not line.strip():
+            continue
+
+        date_match = re.search(date_pattern, line)
+        debit_amount = None
+        credit_amount = None
+        is_debit = 'DR' in line.upper() or '(DR)' in line.upper()
+        is_credit = 'CR' in line.upper() or '(CR)' in line.upper()
+
+        for amount_str in re.findall(amount_pattern, line):
+            amount = clean_amount(amount_str)
+            if amount is not None:
+                if is_debit or '(' in amount_str or amount < 0:
+                    debit_amount = abs(amount)
+                elif is_credit or amount > 0:
+                    credit_amount = abs(amount)
+                else:
+                    credit_amount = abs(amount)
+
+        if not (date_match and (debit_amount is not None or credit_amount is not None)):
+            continue
+
+        line_upper = line.upper()
+        transaction_type = None
+        for type_name, keywords in TRANSACTION_KEYWORDS.items():
+            if any(keyword.upper() in line_upper for keyword in keywords):
+                transaction_type = type_name
+                break
+        if transaction_type is None:
+            transaction_type = 'DEBIT' if debit_amount is not None else 'CASH_IN'
+
+        amount = debit_amount if debit_amount is not None else credit_amount
+        if current_balance is None:
+            balance_matches = re.findall(amount_pattern, line)
+            if balance_matches:
+                current_balance = clean_amount(balance_matches[-1])
+
+        new_balance = current_balance
+        if current_balance is not None:
+            old_balance = current_balance + debit_amount if debit_amount is not None else current_balance - credit_amount
+        else:
+            old_balance = 0
+            new_balance = 0
+
+        yield {
+            'amount': abs(amount),
+            'oldbalanceOrg': old_balance,
+            'newbalanceOrig': new_balance,
+            'oldbalanceDest': 0,
+            'newbalanceDest': 0,
+            'type_CASH_IN': 1 if transaction_type == 'CASH_IN' else 0,
+            'type_CASH_OUT': 1 if transaction_type == 'CASH_OUT' else 0,
+            'type_DEBIT': 1 if transaction_type == 'DEBIT' else 0,
+            'type_PAYMENT': 1 if transaction_type == 'PAYMENT' else 0,
+            'type_TRANSFER': 1 if transaction_type == 'TRANSFER' else 0,
+            'is_large_transaction': abs(amount) >= 5000,
+            'balance_difference': new_balance - old_balance,
+            'transaction_date': date_match.group(0),
+            'description': line.strip()
+        }
+        current_balance = new_balance
+
+
+# Keys whose values depend on how balances are derived rather than on parsing
+_BALANCE_KEYS = ('oldbalanceOrg', 'newbalanceOrig', 'balance_difference', 'balance_mismatch')
+
+
+def _parsed_fields(transaction):
+    return {key: value for key, value in transaction.items() if key not in _BALANCE_KEYS}
+
+
+def _time_parser(parser, lines):
+    # parse_transactions prints its debugging summary; keep it out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = list(parser(lines))
+        elapsed = time.perf_counter() - started
+    return elapsed, result
+
+
+def run_line_parser_benchmark(line_count=100000, repeat=3, seed=0):
+    """
+    Time the legacy and the compiled line parser on the same synthetic
+    statement. Returns lines/sec for both and whether their output matches.
+    """
+    lines = statement_lines(line_count, seed=seed)
+
+    # Alternate the two parsers and keep the best run of each, so noise on a
+    # shared machine affects both sides alike
+    legacy_seconds = compiled_seconds = float('inf')
+    for _ in range(repeat):
+        elapsed, legacy_result = _time_parser(legacy_parse_transactions, lines)
+        legacy_seconds = min(legacy_seconds, elapsed)
+        elapsed, compiled_result = _time_parser(parse_transactions, lines)
+        compiled_seconds = min(compiled_seconds, elapsed)
+
+    return {
+        'lines': line_count,
+        'transactions': len(compiled_result),
+        'legacy_lines_per_sec': line_count / legacy_seconds,
+        'compiled_lines_per_sec': line_count / compiled_seconds,
+        'speedup': legacy_seconds / compiled_seconds,
+        'outputs_match': ([_parsed_fields(transaction) for transaction in legacy_result]
+                          == [_parsed_fields(transaction.to_dict()) for transaction in compiled_result]),
+    }
@@ -0,0 +1,134 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Heavy dependencies that should only be loaded by the first analysis
+HEAVY_MODULES = ('numpy', 'pandas', 'pdfplumber', 'pdfminer', 'sklearn', 'PIL', 'pypdfium2', 'pytesseract')
+
+_IMPORT_TIME = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)')
+
+
+def import_times(importtime_output):
+    """
+    Self import time of every top-level package in the stderr of
+    `python -X importtime`, in ms, slowest first
+    Returns [(package, ms)].
+    """
+    totals = {}
+    for line in importtime_output.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            package = match.group(3).split('.')[0]
+            totals[package] = totals.get(package, 0) + int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def _boot(upload_path=None):
+    """
+    Runs in the profiled child process: boot Django, load the URLconf and
+    send the first requests through the test client
+    The statement is uploaded into a temporary UPLOAD_DIR next to it.
+    Returns timestamps (time.time()) of each step and the heavy modules
+    loaded by then.
+    """
+    import django
+
+    django.setup()
+    setup_done = time.time()
+
+    import importlib
+
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+
+    importlib.import_module(settings.ROOT_URLCONF)
+    urls_done = time.time()
+    heavy_at_boot = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    # Lets the test client send requests to 'testserver' with DEBUG off
+    setup_test_environment()
+    client = Client()
+    response = client.get('/api/metrics/')
+    report = {
+        'setup': setup_done,
+        'urls': urls_done,
+        'first_response': time.time(),
+        'first_response_status': response.status_code,
+        'heavy_at_boot': heavy_at_boot,
+    }
+
+    if upload_path:
+        settings.UPLOAD_DIR = os.path.join(os.path.dirname(upload_path), 'uploads')
+        with open(upload_path, 'rb') as file:
+            response = client.post('/api/upload/', {'files': [file]})
+        report['first_analysis'] = time.time()
+        report['first_analysis_status'] = response.status_code
+    return report
+
+
+def profile_boot(upload=False, prewarm=False):
+    """
+    Start a fresh interpreter with `-X importtime`, boot the project in it
+    and time the first /api/metrics/ response (and, with `upload`, the
+    first /api/upload/ of a one-page statement)
+    `prewarm` sets LOAN_ANALYZER_PREWARM=1 for the child.
+    Returns a dict of ms from process start, the slowest imports and the
+    heavy modules loaded before the first request.
+    """
+    from django.conf import settings
+
+    from .synthetic import statement_pdf
+
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(settings.BASE_DIR), env.get('PYTHONPATH')]))
+    if prewarm:
+        env['LOAN_ANALYZER_PREWARM'] = '1'
+
+    with tempfile.TemporaryDirectory() as directory:
+        command = [sys.executable, '-X', 'importtime', '-m', __name__]
+        if upload:
+            upload_path = os.path.join(directory, 'statement.pdf')
+            statement_pdf(upload_path, page_count=1)
+            command.append(upload_path)
+
+        started = time.time()
+        child = subprocess.run(command, env=env, cwd=str(settings.BASE_DIR), capture_output=True, text=True)
+    if child.returncode != 0:
+        raise RuntimeError(f"Startup profile failed: {child.stderr[-2000:]}")
+
+    # The report is the last line, after anything logged to stdout
+    timestamps = json.loads(child.stdout.strip().splitlines()[-1])
+    report = {
+        step: round((timestamps[step] - started) * 1000, 1)
+        for step in ('setup', 'urls', 'first_response', 'first_analysis') if step in timestamps
+    }
+    report['first_response_status'] = timestamps['first_response_status']
+    if 'first_analysis_status' in timestamps:
+        report['first_analysis_status'] = timestamps['first_analysis_status']
+    report['heavy_at_boot'] = timestamps['heavy_at_boot']
+    report['imports'] = import_times(child.stderr)
+    return report
+
+
+def profile_startup(runs=3, upload=False, prewarm=False):
+    """
+    profile_boot `runs` times; the step timings are the medians and the
+    import breakdown comes from the fastest boot
+    """
+    reports = [profile_boot(upload, prewarm) for _ in range(runs)]
+    summary = dict(min(reports, key=lambda report: report['first_response']))
+    for step in ('setup', 'urls', 'first_response', 'first_analysis'):
+        if step in summary:
+            summary[step] = statistics.median(report[step] for report in reports)
+    return summary
+
+
+if __name__ == '__main__':
+    print(json.dumps(_boot(sys.argv[1] if len(sys.argv) > 1 else None)))
@@ -0,0 +1,191 @@
+import contextlib
+import io
+import json
+import os
+import pickle
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ..utils.extract import analyze_transactions, extract_text_from_pdf, extract_transactions
+from ..utils.features import FEATURE_COLUMNS
+from ..utils.model_registry import get_model, registry
+from .synthetic import AMOUNT_FORMATS, DATE_FORMATS, statement_pdf
+
+BENCHMARK_MODEL_VERSION = 'benchmark'
+
+# (name, pages, lines per page, date formats, amount formats)
+DEFAULT_CASES = [
+    ('1 page, mixed formats', 1, 60, None, None),
+    ('5 pages, mixed formats', 5, 60, None, None),
+    ('20 pages, mixed formats', 20, 60, None, None),
+    ('5 pages, DD/MM/YYYY plain amounts', 5, 60, DATE_FORMATS[2:3], AMOUNT_FORMATS[:1]),
+    ('5 pages, dense 120 lines/page', 5, 120, None, None),
+]
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far, in MB
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _percentile(samples, percent):
+    return float(np.percentile(np.asarray(samples), percent))
+
+
+def _measure(function, iterations, units=1):
+    """
+    Run `function` `iterations` times with its output silenced
+    Returns latency percentiles (ms), throughput and peak RSS
+    """
+    samples = []
+    for _ in range(iterations):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - started)
+
+    total = sum(samples)
+    return {
+        'p50_ms': _percentile(samples, 50) * 1000,
+        'p95_ms': _percentile(samples, 95) * 1000,
+        'throughput': units * len(samples) / total if total else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def ensure_benchmark_model(directory):
+    """
+    Register a small Random Forest trained on synthetic features when no
+    fraud model is available (e.g. the pickles were not pulled from LFS),
+    so the scoring stages have something representative to time
+    """
+    try:
+        get_model()
+        return False
+    except Exception:
+        pass
+
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(0)
+    features = pd.DataFrame({column: rng.random(2000) * 10000 for column in FEATURE_COLUMNS})
+    labels = (features['amount'] > 8000).astype(int)
+    model = RandomForestClassifier(n_estimators=100, max_depth=12, random_state=0).fit(features, labels)
+
+    model_path = os.path.join(directory, 'benchmark_model.pkl')
+    columns_path = os.path.join(directory, 'benchmark_columns.pkl')
+    with open(model_path, 'wb') as file:
+        pickle.dump(model, file)
+    with open(columns_path, 'wb') as file:
+        pickle.dump(list(FEATURE_COLUMNS), file)
+    registry.register(BENCHMARK_MODEL_VERSION, model_path, columns_path, default=True)
+    return True
+
+
+def _upload(client, pdf_path):
+    with open(pdf_path, 'rb') as file:
+        response = client.post('/api/upload/', {'files': [file]})
+    if response.status_code != 200:
+        raise RuntimeError(f"Upload failed with status {response.status_code}: {response.content[:200]!r}")
+    return response.json()['files']
+
+
+def run_suite(cases=None, iterations=5, include_upload=True):
+    """
+    Time every stage of the upload -> extract -> score path on synthetic
+    statements. Returns {case name: {stage: metrics}}.
+    """
+    from django.conf import settings
+    from django.test import Client
+
+    cases = cases or DEFAULT_CASES
+    upload_dir = os.path.join(settings.BASE_DIR.parent, 'data')
+    report = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        ensure_benchmark_model(directory)
+        client = Client()
+        uploaded = []
+
+        for case_index, (name, pages, lines_per_page, date_formats, amount_formats) in enumerate(cases):
+            pdf_path = os.path.join(directory, f"case{case_index}.pdf")
+            line_count = statement_pdf(pdf_path, pages, lines_per_page, seed=case_index,
+                                       date_formats=date_formats, amount_formats=amount_formats)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                transactions = extract_transactions(pdf_path)
+
+            stages = {
+                'extract_text_from_pdf': _measure(lambda: extract_text_from_pdf(pdf_path), iterations, pages),
+                'extract_transactions': _measure(lambda: extract_transactions(pdf_path), iterations, line_count),
+                'analyze_transactions': _measure(
+                    lambda: analyze_transactions(transactions), iterations, len(transactions)
+                ),
+            }
+
+            if include_upload:
+                # Every cold upload gets new content so the result cache cannot answer it
+                cold_paths = []
+                for iteration in range(iterations):
+                    cold_path = os.path.join(directory, f"case{case_index}-cold{iteration}.pdf")
+                    statement_pdf(cold_path, pages, lines_per_page, seed=1000 * (case_index + 1) + iteration,
+                                  date_formats=date_formats, amount_formats=amount_formats)
+                    cold_paths.append(cold_path)
+                cold_uploads = iter(cold_paths)
+                stages['upload (cold)'] = _measure(
+                    lambda: uploaded.extend(_upload(client, next(cold_uploads))), iterations
+                )
+                stages['upload (cached)'] = _measure(
+                    lambda: uploaded.extend(_upload(client, cold_paths[0])), iterations
+                )
+
+            for stage in stages.values():
+                stage['pages'] = pages
+                stage['lines'] = line_count
+            report[name] = stages
+
+        for filename in uploaded:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(upload_dir, filename))
+
+        if registry.default_version == BENCHMARK_MODEL_VERSION:
+            registry.unregister(BENCHMARK_MODEL_VERSION)
+
+    return report
+
+
+def compare_to_baseline(report, baseline, tolerance, min_delta_ms=2.0):
+    """
+    Returns a list of (case, stage, baseline p50, current p50) for every
+    stage whose median latency regressed by more than `tolerance`
+    Slowdowns under min_delta_ms are ignored, sub-millisecond stages are noise.
+    """
+    regressions = []
+    for case, stages in report.items():
+        for stage, metrics in stages.items():
+            previous = baseline.get(case, {}).get(stage)
+            if not previous:
+                continue
+            limit = max(previous['p50_ms'] * (1 + tolerance), previous['p50_ms'] + min_delta_ms)
+            if metrics['p50_ms'] > limit:
+                regressions.append((case, stage, previous['p50_ms'], metrics['p50_ms']))
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(report, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, sort_keys=True)
@@ -0,0 +1,169 @@
+import random
+
+# One generator per format matched by DATE_PATTERNS
+_MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+DATE_FORMATS = [
+    lambda d, m, y: f"{d:02d} {_MONTHS[m - 1]} {y % 100:02d}",    # DD MMM YY
+    lambda d, m, y: f"{d:02d}-{_MONTHS[m - 1]}-{y}",              # DD-MMM-YYYY
+    lambda d, m, y: f"{d:02d}/{m:02d}/{y}",                       # DD/MM/YYYY
+    lambda d, m, y: f"{d:02d}-{m:02d}-{y}",                       # DD-MM-YYYY
+    lambda d, m, y: f"{d:02d}.{m:02d}.{y}",                       # DD.MM.YYYY
+    lambda d, m, y: f"{_MONTHS[m - 1]} {d:02d}, {y}",             # MMM DD, YYYY
+    lambda d, m, y: f"{d}/{m}/{y % 100:02d}",                     # D/M/YY
+    lambda d, m, y: f"{d}-{m}-{y}",                               # D-M-YYYY
+]
+
+# One generator per style matched by AMOUNT_PATTERNS
+AMOUNT_FORMATS = [
+    lambda value: f"{value:.2f}",
+    lambda value: f"{value:,.2f}",
+    lambda value: f"${value:,.2f}",
+    lambda value: f"({value:,.2f})",
+    lambda value: f"€{value:,.2f}".replace(',', ' ').replace('.', ',').replace(' ', '.'),
+    lambda value: f"£{value:,.2f}",
+    lambda value: f"{int(value)}",
+]
+
+DESCRIPTIONS = [
+    'ATM WITHDRAWAL MAIN ST', 'CASH OUT BRANCH 12', 'DEPOSIT PAYROLL', 'CASH IN COUNTER',
+    'POS PURCHASE GROCERY', 'PAYMENT TO ACME LTD', 'BILL PAY ELECTRIC', 'AUTOPAY INSURANCE',
+    'DIRECT DEBIT GYM', 'MONTHLY FEE', 'TRANSFER TO SAVINGS', 'UPI 99812 COFFEE',
+    'NEFT INWARD SALARY', 'ACH CREDIT REFUND', 'SWIFT INTL WIRE', 'ONLINE STORE ORDER',
+]
+
+NOISE_LINES = [
+    'Statement of account', 'Page continued', 'Account number 00123456789',
+    'Opening balance brought forward', '', 'Date Description Debit Credit Balance',
+]
+
+
+def statement_lines(line_count, seed=0, date_formats=None, amount_formats=None, noise_ratio=0.1):
+    """
+    Generate synthetic bank statement lines in the layouts extract_transactions
+    understands: date, description, amount and running balance, with a
+    share of header and filler lines mixed in
+    """
+    rng = random.Random(seed)
+    date_formats = date_formats or DATE_FORMATS
+    amount_formats = amount_formats or AMOUNT_FORMATS
+    balance = rng.uniform(1000, 50000)
+
+    lines = []
+    for _ in range(line_count):
+        if rng.random() < noise_ratio:
+            lines.append(rng.choice(NOISE_LINES))
+            continue
+
+        date_format = rng.choice(date_formats)
+        amount_format = rng.choice(amount_formats)
+        amount = round(rng.lognormvariate(5, 1.5), 2)
+        is_debit = rng.random() < 0.6
+        balance += -amount if is_debit else amount
+        marker = ' DR' if is_debit and rng.random() < 0.3 else ''
+
+        lines.append(
+            f"{date_format(rng.randint(1, 28), rng.randint(1, 12), rng.randint(2019, 2025))} "
+            f"{rng.choice(DESCRIPTIONS)}{marker} {amount_format(amount)} {abs(balance):,.2f}"
+        )
+    return lines
+
+
+def _pdf_string(text):
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('cp1252', errors='replace') + b')'
+
+
+def _line_content(row, line):
+    # A line is either a string or a list of (x, text) cells laid out as table columns
+    cells = [(40, line)] if isinstance(line, str) else line
+    y = 760 - 11 * row
+    return b" ".join(b"1 0 0 1 %d %d Tm %s Tj" % (x, y, _pdf_string(text)) for x, text in cells if text)
+
+
+def write_statement_pdf(path, pages):
+    """
+    Write a minimal text-only PDF with one page per list of lines. The file
+    uses a standard Helvetica font, so pdfplumber extracts exactly the lines
+    given, without needing a PDF library to generate it.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        content = b"BT /F1 9 Tf " + b" ".join(_line_content(row, line) for row, line in enumerate(lines)) + b" ET"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R >> >> >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % page_id for page_id in page_ids), len(page_ids)
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+
+    with open(path, 'wb') as file:
+        file.write(output)
+
+
+def statement_pdf(path, page_count, lines_per_page=60, seed=0, **line_options):
+    """
+    Write a synthetic multi-page bank statement PDF
+    Returns the total number of statement lines written
+    """
+    lines = statement_lines(page_count * lines_per_page, seed=seed, **line_options)
+    pages = [
+        [f"Statement page {page + 1}"] + lines[page * lines_per_page:(page + 1) * lines_per_page]
+        for page in range(page_count)
+    ]
+    write_statement_pdf(path, pages)
+    return len(lines)
+
+
+# x positions of the table statement columns
+TABLE_COLUMNS = [('Date', 40), ('Description', 110), ('Debit', 330), ('Credit', 410), ('Balance', 490)]
+
+
+def table_statement_pdf(path, page_count, rows_per_page=60, seed=0, amount_formats=None):
+    """
+    Write a synthetic statement laid out as a table with a header row on
+    every page and separate debit, credit and balance columns
+    Returns the number of transaction rows written
+    """
+    rng = random.Random(seed)
+    amount_formats = amount_formats or AMOUNT_FORMATS[:4]
+    balance = rng.uniform(1000, 50000)
+    header = [(x, name) for name, x in TABLE_COLUMNS]
+    x = {name: x for name, x in TABLE_COLUMNS}
+
+    pages = []
+    for page in range(page_count):
+        lines = [f"Statement page {page + 1}", header]
+        for _ in range(rows_per_page):
+            amount = round(rng.lognormvariate(5, 1.5), 2)
+            is_debit = rng.random() < 0.6
+            balance += -amount if is_debit else amount
+            formatted = rng.choice(amount_formats)(amount)
+            lines.append([
+                (x['Date'], f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(2019, 2025)}"),
+                (x['Description'], rng.choice(DESCRIPTIONS)),
+                (x['Debit'], formatted if is_debit else ''),
+                (x['Credit'], '' if is_debit else formatted),
+                (x['Balance'], f"{balance:,.2f}"),
+            ])
+        pages.append(lines)
+
+    write_statement_pdf(path, pages)
+    return page_count * rows_per_page
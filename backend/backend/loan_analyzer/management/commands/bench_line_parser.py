@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from loan_analyzer.benchmarks.line_parser import run_line_parser_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark statement line parsing (lines/sec) before and after the compiled line classifier'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=100000, help='Synthetic statement lines to parse')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per parser; the fastest is reported')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        result = run_line_parser_benchmark(options['lines'], options['repeat'], options['seed'])
+
+        self.stdout.write(f"Lines parsed:        {result['lines']:,} ({result['transactions']:,} transactions)")
+        self.stdout.write(f"Legacy parser:       {result['legacy_lines_per_sec']:,.0f} lines/sec")
+        self.stdout.write(f"Compiled classifier: {result['compiled_lines_per_sec']:,.0f} lines/sec")
+        self.stdout.write(f"Speedup:             {result['speedup']:.2f}x")
+        if result['outputs_match']:
+            self.stdout.write(self.style.SUCCESS('Outputs match'))
+        else:
+            self.stdout.write(self.style.ERROR('Outputs differ between the legacy and compiled parser'))
@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from loan_analyzer.benchmarks.suite import DEFAULT_CASES, compare_to_baseline, load_baseline, run_suite, save_baseline
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the upload -> extract -> score path on synthetic statement PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5, help='Timed runs per stage')
+        parser.add_argument('--quick', action='store_true', help='Only run the smallest case')
+        parser.add_argument('--no-upload', action='store_true', help='Skip the full /api/upload/ request stages')
+        parser.add_argument('--baseline', help='Baseline JSON to compare against; fails on regressions')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p50 slowdown against the baseline (0.25 = 25%%)')
+        parser.add_argument('--save-baseline', help='Write this run as a baseline JSON file')
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+
+    def handle(self, *args, **options):
+        # Lets the test client send requests to 'testserver' with DEBUG off
+        setup_test_environment()
+
+        cases = DEFAULT_CASES[:1] if options['quick'] else DEFAULT_CASES
+        report = run_suite(cases, options['iterations'], include_upload=not options['no_upload'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for case, stages in report.items():
+                first = next(iter(stages.values()))
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{case} ({first['pages']} pages, {first['lines']} lines)"))
+                for stage, metrics in stages.items():
+                    self.stdout.write(
+                        f"  {stage:<24} p50 {metrics['p50_ms']:9.1f} ms   p95 {metrics['p95_ms']:9.1f} ms   "
+                        f"{metrics['throughput']:10,.1f}/s   peak RSS {metrics['peak_rss_mb']:7.1f} MB"
+                    )
+
+        if options['save_baseline']:
+            save_baseline(report, options['save_baseline'])
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+
+        if options['baseline']:
+            regressions = compare_to_baseline(report, load_baseline(options['baseline']), options['tolerance'])
+            if regressions:
+                for case, stage, previous, current in regressions:
+                    self.stderr.write(f"{case} / {stage}: p50 {previous:.1f} ms -> {current:.1f} ms")
+                raise CommandError(f"{len(regressions)} stage(s) regressed by more than {options['tolerance']:.0%}")
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from loan_analyzer.benchmarks.startup import profile_startup
+
+STEPS = [
+    ('setup', 'django.setup()'),
+    ('urls', 'URLconf imported'),
+    ('first_response', 'first response (/api/metrics/)'),
+    ('first_analysis', 'first analysis (/api/upload/)'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Profile a cold start: import time by module and boot-to-first-response latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Cold starts to take the median of')
+        parser.add_argument('--upload', action='store_true',
+                            help='Also time the first analysis of a one-page statement upload')
+        parser.add_argument('--prewarm', action='store_true', help='Boot with LOAN_ANALYZER_PREWARM=1')
+        parser.add_argument('--top', type=int, default=15, help='Slowest packages to list')
+        parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+
+    def handle(self, *args, **options):
+        report = profile_startup(options['runs'], upload=options['upload'], prewarm=options['prewarm'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Boot (ms from process start, median)'))
+        for step, label in STEPS:
+            if step in report:
+                self.stdout.write(f"  {label:<34} {report[step]:9.1f} ms")
+        for step in ('first_response', 'first_analysis'):
+            status = report.get(f'{step}_status')
+            if status is not None and status != 200:
+                self.stdout.write(self.style.WARNING(f"  {step.replace('_', ' ')} returned status {status}"))
+
+        imports = report['imports']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Import time by package ({sum(ms for _, ms in imports):.1f} ms in total)"
+        ))
+        for package, ms in imports[:options['top']]:
+            self.stdout.write(f"  {package:<34} {ms:9.1f} ms")
+
+        if report['heavy_at_boot']:
+            self.stdout.write(self.style.WARNING(
+                f"Loaded before the first request: {', '.join(report['heavy_at_boot'])}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('No heavy dependencies loaded before the first request'))
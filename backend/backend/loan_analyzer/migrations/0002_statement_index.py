@@ -0,0 +1,59 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:26
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_analyzer', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('account_id', models.CharField(db_index=True, max_length=128)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_sha256', models.CharField(db_index=True, max_length=64)),
+                ('model_version', models.CharField(blank=True, default='', max_length=128)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('summary', models.JSONField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'constraints': [models.UniqueConstraint(fields=('account_id', 'content_sha256'), name='statement_account_content')],
+            },
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='account_id',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.CharField(max_length=128)),
+                ('position', models.PositiveIntegerField()),
+                ('date', models.DateField(blank=True, null=True)),
+                ('date_text', models.CharField(blank=True, default='', max_length=32)),
+                ('description', models.TextField(blank=True, default='')),
+                ('transaction_type', models.CharField(max_length=16)),
+                ('amount', models.FloatField()),
+                ('old_balance', models.FloatField()),
+                ('new_balance', models.FloatField()),
+                ('is_fraudulent', models.BooleanField(null=True)),
+                ('fraud_probability', models.FloatField(null=True)),
+                ('statement', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='loan_analyzer.statement')),
+            ],
+            options={
+                'ordering': ['statement', 'position'],
+                'indexes': [models.Index(fields=['account_id', 'date'], name='transaction_account_date'), models.Index(fields=['account_id', 'amount'], name='transaction_account_amount'), models.Index(fields=['account_id', 'fraud_probability'], name='transaction_account_fraud')],
+            },
+        ),
+    ]
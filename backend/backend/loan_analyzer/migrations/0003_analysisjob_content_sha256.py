@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loan_analyzer', '0002_statement_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='content_sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -1,3 +1,136 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class AnalysisJob(models.Model):
+    """
+    One queued bank statement analysis. The table doubles as the job queue:
+    workers claim QUEUED rows and write the per-file result back when done.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField(max_length=255)
+    # Borrower account the statement is indexed under, empty to skip indexing
+    account_id = models.CharField(max_length=128, blank=True, default='')
+    file_path = models.CharField(max_length=1024)
+    content_sha256 = models.CharField(max_length=64, blank=True, default='')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed while the job runs, so jobs of a crashed process can be told from long ones
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+    def to_dict(self):
+        return {
+            'job_id': str(self.id),
+            'filename': self.filename,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error or None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class Statement(models.Model):
+    """
+    An analyzed statement of a borrower account, indexed so questions about
+    the account can be answered from the database instead of re-parsing
+    the uploads. A file is indexed once per account, by its content hash.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    account_id = models.CharField(max_length=128, db_index=True)
+    filename = models.CharField(max_length=255)
+    content_sha256 = models.CharField(max_length=64, db_index=True)
+    model_version = models.CharField(max_length=128, blank=True, default='')
+    transaction_count = models.PositiveIntegerField(default=0)
+    summary = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['account_id', 'content_sha256'], name='statement_account_content'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.account_id})"
+
+    def to_dict(self):
+        return {
+            'statement_id': str(self.id),
+            'account_id': self.account_id,
+            'filename': self.filename,
+            'model_version': self.model_version or None,
+            'transaction_count': self.transaction_count,
+            'summary': self.summary,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+class Transaction(models.Model):
+    """
+    One transaction of an indexed Statement. account_id is copied from the
+    statement so cross-statement queries of an account use a single index.
+    """
+    statement = models.ForeignKey(Statement, on_delete=models.CASCADE, related_name='transactions')
+    account_id = models.CharField(max_length=128)
+    position = models.PositiveIntegerField()
+    date = models.DateField(null=True, blank=True)
+    date_text = models.CharField(max_length=32, blank=True, default='')
+    description = models.TextField(blank=True, default='')
+    transaction_type = models.CharField(max_length=16)
+    amount = models.FloatField()
+    old_balance = models.FloatField()
+    new_balance = models.FloatField()
+    is_fraudulent = models.BooleanField(null=True)
+    fraud_probability = models.FloatField(null=True)
+
+    class Meta:
+        ordering = ['statement', 'position']
+        indexes = [
+            models.Index(fields=['account_id', 'date'], name='transaction_account_date'),
+            models.Index(fields=['account_id', 'amount'], name='transaction_account_amount'),
+            models.Index(fields=['account_id', 'fraud_probability'], name='transaction_account_fraud'),
+        ]
+
+    def __str__(self):
+        return f"{self.date_text} {self.transaction_type} {self.amount}"
+
+    def to_dict(self):
+        return {
+            'statement_id': str(self.statement_id),
+            'position': self.position,
+            'date': self.date.isoformat() if self.date else None,
+            'transaction_date': self.date_text,
+            'description': self.description,
+            'transaction_type': self.transaction_type,
+            'amount': self.amount,
+            'oldbalanceOrg': self.old_balance,
+            'newbalanceOrig': self.new_balance,
+            'is_fraudulent': self.is_fraudulent,
+            'fraud_probability': self.fraud_probability,
+        }
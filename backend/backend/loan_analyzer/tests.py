@@ -1,3 +1,1156 @@
-from django.test import TestCase
+import contextlib
+import hashlib
+import io
+import json
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+import pdfplumber
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIRequest
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from sklearn.ensemble import RandomForestClassifier
+
+from .benchmarks.line_parser import legacy_parse_transactions
+from .benchmarks.startup import import_times, profile_boot
+from .benchmarks.synthetic import (TABLE_COLUMNS, statement_lines, statement_pdf, table_statement_pdf,
+                                  write_statement_pdf)
+from .models import AnalysisJob, Transaction
+from .utils.balances import RunningBalance, reconstruct_balances
+from .utils.dates import DateParser, date_range, parse_statement_date, statement_dates
+from .utils import extract, incremental, jobs, model_registry, ocr, offload, result_cache, uploads
+from .utils.extract import (analyze_bank_statement, analyze_bank_statement_stream, analyze_bank_statements,
+                            page_fingerprint, parse_transactions)
+from .utils.result_cache import analyze_bank_statement_cached
+from .utils.features import FEATURE_COLUMNS, build_feature_columns, build_feature_matrix
+from .utils.line_classifier import AMOUNT_PATTERNS, LineClassifier
+from .utils.metrics import STAGE_SECONDS, MetricsRegistry, registry as metrics_registry
+from .utils.model_bundle import export_model_bundle, load_model_bundle
+from .utils.model_registry import (ModelRegistry, ModelVersion, configured_model_version, get_model,
+                                   model_fingerprint, registry)
+from .utils.offload import AnalysisPool, analyze_bank_statement_offloaded, get_analysis_pool
+from .utils.pdf_tables import extract_table_transactions
+from .utils.statement_index import index_statement, query_transactions
+from .utils.summary import StreamingSummary, summarize_columns, top_k_indices, top_transactions
+from .utils.tabular import extract_tabular_transactions
+from .utils.transactions import LARGE_TRANSACTION_AMOUNT, TRANSACTION_TYPES, TYPE_CODES, TransactionRecord
+from .utils.uploads import UploadStore
+from .utils.velocity import model_velocity_features, velocity_features
+from .utils.tree_engine import CompiledForest
+
+
+def _fit_fraud_model(directory, seed=0, name='model', column_names=FEATURE_COLUMNS):
+    """
+    Pickle a small Random Forest over `column_names` into `directory`
+    Returns (model_path, columns_path).
+    """
+    rng = np.random.default_rng(seed)
+    features = pd.DataFrame({column: rng.random(400) * 10000 for column in column_names})
+    labels = (features['amount'] > 5000).astype(int)
+    model = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=seed).fit(features, labels)
+
+    model_path = os.path.join(directory, f'{name}.pkl')
+    columns_path = os.path.join(directory, f'{name}_columns.pkl')
+    with open(model_path, 'wb') as file:
+        pickle.dump(model, file)
+    with open(columns_path, 'wb') as file:
+        pickle.dump(list(column_names), file)
+    return model_path, columns_path
+
+
+class FraudModelMixin:
+    """
+    Serve a small fraud model as the default version, with the result, page
+    and upload stores in a temporary directory
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.model_paths = _fit_fraud_model(self.directory)
+
+        previous_default = registry.default_version
+        registry.register('test', *self.model_paths, default=True)
+        self.addCleanup(setattr, registry, 'default_version', previous_default)
+        self.addCleanup(registry.unregister, 'test')
+
+        stores = [
+            (result_cache, '_cache', result_cache.ResultCache(os.path.join(self.directory, 'results'),
+                                                              10 ** 9, 3600)),
+            (result_cache, '_page_cache', result_cache.ResultCache(os.path.join(self.directory, 'pages'),
+                                                                   10 ** 9, 3600)),
+            (uploads, '_store', uploads.UploadStore(os.path.join(self.directory, 'uploads'), 10 ** 9, 3600)),
+        ]
+        for module, name, store in stores:
+            patcher = mock.patch.object(module, name, store)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _statement_pdf(self, name, page_count=1, seed=0):
+        path = os.path.join(self.directory, name)
+        statement_pdf(path, page_count=page_count, lines_per_page=30, seed=seed)
+        return path
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.matrix = np.random.default_rng(0).random((50, len(FEATURE_COLUMNS))).astype(np.float32) * 10000
+
+    def _touch(self, paths, seconds):
+        # Move the mtimes explicitly, a rewrite within the same tick would not be noticed
+        for path in paths:
+            mtime = os.stat(path).st_mtime + seconds
+            os.utime(path, (mtime, mtime))
+
+    def test_changed_model_is_swapped_in(self):
+        models = ModelRegistry(reload_interval=0)
+        paths = _fit_fraud_model(self.directory, seed=0)
+        loaded = models.register('v1', *paths)
+
+        self._touch(paths, 10)
+        self.assertIs(models.get('v1'), loaded)
+        self.assertEqual(loaded.mtimes, tuple(os.stat(path).st_mtime_ns for path in paths))
+
+        expected = loaded.predict_proba(self.matrix)
+        _fit_fraud_model(self.directory, seed=1)
+        self._touch(paths, 20)
+        reloaded = models.get('v1')
+        self.assertIsNot(reloaded, loaded)
+        self.assertNotEqual(reloaded.fingerprint, loaded.fingerprint)
+        # Requests holding the previous version keep scoring with it
+        np.testing.assert_array_equal(loaded.predict_proba(self.matrix), expected)
+
+    def test_versions_are_served_side_by_side(self):
+        models = ModelRegistry(reload_interval=0)
+        first = models.register('v1', *_fit_fraud_model(self.directory, seed=0, name='v1'))
+        second = models.register('v2', *_fit_fraud_model(self.directory, seed=1, name='v2'))
+
+        self.assertIs(models.get(), first)
+        self.assertIs(models.get('v2'), second)
+        self.assertEqual(models.versions(), {'v1': first.version, 'v2': second.version})
+        self.assertNotEqual(first.version, second.version)
+        self.assertFalse(np.array_equal(first.predict_proba(self.matrix), second.predict_proba(self.matrix)))
+
+        models.unregister('v1')
+        self.assertIs(models.get(), second)
+        with self.assertRaises(LookupError):
+            models.get('v1')
+
+    def test_configured_version_is_known_without_loading_the_model(self):
+        paths = _fit_fraud_model(self.directory)
+        expected = ModelRegistry().register('v1', *paths, warm_up=False)
+        bundle_path = os.path.join(self.directory, 'bundle')
+        export_model_bundle(expected.model, FEATURE_COLUMNS, bundle_path, model_fingerprint(*paths))
+
+        configurations = [
+            ({'model_path': paths[0], 'columns_path': paths[1]}, expected.version),
+            ({'bundle_path': bundle_path}, expected.version),
+            ({'bundle_path': os.path.join(self.directory, 'missing')}, 'none'),
+        ]
+        with mock.patch.object(registry, 'default_version', None), \
+                mock.patch.object(model_registry, '_file_fingerprints', {}), \
+                mock.patch.object(model_registry, 'pickle') as unpickle:
+            for paths_setting, version in configurations:
+                with override_settings(FRAUD_MODEL_VERSIONS={'v1': paths_setting}):
+                    self.assertEqual(configured_model_version(), version)
+        unpickle.load.assert_not_called()
+
+    def test_failed_load_is_retried_once_per_interval(self):
+        with mock.patch.object(registry, 'default_version', None), \
+                mock.patch.object(registry, 'reload_interval', 60), \
+                mock.patch.object(model_registry, '_failed_load_at', None), \
+                mock.patch.object(model_registry, 'load_configured_models') as load:
+            for _ in range(3):
+                with self.assertRaises(LookupError):
+                    get_model()
+            self.assertEqual(load.call_count, 1)
+
+            registry.reload_interval = 0
+            with self.assertRaises(LookupError):
+                get_model()
+            self.assertEqual(load.call_count, 2)
+
+
+class CompiledForestParityTests(SimpleTestCase):
+    """
+    The compiled inference backend must return exactly the probabilities of
+    the sklearn model it was built from, when that model scores with n_jobs=1
+    """
+
+    def _fit(self, n_classes=2, **params):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(600, 12)).astype(np.float32)
+        X[:, 5:11] = rng.integers(0, 2, size=(600, 6))
+        y = (X[:, 0] + X[:, 1] * X[:, 5] > 0).astype(int) + (X[:, 2] > 1.0) * (n_classes - 2)
+        return X, RandomForestClassifier(random_state=0, **params).fit(X, y)
+
+    def test_probabilities_match_sklearn(self):
+        X, model = self._fit(n_estimators=25)
+        compiled = CompiledForest.from_estimator(model)
+
+        rng = np.random.default_rng(1)
+        X_test = rng.normal(size=(500, 12)).astype(np.float32)
+        self.assertTrue(np.array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test)))
+        self.assertTrue(np.array_equal(compiled.predict(X_test), model.predict(X_test)))
+
+    def test_parallel_sklearn_model_matches_up_to_rounding(self):
+        # sklearn sums the trees in the order its threads finish them
+        X, model = self._fit(n_estimators=25, n_jobs=2)
+        compiled = CompiledForest.from_estimator(model)
+
+        X_test = np.random.default_rng(1).normal(size=(500, 12)).astype(np.float32)
+        np.testing.assert_allclose(compiled.predict_proba(X_test), model.predict_proba(X_test), rtol=0, atol=1e-12)
+        model.set_params(n_jobs=1)
+        self.assertTrue(np.array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test)))
+
+    def test_values_on_split_thresholds(self):
+        # Rows sitting exactly on a split must go left like sklearn's `<=`
+        X, model = self._fit(n_estimators=10, max_depth=6)
+        compiled = CompiledForest.from_estimator(model)
+
+        tree = model.estimators_[0].tree_
+        X_test = X[:50].copy()
+        for row, node in enumerate(np.flatnonzero(tree.children_left != -1)[:50]):
+            X_test[row, tree.feature[node]] = np.float32(tree.threshold[node])
+        self.assertTrue(np.array_equal(compiled.predict_proba(X_test), model.predict_proba(X_test)))
+
+    def test_multiclass_and_shallow_trees(self):
+        X, model = self._fit(n_classes=3, n_estimators=15, max_depth=3)
+        compiled = CompiledForest.from_estimator(model)
+        self.assertTrue(np.array_equal(compiled.predict_proba(X), model.predict_proba(X)))
+
+    def test_re_export_keeps_loaded_bundles_working(self):
+        X, model = self._fit(n_estimators=10)
+        _, other_model = self._fit(n_estimators=5, max_depth=3)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        column_names = list(FEATURE_COLUMNS)
+
+        export_model_bundle(model, column_names, directory, 'a' * 64)
+        served, _ = load_model_bundle(directory)
+        # Workers keep their mapping while the bundle is re-exported, repeatedly
+        for _ in range(3):
+            export_model_bundle(other_model, column_names, directory, 'b' * 64)
+            self.assertTrue(np.array_equal(served.predict_proba(X), model.predict_proba(X)))
+
+        reloaded, manifest = load_model_bundle(directory)
+        self.assertEqual(manifest['fingerprint'], 'b' * 64)
+        self.assertTrue(np.array_equal(reloaded.predict_proba(X), other_model.predict_proba(X)))
+        self.assertEqual(len([entry for entry in os.listdir(directory) if entry.startswith('arrays-')]), 2)
+
+    def test_model_bundle_round_trip(self):
+        X, model = self._fit(n_estimators=10)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        column_names = ['amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest', 'newbalanceDest',
+                        'type_CASH_IN', 'type_CASH_OUT', 'type_DEBIT', 'type_PAYMENT', 'type_TRANSFER',
+                        'is_large_transaction', 'txn_count_7d']
+        export_model_bundle(model, column_names, directory, 'f' * 64)
+
+        forest, manifest = load_model_bundle(directory)
+        self.assertIsInstance(forest.threshold, np.memmap)
+        self.assertEqual(manifest['column_names'], column_names)
+        self.assertTrue(np.array_equal(forest.predict_proba(X), model.predict_proba(X)))
+
+        # A model column the analysis does not build is rejected
+        export_model_bundle(model, column_names[:-1] + ['account_age'], directory, 'f' * 64)
+        with self.assertRaisesRegex(ValueError, 'account_age'):
+            load_model_bundle(directory)
+
+
+class MetricsRenderTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        metrics = MetricsRegistry()
+        stage_seconds = metrics.histogram('stage_seconds', 'Stage latency', ('stage',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 2.0):
+            stage_seconds.observe(value, stage='parse')
+        metrics.counter('pages_total', 'Pages').inc(3)
+
+        lines = metrics.render().splitlines()
+        self.assertIn('# TYPE stage_seconds histogram', lines)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="0.1"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="1"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="parse",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_sum{stage="parse"} 3.05', lines)
+        self.assertIn('stage_seconds_count{stage="parse"} 4', lines)
+        self.assertIn('pages_total 3', lines)
+
+    def test_drained_worker_metrics_merge_into_the_parent(self):
+        def record(metrics, *values):
+            stage_seconds = metrics.histogram('stage_seconds', 'Stage latency', ('stage',), buckets=(0.1, 1.0))
+            pages = metrics.counter('pages_total', 'Pages')
+            for value in values:
+                stage_seconds.observe(value, stage='parse')
+                pages.inc()
+            return metrics
+
+        parent = record(MetricsRegistry(), 0.05)
+        worker = record(MetricsRegistry(), 0.5, 2.0)
+        parent.merge(worker.drain())
+
+        self.assertEqual(parent.render(), record(MetricsRegistry(), 0.05, 0.5, 2.0).render())
+        # The worker starts counting again from zero
+        self.assertEqual(worker.drain(), {'stage_seconds': {}, 'pages_total': {}})
+
+    async def test_offloaded_analysis_returns_worker_metrics(self):
+        def analyze(pdf_path):
+            STAGE_SECONDS.observe(0.01, stage='offload_test')
+            return {'transactions': [], 'summary': None}
+
+        pool = AnalysisPool(1, 1)
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        with mock.patch.object(pool, '_get_executor', return_value=executor), \
+                mock.patch.object(extract, 'analyze_bank_statement', side_effect=analyze):
+            result = await pool.analyze('statement.pdf')
+
+        self.assertEqual(result, {'transactions': [], 'summary': None})
+        self.assertIn('loan_analyzer_stage_seconds_count{stage="offload_test"} 1',
+                      metrics_registry.render().splitlines())
+
+
+class AsyncUploadBackpressureTests(SimpleTestCase):
+    async def test_saturated_pool_returns_503_with_retry_after(self):
+        pool = get_analysis_pool()
+        pool.reserve(pool.max_pending)
+        try:
+            response = await self.async_client.post('/api/upload/concurrent/', {
+                'files': [SimpleUploadedFile('statement.pdf', b'%PDF-1.4', content_type='application/pdf')]
+            })
+        finally:
+            pool.release(pool.max_pending)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertTrue(response.headers['Retry-After'].isdigit())
+        self.assertEqual(pool.pending, 0)
+
+    async def test_cache_lookup_does_not_load_the_model(self):
+        cache = mock.Mock()
+        cache.get.return_value = {'transactions': [], 'summary': {}}
+        with mock.patch.object(offload, 'get_result_cache', return_value=cache), \
+                mock.patch.object(model_registry, 'configured_model_version', return_value='v1:0123456789ab'), \
+                mock.patch.object(model_registry, 'get_model', side_effect=AssertionError('model loaded')):
+            result = await analyze_bank_statement_offloaded('statement.pdf', 'digest')
+
+        self.assertEqual(result, cache.get.return_value)
+        cache.get.assert_called_once_with('digest', 'v1:0123456789ab')
+
+    async def test_multipart_body_is_parsed_off_the_event_loop(self):
+        parse_threads = []
+        parse = ASGIRequest._load_post_and_files
+
+        def record_thread(request):
+            parse_threads.append(threading.current_thread())
+            return parse(request)
+
+        pool = get_analysis_pool()
+        pool.reserve(pool.max_pending)
+        try:
+            with mock.patch.object(ASGIRequest, '_load_post_and_files', autospec=True, side_effect=record_thread):
+                await self.async_client.post('/api/upload/concurrent/', {
+                    'files': [SimpleUploadedFile('statement.pdf', b'%PDF-1.4', content_type='application/pdf')]
+                })
+        finally:
+            pool.release(pool.max_pending)
+
+        self.assertTrue(parse_threads)
+        self.assertNotIn(threading.current_thread(), parse_threads)
+
+
+class TabularStatementTests(SimpleTestCase):
+    def _write_csv(self, content):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_debit_credit_columns_map_to_features(self):
+        path = self._write_csv(
+            "Account,12345\n\n"
+            "Date,Description,Debit,Credit,Balance\n"
+            '01/02/2024,ATM WITHDRAWAL,"1,200.00",,"8,800.00"\n'
+            "02/02/2024,SALARY DEPOSIT,,5000,13800\n"
+            "03/02/2024,NEFT to landlord,(300.50),,13499.50\n"
+            ",,,,\n"
+            "04/02/2024,Card purchase,25,,\n"
+        )
+        transactions, columns = extract_tabular_transactions(path, chunk_rows=2)
+
+        self.assertEqual([t.amount for t in transactions], [1200.0, 5000.0, 300.5, 25.0])
+        self.assertEqual([t.balance_difference for t in transactions], [-1200.0, 5000.0, -300.5, -25.0])
+        self.assertEqual(transactions[0].old_balance, 10000.0)
+        # A missing balance continues from the previous row
+        self.assertEqual(transactions[3].new_balance, 13474.5)
+        self.assertEqual([t.transaction_type for t in transactions], ['CASH_OUT', 'CASH_IN', 'TRANSFER', 'DEBIT'])
+        self.assertEqual(transactions[2].date, '03/02/2024')
+        self.assertTrue(np.array_equal(columns['amount'], [1200.0, 5000.0, 300.5, 25.0]))
+        self.assertTrue(np.array_equal(columns['type_TRANSFER'], [0, 0, 1, 0]))
+
+    def test_signed_amount_column_without_balance(self):
+        path = self._write_csv("Posting Date,Memo,Amount\n2024-01-01,Groceries,-45.5\n2024-01-02,Refund,12\n")
+        transactions, _ = extract_tabular_transactions(path)
+
+        self.assertEqual([(t.old_balance, t.new_balance) for t in transactions],
+                         [(0.0, -45.5), (-45.5, -33.5)])
+        self.assertEqual([t.transaction_type for t in transactions], ['DEBIT', 'CASH_IN'])
+
+    def test_opening_balance_row_anchors_and_printed_balances_reconcile(self):
+        path = self._write_csv(
+            "Date,Description,Debit,Credit,Balance\n"
+            "01/02/2024,Opening balance,,,1000.00\n"
+            "02/02/2024,Card purchase,100,,900.00\n"
+            "03/02/2024,Deposit,,50,960.00\n"
+        )
+        transactions, columns = extract_tabular_transactions(path)
+
+        self.assertEqual([(t.old_balance, t.new_balance) for t in transactions], [(1000.0, 900.0), (910.0, 960.0)])
+        self.assertEqual([t.balance_mismatch for t in transactions], [False, True])
+        self.assertEqual(columns['balance_mismatch'].tolist(), [False, True])
+        summary = summarize_columns(columns, transactions, statement_dates(transactions))
+        self.assertEqual(summary['balance_mismatches'], 1)
+
+
+class BalanceReconstructionTests(SimpleTestCase):
+    def test_text_balance_lines_anchor_and_reconcile(self):
+        balance = RunningBalance()
+        transactions = list(parse_transactions([
+            'Opening balance 1,000.00', '01/02/2024 POS PURCHASE DR 100.00', '02/02/2024 DEPOSIT 50.00',
+            'Closing balance 950.00',
+        ], balance))
+
+        self.assertEqual([(t.old_balance, t.new_balance) for t in transactions], [(1000.0, 900.0), (900.0, 950.0)])
+        self.assertFalse(any(t.balance_mismatch for t in transactions))
+        self.assertEqual(balance.to_dict(), {'balance': 950.0, 'anchored': True, 'last_row': [50.0, 900.0, True]})
+
+    def test_balance_before_the_first_row_reconciles_the_previous_block(self):
+        lines = ['Opening balance 1,000.00', '01/02/2024 POS PURCHASE DR 100.00', '02/02/2024 DEPOSIT 50.00',
+                 'Brought forward 940.00', '03/02/2024 POS PURCHASE DR 40.00']
+        whole = list(parse_transactions(lines))
+
+        balance = RunningBalance()
+        first = list(parse_transactions(lines[:3], balance))
+        second = list(parse_transactions(lines[3:], balance))
+        self.assertEqual(balance.correction, (890.0, 940.0, True))
+        first[-1].old_balance, first[-1].new_balance, first[-1].balance_mismatch = balance.correction
+        self.assertEqual(first + second, whole)
+        self.assertEqual([(t.new_balance, t.balance_mismatch) for t in whole],
+                         [(900.0, False), (940.0, True), (900.0, False)])
+
+    def test_csv_chunks_reconcile_a_balance_row_at_the_chunk_start(self):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        with open(path, 'w') as file:
+            file.write("Date,Description,Debit,Credit,Balance\n"
+                       "01/02/2024,Opening balance,,,1000.00\n"
+                       "02/02/2024,Card purchase,100,,\n"
+                       "03/02/2024,Deposit,,50,\n"
+                       "03/02/2024,Balance brought forward,,,940.00\n"
+                       "04/02/2024,Card purchase,40,,\n")
+
+        whole, _ = extract_tabular_transactions(path)
+        chunked, _ = extract_tabular_transactions(path, chunk_rows=3)
+        self.assertEqual(chunked, whole)
+        self.assertEqual([(t.new_balance, t.balance_mismatch) for t in whole],
+                         [(900.0, False), (940.0, True), (900.0, False)])
+
+    def test_unanchored_printed_balance_is_not_a_mismatch(self):
+        old_balance, new_balance, mismatch = reconstruct_balances([-100.0, 50.0, -25.0], [np.nan, 2000.0, 1900.0])
+
+        self.assertEqual(new_balance.tolist(), [-100.0, 2000.0, 1900.0])
+        self.assertEqual(old_balance.tolist(), [0.0, 1950.0, 1925.0])
+        self.assertEqual(mismatch.tolist(), [False, False, True])
+
+
+class LineClassifierParityTests(SimpleTestCase):
+    """
+    LineClassifier must parse lines exactly like the legacy per-line regex
+    parser it replaced, with the unreachable amount alternatives dropped
+    """
+
+    LINES = [
+        '01/02/2024 ATM WITHDRAWAL 200.00 1,800.00',
+        '02 Mar 24 SALARY DEPOSIT $3,250.50 5,050.50',
+        '03-Mar-2024 DIRECT DEBIT GAS (120.45) 4,930.05',
+        '04.03.2024 CARD PURCHASE €1.234,56 3.695,49',
+        'Mar 05, 2024 NEFT TRANSFER £ 75.00 CR 3,770.49',
+        '6/3/24 POS 12.5 DR 3,757.99',
+        '07-03-2024 BILL PAY ELECTRIC -89.10 3,668.89',
+        '08/03/2024 UPI 1 234.00',
+        '09/03/2024 FEE 15',
+        '11/03/2024 XFER TO SAVINGS 2,000 1,668.89',
+        '12/03/2024 CASHIN 5000.00 6668.89',
+        '13/03/2024 Payment received 1.000,00 7668,89',
+        'No date here 100.00',
+        '10/03/2024 memo without amounts',
+    ]
+
+    def _lines(self):
+        return self.LINES + statement_lines(2000, seed=3)
+
+    def test_amount_matches_are_unchanged(self):
+        legacy_re = re.compile('|'.join(AMOUNT_PATTERNS))
+        classifier = LineClassifier()
+        for line in self._lines():
+            self.assertEqual(classifier.amount_re.findall(line), legacy_re.findall(line), line)
+
+    def test_transactions_match_legacy_parser(self):
+        # Balances are derived differently (see balances.py), compare the parsed fields
+        balance_keys = ('oldbalanceOrg', 'newbalanceOrig', 'balance_difference', 'balance_mismatch')
+        lines = self._lines()
+        with contextlib.redirect_stdout(io.StringIO()):
+            legacy = list(legacy_parse_transactions(lines))
+            compiled = [transaction.to_dict() for transaction in parse_transactions(lines)]
+
+        self.assertEqual(len(compiled), len(legacy))
+        self.assertGreater(len(compiled), len(self.LINES))
+        for expected, actual in zip(legacy, compiled):
+            for key in balance_keys:
+                expected.pop(key, None)
+                actual.pop(key, None)
+            self.assertEqual(actual, expected)
+
+
+class TransactionRecordTests(SimpleTestCase):
+    def test_to_dict_matches_api_shape_and_round_trips(self):
+        record = TransactionRecord(6000.0, 7000.0, 1000.0, TYPE_CODES['TRANSFER'], '01/02/2024', 'NEFT rent')
+        data = record.to_dict()
+
+        self.assertEqual(list(data)[:5], ['amount', 'oldbalanceOrg', 'newbalanceOrig', 'oldbalanceDest',
+                                          'newbalanceDest'])
+        self.assertEqual((data['type_TRANSFER'], data['type_DEBIT']), (1, 0))
+        self.assertTrue(data['is_large_transaction'])
+        self.assertEqual(data['balance_difference'], -6000.0)
+        self.assertNotIn('is_fraudulent', data)
+
+        record.is_fraudulent, record.fraud_probability = True, 0.9
+        self.assertEqual(TransactionRecord.from_dict(record.to_dict()), record)
+
+
+class FeatureMatrixParityTests(SimpleTestCase):
+    def _transactions(self, count=500):
+        rng = np.random.default_rng(0)
+        amounts = np.round(rng.random(count) * 10000, 2)
+        amounts[:3] = [LARGE_TRANSACTION_AMOUNT, LARGE_TRANSACTION_AMOUNT - 0.01, 0.0]
+        balances = np.round(rng.random(count) * 50000, 2)
+        return [
+            TransactionRecord(float(amount), float(balance), float(balance - amount),
+                              int(rng.integers(len(TRANSACTION_TYPES))), '01/02/2024', f'line {index}')
+            for index, (amount, balance) in enumerate(zip(amounts, balances))
+        ]
+
+    def _legacy_frame(self, transactions, column_names):
+        # The per-row DataFrame scoring used before build_feature_matrix
+        frame = pd.DataFrame([transaction.to_dict() for transaction in transactions])[FEATURE_COLUMNS]
+        return frame.reindex(columns=column_names, fill_value=0)
+
+    def test_matrix_matches_legacy_dataframe(self):
+        transactions = self._transactions()
+        # Model columns in another order, one feature missing and one the statements do not provide
+        column_names = list(reversed(FEATURE_COLUMNS[1:])) + ['unknown_feature']
+
+        matrix = build_feature_matrix(build_feature_columns(transactions), column_names)
+        expected = self._legacy_frame(transactions, column_names).to_numpy(dtype=np.float32)
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_equal(matrix, expected)
+
+    def test_scores_match_legacy_dataframe(self):
+        transactions = self._transactions()
+        with tempfile.TemporaryDirectory() as directory:
+            with open(_fit_fraud_model(directory)[0], 'rb') as file:
+                model = pickle.load(file)
+
+        matrix = build_feature_matrix(build_feature_columns(transactions), FEATURE_COLUMNS)
+        np.testing.assert_array_equal(
+            model.predict_proba(pd.DataFrame(matrix, columns=FEATURE_COLUMNS)),
+            model.predict_proba(self._legacy_frame(transactions, FEATURE_COLUMNS)),
+        )
+
+
+class TopTransactionsTests(SimpleTestCase):
+    def test_matches_full_sort_with_ties(self):
+        values = np.random.default_rng(0).integers(0, 20, size=500).astype(float)
+        expected = sorted(range(len(values)), key=lambda index: values[index], reverse=True)
+        for k in (0, 1, 5, 37, 500, 600):
+            self.assertEqual(top_k_indices(values, k).tolist(), expected[:k])
+
+    def test_ranks_by_fraud_probability(self):
+        transactions = [TransactionRecord(amount, 0.0, 0.0, 0, '', '', fraud_probability=probability)
+                        for amount, probability in [(10.0, 80.0), (900.0, 5.0), (50.0, None), (20.0, 95.0)]]
+        self.assertEqual([t.amount for t in top_transactions(transactions, 2, 'fraud_probability')], [20.0, 10.0])
+        self.assertEqual([t.amount for t in top_transactions(transactions, 2, 'amount')], [900.0, 50.0])
+        with self.assertRaises(ValueError):
+            top_transactions(transactions, 2, 'description')
+
+    def test_ranks_balance_differences_by_size(self):
+        transactions = [TransactionRecord(amount, 1000.0, 1000.0 + change, 0, '', '')
+                        for amount, change in [(10.0, -500.0), (20.0, 30.0), (30.0, -40.0), (40.0, 200.0)]]
+        self.assertEqual([t.amount for t in top_transactions(transactions, 3, 'balance_difference')],
+                         [10.0, 40.0, 30.0])
+
+
+class StatementIndexTests(TestCase):
+    def _record(self, days_ago, amount, fraud_probability):
+        day = (date.today() - timedelta(days=days_ago)).strftime('%d/%m/%Y')
+        return TransactionRecord(amount, 0.0, -amount, TYPE_CODES['TRANSFER'], day, 'NEFT',
+                                 fraud_probability > 50, fraud_probability)
+
+    def test_high_risk_query_across_statements(self):
+        first = {'transactions': [self._record(10, 6000.0, 90.0), self._record(10, 7000.0, 10.0),
+                                  self._record(200, 8000.0, 95.0)], 'summary': {}}
+        second = {'transactions': [self._record(1, 12000.0, 70.0), self._record(2, 100.0, 99.0)], 'summary': {}}
+        index_statement('borrower-1', 'a.pdf', 'a' * 64, first, batch_size=2)
+        index_statement('borrower-1', 'b.pdf', 'b' * 64, second)
+        index_statement('borrower-2', 'c.pdf', 'c' * 64, first)
+
+        self.assertEqual(Transaction.objects.filter(account_id='borrower-1').count(), 5)
+        found = query_transactions('borrower-1', min_amount=5000, fraudulent=True, days=90)
+        self.assertEqual([t.amount for t in found], [12000.0, 6000.0])
+        self.assertEqual(found[1].date, date.today() - timedelta(days=10))
+
+
+class AccountQueryTests(FraudModelMixin, TestCase):
+    def _upload(self, path):
+        with open(path, 'rb') as file:
+            response = self.client.post('/api/upload/', {'files': [file], 'account_id': 'borrower-1'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['analysis_results'][0]
+
+    def test_reuploaded_statement_is_indexed_once(self):
+        path = self._statement_pdf('statement.pdf')
+        first = self._upload(path)
+        self._upload(path)
+
+        statements = self.client.get('/api/accounts/borrower-1/statements/').json()['statements']
+        self.assertEqual(len(statements), 1)
+        total = first['transaction_analysis']['total_transactions']
+        self.assertEqual(Transaction.objects.filter(account_id='borrower-1').count(), total)
+        response = self.client.get('/api/accounts/borrower-1/transactions/', {'limit': 1000})
+        self.assertEqual(response.json()['count'], total)
+
+    def test_out_of_range_filters_are_rejected(self):
+        for params in ({'limit': -5}, {'limit': 0}, {'days': 99999999999}, {'days': -1}):
+            response = self.client.get('/api/accounts/borrower-1/transactions/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+class AnalysisJobTests(FraudModelMixin, TestCase):
+    """
+    Jobs are run in the test thread: the worker pool is replaced by a
+    recorder and close_old_connections would close the test transaction.
+    The analysis process pool runs on a thread, with the test model.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.executor = mock.Mock()
+        pool = AnalysisPool(1, 1)
+        analysis_executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(analysis_executor.shutdown)
+        for target, name, value in ((jobs, '_get_executor', mock.Mock(return_value=self.executor)),
+                                    (jobs, 'close_old_connections', mock.Mock()),
+                                    (pool, '_get_executor', mock.Mock(return_value=analysis_executor)),
+                                    (offload, '_pool', pool)):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _enqueue(self, path, account_id=''):
+        with open(path, 'rb') as file:
+            response = self.client.post('/api/upload/', {'files': [file], 'async': 'true', 'account_id': account_id})
+        self.assertEqual(response.status_code, 202)
+        job = response.json()['jobs'][0]
+        self.executor.submit.assert_called_with(jobs.run_job, mock.ANY)
+        return job
+
+    def test_queued_job_runs_to_completion(self):
+        job = self._enqueue(self._statement_pdf('statement.pdf'), account_id='borrower-1')
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual((status['status'], status['progress'], status['result']), ('queued', 0, None))
+
+        # The progress stored when each stage starts
+        progress = []
+
+        def recording(function):
+            def record(*args):
+                progress.append(AnalysisJob.objects.get(id=job['job_id']).progress)
+                return function(*args)
+            return record
+
+        stages = ['analyze_bank_statement_pooled', 'build_file_report', 'index_statement']
+        with mock.patch.multiple(jobs, **{name: recording(getattr(jobs, name)) for name in stages}):
+            jobs.run_job(job['job_id'])
+        self.assertEqual(progress, [jobs.PROGRESS_ANALYZING, jobs.PROGRESS_REPORTING, jobs.PROGRESS_INDEXING])
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual((status['status'], status['progress'], status['error']), ('succeeded', 100, None))
+        self.assertEqual(status['result']['filename'], job['filename'])
+        self.assertIn('fraud_analysis', status['result'])
+        self.assertIn('statement_id', status['result'])
+        self.assertIsNotNone(status['finished_at'])
+
+        # A job submitted twice is only run once
+        with mock.patch.object(jobs, 'analyze_bank_statement_pooled') as analyze:
+            jobs.run_job(job['job_id'])
+        analyze.assert_not_called()
+
+    @override_settings(ANALYSIS_JOB_HEARTBEAT=0.05)
+    def test_analysis_runs_on_the_pool_with_heartbeats(self):
+        job = self._enqueue(self._statement_pdf('statement.pdf'))
+        analysis_threads = []
+        analyze = extract.analyze_bank_statement
+
+        def slow_analysis(path):
+            analysis_threads.append(threading.current_thread())
+            time.sleep(0.3)
+            return analyze(path)
+
+        with mock.patch.object(extract, 'analyze_bank_statement', side_effect=slow_analysis), \
+                mock.patch.object(jobs, '_heartbeat', wraps=jobs._heartbeat) as heartbeat:
+            jobs.run_job(job['job_id'])
+
+        self.assertEqual(len(analysis_threads), 1)
+        self.assertNotEqual(analysis_threads[0], threading.current_thread())
+        # Heartbeats while the pool analyzes, then one with the report progress
+        self.assertGreaterEqual(heartbeat.call_count, 3)
+        stored = AnalysisJob.objects.get(id=job['job_id'])
+        self.assertEqual(stored.status, AnalysisJob.SUCCEEDED)
+        self.assertGreater(stored.heartbeat_at, stored.started_at)
+
+    def test_failed_analysis_is_reported(self):
+        job = self._enqueue(self._statement_pdf('statement.pdf'))
+        with mock.patch.object(jobs, 'analyze_bank_statement_pooled', side_effect=ValueError('unreadable')):
+            jobs.run_job(job['job_id'])
+
+        status = self.client.get(job['status_url']).json()
+        self.assertEqual((status['status'], status['progress'], status['error']), ('failed', 100, 'unreadable'))
+
+    def test_unknown_job_is_not_found(self):
+        response = self.client.get('/api/jobs/00000000-0000-0000-0000-000000000000/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_jobs_without_a_recent_heartbeat_are_requeued(self):
+        now = timezone.now()
+        started = now - timedelta(hours=2)
+        stale = AnalysisJob.objects.create(filename='stale.pdf', file_path='stale.pdf', status=AnalysisJob.RUNNING,
+                                           progress=jobs.PROGRESS_REPORTING, started_at=started,
+                                           heartbeat_at=now - timedelta(minutes=10))
+        # Started before heartbeats were recorded
+        legacy = AnalysisJob.objects.create(filename='legacy.pdf', file_path='legacy.pdf',
+                                            status=AnalysisJob.RUNNING, started_at=started)
+        running = AnalysisJob.objects.create(filename='running.pdf', file_path='running.pdf',
+                                             status=AnalysisJob.RUNNING, started_at=started, heartbeat_at=now)
+
+        self.assertEqual(jobs.requeue_stale_jobs(timeout=300), 2)
+        for job in (stale, legacy, running):
+            job.refresh_from_db()
+        self.assertEqual((stale.status, stale.progress, stale.started_at, stale.heartbeat_at),
+                         (AnalysisJob.QUEUED, 0, None, None))
+        self.assertEqual(legacy.status, AnalysisJob.QUEUED)
+        self.assertEqual(running.status, AnalysisJob.RUNNING)
+
+
+class UploadStoreTests(TestCase):
+    def test_retention_keeps_files_of_pending_jobs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = UploadStore(directory, max_bytes=2500, max_age=3600)
+            uploads = [store.save(SimpleUploadedFile(f'{name}.csv', bytes([index]) * 1000))
+                       for index, name in enumerate(['stale', 'pending', 'old', 'new'])]
+            self.assertEqual(uploads[0].digest, hashlib.sha256(bytes([0]) * 1000).hexdigest())
+
+            now = time.time()
+            for age, upload in zip([7200, 7200, 60, 0], uploads):
+                os.utime(upload.path, (now - age, now - age))
+            AnalysisJob.objects.create(filename=uploads[1].filename, file_path=uploads[1].path)
+
+            store.evict()
+            self.assertEqual(sorted(os.listdir(directory)), sorted([uploads[1].filename, uploads[3].filename]))
+
+
+class DateParsingTests(SimpleTestCase):
+    def test_parse_statement_date(self):
+        self.assertEqual(parse_statement_date('03/02/2024'), date(2024, 2, 3))
+        self.assertEqual(parse_statement_date('Feb 03, 2024'), date(2024, 2, 3))
+        self.assertIsNone(parse_statement_date('not a date'))
+
+    def test_month_first_statement_is_detected(self):
+        date_strings = ['03/02/2024', '12/31/2024', '03/02/2024', 'Jan 05, 2024', 'n/a']
+        parser = DateParser.for_statement(date_strings)
+
+        self.assertEqual(parser.date_format, '%m/%d/%Y')
+        dates = parser.column(date_strings)
+        self.assertEqual(dates.dtype, np.dtype('datetime64[D]'))
+        self.assertEqual([str(value) for value in dates],
+                         ['2024-03-02', '2024-12-31', '2024-03-02', '2024-01-05', 'NaT'])
+        self.assertEqual(date_range(dates), '2024-01-05 to 2024-12-31')
+
+    def test_comma_without_a_space(self):
+        self.assertEqual(parse_statement_date('Jan 05,2024'), date(2024, 1, 5))
+        self.assertEqual(DateParser.for_statement(['Jan 05,2024', 'Feb 10,2024']).date_format, '%b %d, %Y')
+
+    def test_four_digit_year_is_not_truncated(self):
+        self.assertEqual(parse_statement_date('01 Jan 2024'), date(2024, 1, 1))
+        self.assertEqual(parse_statement_date('01 Jan 24'), date(2024, 1, 1))
+        self.assertEqual(DateParser.for_statement(['01 Jan 2024', '02 Feb 2024']).date_format, '%d %b %Y')
+        transaction, = parse_transactions(['01 Jan 2024 POS PURCHASE DR 100.00'])
+        self.assertEqual(transaction.date, '01 Jan 2024')
+        self.assertEqual(statement_dates([transaction]).tolist(), [date(2024, 1, 1)])
+
+
+class VelocityFeatureTests(SimpleTestCase):
+    def test_windows_follow_dates_not_statement_order(self):
+        dates = np.array(['2024-01-10', '2024-01-01', '2024-01-10', '2024-01-05', 'NaT'], dtype='datetime64[D]')
+        columns = {
+            'amount': np.array([100.0, 10.0, 20.0, 5000.0, 1.0]),
+            'type_CASH_OUT': np.array([1.0, 0.0, 1.0, 0.0, 0.0]),
+            'is_large_transaction': np.array([0.0, 0.0, 0.0, 1.0, 0.0]),
+        }
+        features = velocity_features(columns, dates)
+
+        # The undated last row takes the date of the row before it
+        self.assertEqual(features['txn_count_1d'].tolist(), [1, 1, 2, 1, 2])
+        self.assertEqual(features['amount_sum_7d'].tolist(), [5101, 10, 5121, 5010, 5011])
+        self.assertEqual(features['cash_out_count_30d'].tolist(), [1, 0, 2, 0, 0])
+        self.assertEqual(features['amount_sum_last_5'].tolist(), [5111, 10, 5131, 5010, 5011])
+        self.assertEqual(features['days_since_large_transaction'].tolist(), [5, -1, 5, -1, 0])
+
+    def test_models_without_velocity_columns_are_unchanged(self):
+        columns = {'amount': np.array([1.0])}
+        dates = np.array(['2024-01-01'], dtype='datetime64[D]')
+        self.assertEqual(model_velocity_features(['amount', 'type_CASH_OUT'], columns, dates), {})
+        self.assertEqual(list(model_velocity_features(['amount', 'txn_count_7d'], columns, dates)), ['txn_count_7d'])
+
+
+class StreamedUploadTests(FraudModelMixin, TestCase):
+    def _stream(self, path):
+        with open(path, 'rb') as file:
+            response = self.client.post('/api/upload/stream/', {'files': [file]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    @override_settings(ANALYSIS_STREAM_BATCH_SIZE=10)
+    def test_batches_match_whole_statement(self):
+        path = self._statement_pdf('statement.pdf', page_count=2)
+        lines = self._stream(path)
+
+        self.assertEqual(lines[0], {'filename': os.path.basename(lines[0]['filename'])})
+        batches = [line['transactions'] for line in lines[1:-1]]
+        self.assertGreater(len(batches), 1)
+        self.assertTrue(all(len(batch) <= 10 for batch in batches))
+
+        whole = analyze_bank_statement(path)
+        self.assertEqual([transaction for batch in batches for transaction in batch],
+                         [transaction.to_dict() for transaction in whole['transactions']])
+        self.assertEqual(lines[-1]['summary']['total_transactions'], whole['summary']['total_transactions'])
+        self.assertEqual(lines[-1]['summary']['fraud_analysis'], whole['summary']['fraud_analysis'])
+
+    def test_only_one_pdf_is_streamed(self):
+        csv = SimpleUploadedFile('statement.csv', b'Date,Amount\n01/02/2024,10\n')
+        self.assertEqual(self.client.post('/api/upload/stream/', {'files': [csv]}).status_code, 400)
+        self.assertEqual(self.client.post('/api/upload/stream/').status_code, 400)
+
+    def test_velocity_windows_reach_back_one_batch(self):
+        column_names = FEATURE_COLUMNS + ['amount_sum_last_5', 'amount_sum_last_20']
+        registry.register('velocity', *_fit_fraud_model(self.directory, name='velocity',
+                                                        column_names=column_names), default=True)
+        self.addCleanup(registry.unregister, 'velocity')
+        # One purchase a day, so the windows cover the transactions in statement order
+        path = os.path.join(self.directory, 'statement.pdf')
+        first_day = date(2024, 1, 1)
+        write_statement_pdf(path, [[f"{(first_day + timedelta(days=day)):%d/%m/%Y} CARD PURCHASE {100 + day}.00"
+                                    for day in range(40)]])
+
+        with mock.patch.object(ModelVersion, 'predict_proba', autospec=True,
+                               side_effect=ModelVersion.predict_proba) as predict_proba:
+            transactions = [transaction for item in analyze_bank_statement_stream(path, batch_size=10)
+                            for transaction in item.get('transactions', [])]
+        streamed = np.concatenate([call.args[1] for call in predict_proba.call_args_list])
+
+        date_strings = [transaction.date for transaction in transactions]
+        dates = DateParser.for_statement(date_strings).column(date_strings)
+        whole = velocity_features(build_feature_columns(transactions), dates)
+        last_5 = streamed[:, column_names.index('amount_sum_last_5')]
+        last_20 = streamed[:, column_names.index('amount_sum_last_20')]
+
+        # Five transactions always fit in the batch and the one before it
+        np.testing.assert_allclose(last_5, whole['amount_sum_last_5'], rtol=1e-6)
+        # Twenty do not: from the third batch on, the window is cut at the previous batch
+        self.assertEqual(len(transactions), 40)
+        np.testing.assert_allclose(last_20[:20], whole['amount_sum_last_20'][:20], rtol=1e-6)
+        np.testing.assert_allclose(last_20[20:], [sum(range(90 + day - day % 10, 101 + day))
+                                                  for day in range(20, 40)], rtol=1e-6)
+        self.assertLess(last_20[20:].sum(), whole['amount_sum_last_20'][20:].sum())
+
+
+class StartupTests(SimpleTestCase):
+    def test_boot_does_not_load_analysis_dependencies(self):
+        report = profile_boot()
+        self.assertEqual(report['first_response_status'], 200)
+        self.assertEqual(report['heavy_at_boot'], [])
+        self.assertLessEqual(report['setup'], report['first_response'])
+
+    def test_import_times_by_package(self):
+        output = ('import time: self [us] | cumulative | imported package\n'
+                  'import time:      1500 |       1500 |   numpy.core\n'
+                  'import time:       500 |       2000 | numpy\n'
+                  'import time:       250 |        250 | json\n')
+        self.assertEqual(import_times(output), [('numpy', 2.0), ('json', 0.25)])
+
+
+class IncrementalAnalysisTests(FraudModelMixin, SimpleTestCase):
+    def test_unchanged_pages_keep_their_fingerprints(self):
+        paths = []
+        for page_count in (2, 3):
+            fd, path = tempfile.mkstemp(suffix='.pdf')
+            os.close(fd)
+            self.addCleanup(os.remove, path)
+            statement_pdf(path, page_count=page_count, lines_per_page=30)
+            paths.append(path)
+
+        fingerprints = []
+        for path in paths:
+            with pdfplumber.open(path) as pdf:
+                fingerprints.append([page_fingerprint(page) for page in pdf.pages])
+        self.assertEqual(fingerprints[0], fingerprints[1][:2])
+        self.assertEqual(len(set(fingerprints[1])), 3)
+
+    def test_scanned_pages_fingerprint_by_their_image(self):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        pages = [Image.new('L', (200, 100), color) for color in (255, 0, 255)]
+        pages[0].save(path, save_all=True, append_images=pages[1:])
+
+        with pdfplumber.open(path) as pdf:
+            fingerprints = [page_fingerprint(page) for page in pdf.pages]
+        self.assertNotEqual(fingerprints[0], fingerprints[1])
+        self.assertEqual(fingerprints[0], fingerprints[2])
+
+    def test_merged_summaries_match_whole_statement(self):
+        transactions = [TransactionRecord(float(amount), 100.0, 100.0 - amount, amount % 5,
+                                          f'0{amount % 9 + 1}/01/2024', '')
+                         for amount in range(1, 40)]
+        probabilities = np.linspace(0, 1, len(transactions))
+
+        whole = StreamingSummary()
+        whole.add(transactions, probabilities)
+        merged = StreamingSummary()
+        for start in range(0, len(transactions), 7):
+            part = StreamingSummary()
+            part.add(transactions[start:start + 7], probabilities[start:start + 7])
+            merged.merge(StreamingSummary.from_dict(part.to_dict()))
+        self.assertEqual(merged.result(), whole.result())
+
+    def _write_statement(self, name, pages):
+        path = os.path.join(self.directory, name)
+        write_statement_pdf(path, pages)
+        return path
+
+    def _assert_matches_full_analysis(self, path):
+        result = analyze_bank_statement(path)
+        with override_settings(INCREMENTAL_ANALYSIS=False):
+            full = analyze_bank_statement(path)
+        self.assertEqual([t.to_dict() for t in result['transactions']], [t.to_dict() for t in full['transactions']])
+        self.assertEqual(result['summary'], full['summary'])
+        return full
+
+    def test_balance_line_at_a_page_boundary_matches_full_analysis(self):
+        path = self._write_statement('statement.pdf', [
+            ['Opening balance 1,000.00', '01/02/2024 POS PURCHASE DR 100.00', '02/02/2024 DEPOSIT 50.00'],
+            ['Balance brought forward 940.00', '03/02/2024 POS PURCHASE DR 40.00'],
+        ])
+        # The second run takes the page with the balance line from the page cache
+        for _ in range(2):
+            full = self._assert_matches_full_analysis(path)
+        self.assertEqual([(t.new_balance, t.balance_mismatch) for t in full['transactions']],
+                         [(900.0, False), (940.0, True), (900.0, False)])
+
+    def test_table_balance_row_at_a_page_boundary_matches_full_analysis(self):
+        header = [(x, name) for name, x in TABLE_COLUMNS]
+        path = self._write_statement('statement.pdf', [
+            [header, [(40, '01/02/2024'), (110, 'Opening balance'), (490, '1,000.00')],
+             [(40, '01/02/2024'), (110, 'Card purchase'), (330, '100.00')],
+             [(40, '02/02/2024'), (110, 'Salary deposit'), (410, '50.00')]],
+            [header, [(40, '02/02/2024'), (110, 'Balance brought forward'), (490, '940.00')],
+             [(40, '03/02/2024'), (110, 'Card purchase'), (330, '40.00')]],
+        ])
+        for _ in range(2):
+            full = self._assert_matches_full_analysis(path)
+        self.assertEqual([(t.new_balance, t.balance_mismatch) for t in full['transactions']],
+                         [(900.0, False), (940.0, True), (900.0, False)])
+
+    def test_reupload_with_a_changed_page_parses_only_that_page(self):
+        lines = statement_lines(90, seed=3)
+        pages = [lines[start:start + 30] for start in range(0, 90, 30)]
+        self._assert_matches_full_analysis(self._write_statement('statement.pdf', pages))
+
+        # A note that leaves the balance carried into the last page unchanged
+        pages[1] = pages[1] + ['Interest rates are subject to change']
+        path = self._write_statement('changed.pdf', pages)
+        with mock.patch.object(incremental, '_read_text_page', wraps=incremental._read_text_page) as read_page:
+            self._assert_matches_full_analysis(path)
+        self.assertEqual([call.args[2] for call in read_page.call_args_list], [2])
+
+
+class BatchedScoringTests(FraudModelMixin, TestCase):
+    def test_upload_of_several_pdfs_calls_the_model_once(self):
+        paths = [self._statement_pdf(f'statement{seed}.pdf', seed=seed) for seed in range(3)]
+        with mock.patch.object(ModelVersion, 'predict_proba', autospec=True,
+                               side_effect=ModelVersion.predict_proba) as predict_proba:
+            files = [open(path, 'rb') for path in paths]
+            try:
+                response = self.client.post('/api/upload/', {'files': files})
+            finally:
+                for file in files:
+                    file.close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(predict_proba.call_count, 1)
+        reports = response.json()['analysis_results']
+        self.assertEqual(len(reports), 3)
+        self.assertTrue(all(report['transaction_analysis']['total_transactions'] for report in reports))
+        self.assertEqual(sum(len(call.args[1]) for call in predict_proba.call_args_list),
+                         sum(report['transaction_analysis']['total_transactions'] for report in reports))
+
+    def test_batched_scores_match_scoring_each_file_alone(self):
+        paths = [self._statement_pdf(f'statement{seed}.pdf', seed=seed) for seed in range(2)]
+        csv_path = os.path.join(self.directory, 'statement.csv')
+        with open(csv_path, 'w') as file:
+            file.write("Date,Description,Debit,Credit,Balance\n"
+                       "01/02/2024,ATM WITHDRAWAL,1200.00,,8800.00\n"
+                       "02/02/2024,SALARY DEPOSIT,,7000,15800\n"
+                       "03/02/2024,NEFT to landlord,300.50,,15499.50\n")
+        paths.insert(1, csv_path)
+
+        def analyze(function):
+            # A fresh page cache, so no file reuses the scores of the other run
+            page_cache = result_cache.ResultCache(tempfile.mkdtemp(dir=self.directory), 10 ** 9, 3600)
+            with mock.patch.object(result_cache, '_page_cache', page_cache):
+                return function()
+
+        alone = [analyze(lambda: analyze_bank_statement(path)) for path in paths]
+        batched = analyze(lambda: analyze_bank_statements(paths))
+
+        for single, batch in zip(alone, batched):
+            self.assertTrue(single['transactions'])
+            self.assertEqual([(t.amount, t.fraud_probability, t.is_fraudulent) for t in batch['transactions']],
+                             [(t.amount, t.fraud_probability, t.is_fraudulent) for t in single['transactions']])
+            self.assertEqual(batch['summary']['fraud_analysis'], single['summary']['fraud_analysis'])
+
+
+class ResultCacheTests(FraudModelMixin, SimpleTestCase):
+    def test_unscored_results_are_not_cached(self):
+        path = self._statement_pdf('statement.pdf')
+        with mock.patch.object(ModelVersion, 'predict_proba', side_effect=RuntimeError('model unavailable')):
+            unscored = analyze_bank_statement_cached(path)
+        self.assertTrue(unscored['transactions'])
+        self.assertNotIn('fraud_analysis', unscored['summary'])
+        self.assertFalse(os.path.exists(result_cache.get_result_cache().directory))
+
+        scored = analyze_bank_statement_cached(path)
+        self.assertIn('fraud_analysis', scored['summary'])
+        self.assertEqual(len(os.listdir(result_cache.get_result_cache().directory)), 1)
+        with mock.patch.object(ModelVersion, 'predict_proba') as predict_proba:
+            self.assertEqual(analyze_bank_statement_cached(path)['summary'], scored['summary'])
+        predict_proba.assert_not_called()
+
+
+class ParallelPdfExtractionTests(SimpleTestCase):
+    @override_settings(PDF_PARALLEL_MIN_PAGES=4)
+    def test_parallel_extraction_matches_sequential(self):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        statement_pdf(path, page_count=6, lines_per_page=30)
+
+        with override_settings(PDF_EXTRACT_WORKERS=1):
+            sequential = extract.extract_text_from_pdf(path)
+        # Fail instead of silently falling back to sequential extraction
+        with override_settings(PDF_EXTRACT_WORKERS=3), \
+                mock.patch.object(extract, '_extract_pages_parallel', wraps=extract._extract_pages_parallel) as pool, \
+                mock.patch.object(extract.logger, 'warning', side_effect=AssertionError):
+            parallel = extract.extract_text_from_pdf(path)
+        pool.assert_called_once()
+        self.assertEqual(parallel, sequential)
+        self.assertIn('Statement page 6', parallel)
+
+
+class TablePdfExtractionTests(SimpleTestCase):
+    def _pdf_path(self):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_rows_map_to_debit_credit_and_balance_columns(self):
+        path = self._pdf_path()
+        row_count = table_statement_pdf(path, page_count=2, rows_per_page=20, seed=1)
+
+        transactions, columns = extract_table_transactions(path)
+        self.assertEqual(len(transactions), row_count)
+        # Every row's balance follows from the previous one and its signed amount
+        self.assertTrue(np.allclose(columns['oldbalanceOrg'][1:], columns['newbalanceOrig'][:-1]))
+        self.assertTrue(np.allclose(np.abs(columns['balance_difference']), columns['amount']))
+
+    def test_iso_dates_are_read_whole(self):
+        path = self._pdf_path()
+        header = [(x, name) for name, x in TABLE_COLUMNS]
+        write_statement_pdf(path, [[header,
+                                    [(40, '2024-01-05'), (110, 'Card purchase'), (330, '100.00'), (490, '900.00')],
+                                    [(40, '2024-02-10'), (110, 'Salary deposit'), (410, '50.00'), (490, '950.00')],
+                                    [(40, '11/02/2024'), (110, 'Card purchase'), (330, '25.00'), (490, '925.00')]]])
+
+        transactions, _ = extract_table_transactions(path)
+        self.assertEqual([t.date for t in transactions], ['2024-01-05', '2024-02-10', '11/02/2024'])
+        self.assertEqual([str(value) for value in statement_dates(transactions)],
+                         ['2024-01-05', '2024-02-10', '2024-02-11'])
+
+    def test_text_statement_has_no_table_layout(self):
+        path = self._pdf_path()
+        statement_pdf(path, page_count=1, lines_per_page=30)
+        self.assertIsNone(extract_table_transactions(path))
+
+
+class OcrTimeoutTests(SimpleTestCase):
+    @override_settings(OCR_WORKERS=2, OCR_PAGE_TIMEOUT=0.1, OCR_RENDER_TIMEOUT=0.1)
+    def test_page_stuck_rendering_times_out(self):
+        image_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, image_dir)
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+
+        def render(pdf_path, page_index, fingerprint, dpi, image_dir):
+            if page_index == 0:
+                time.sleep(1)
+            return Image.new('L', (10, 10))
+
+        with override_settings(OCR_IMAGE_CACHE_DIR=image_dir), \
+                mock.patch.object(ocr, 'ocr_available', return_value=True), \
+                mock.patch.object(ocr, '_get_ocr_pool', return_value=executor), \
+                mock.patch.object(ocr, '_page_image', side_effect=render), \
+                mock.patch('pytesseract.image_to_string', return_value='scanned text'), \
+                mock.patch.object(ocr.OCR_PAGES, 'inc') as pages_counted:
+            started = time.monotonic()
+            texts = ocr.ocr_pages('scan.pdf', [(1, 'a' * 64), (2, 'b' * 64)])
+
+        self.assertLess(time.monotonic() - started, 0.9)
+        self.assertEqual(texts, {2: 'scanned text'})
+        self.assertEqual(sorted(call.kwargs['result'] for call in pages_counted.call_args_list), ['text', 'timeout'])
@@ -3,4 +3,10 @@ from . import views
 
 urlpatterns = [
     path('upload/', views.upload_files, name='upload_files'),
+    path('upload/concurrent/', views.upload_files_async, name='upload_files_async'),
+    path('upload/stream/', views.upload_stream, name='upload_stream'),
+    path('jobs/<uuid:job_id>/', views.job_status, name='job_status'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('accounts/<str:account_id>/statements/', views.account_statements, name='account_statements'),
+    path('accounts/<str:account_id>/transactions/', views.account_transactions, name='account_transactions'),
 ]
\ No newline at end of file
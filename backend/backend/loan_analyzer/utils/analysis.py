@@ -1,33 +1,42 @@
-import pandas as pd
+import os
 import pickle
 
+import pandas as pd
+
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    with open(os.path.join(UTILS_DIR, 'random_forest_fraud_model.pkl'), 'rb') as file:
+        loaded_model = pickle.load(file)
+
+    with open(os.path.join(UTILS_DIR, 'column_names.pkl'), 'rb') as file:
+        column_names = pickle.load(file)
 
-with open("/home/alex/Documents/loan/backend/backend/loan_analyzer/utils/random_forest_fraud_model.pkl", 'rb') as file:
-    loaded_model = pickle.load(file)
+    test_data_point = {
+        'amount': 5000,
+        'oldbalanceOrg': 10000,
+        'newbalanceOrig': 5000,
+        'oldbalanceDest': 2000,
+        'newbalanceDest': 7000,
+        'type_CASH_IN': 0,
+        'type_CASH_OUT': 1,
+        'type_DEBIT': 0,
+        'type_PAYMENT': 0,
+        'type_TRANSFER': 0,
+        'is_large_transaction': True,
+        'balance_difference': -5000
+    }
+    test_data_point_df = pd.DataFrame([test_data_point])
 
-with open("/home/alex/Documents/loan/backend/backend/loan_analyzer/utils/column_names.pkl", 'rb') as file:
-    column_names = pickle.load(file)
+    test_data_point_df = test_data_point_df.reindex(columns=column_names, fill_value=0)
 
-test_data_point = {
-    'amount': 5000,
-    'oldbalanceOrg': 10000,
-    'newbalanceOrig': 5000,
-    'oldbalanceDest': 2000,
-    'newbalanceDest': 7000,
-    'type_CASH_IN': 0,
-    'type_CASH_OUT': 1,
-    'type_DEBIT': 0,
-    'type_PAYMENT': 0,
-    'type_TRANSFER': 0,
-    'is_large_transaction': True,
-    'balance_difference': -5000
-}
-test_data_point_df = pd.DataFrame([test_data_point])
+    prediction = loaded_model.predict(test_data_point_df)
+    print(f"Predicted class: {prediction[0]}")
 
-test_data_point_df = test_data_point_df.reindex(columns=column_names, fill_value=0)
+    prediction_proba = loaded_model.predict_proba(test_data_point_df)
+    print(f"Prediction probabilities: {prediction_proba}")
 
-prediction = loaded_model.predict(test_data_point_df)
-print(f"Predicted class: {prediction[0]}")
 
-prediction_proba = loaded_model.predict_proba(test_data_point_df)
-print(f"Prediction probabilities: {prediction_proba}")
+if __name__ == "__main__":
+    main()
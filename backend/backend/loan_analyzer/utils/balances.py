@@ -0,0 +1,117 @@
+import numpy as np
+
+# Printed balances further than this from the reconstructed one are mismatches
+BALANCE_TOLERANCE = 0.005
+
+# Balances are rounded to cents, so they do not depend on where a statement
+# was split into blocks (the float sums would differ in the last bits)
+BALANCE_DECIMALS = 2
+
+
+def reconstruct_balances(signed_amounts, printed_balances=None, opening_balance=0.0, anchored=False,
+                         tolerance=BALANCE_TOLERANCE):
+    """
+    Vectorized running balance of a block of transactions
+    `signed_amounts` are credits as positive and debits as negative amounts;
+    `printed_balances` holds the balance a statement printed after a row, NaN
+    where it printed none. Each row's balance is the last printed balance at
+    or before it (opening_balance before the first one) plus the cumulative
+    sum of the amounts since, so a printed balance always wins over the
+    reconstructed one.
+    A printed balance is reconciled with the previous row's balance plus its
+    amount once the balance is anchored: by a printed balance before it, or
+    by opening_balance when `anchored` is set.
+    Returns (old_balance, new_balance, mismatch) arrays.
+    """
+    signed = np.asarray(signed_amounts, dtype=np.float64)
+    count = len(signed)
+    if printed_balances is None:
+        printed = np.full(count, np.nan)
+    else:
+        printed = np.asarray(printed_balances, dtype=np.float64)
+    known = ~np.isnan(printed)
+
+    # Index of the last row with a printed balance at or before each row, -1 if none
+    last_known = np.maximum.accumulate(np.where(known, np.arange(count), -1))
+    has_known = last_known >= 0
+    carried = np.cumsum(np.where(known, 0.0, signed))
+    base = np.where(has_known, printed[np.maximum(last_known, 0)], opening_balance)
+    carried -= np.where(has_known, carried[np.maximum(last_known, 0)], 0.0)
+    new_balance = np.round(base + carried, BALANCE_DECIMALS)
+    old_balance = np.round(new_balance - signed, BALANCE_DECIMALS)
+
+    previous_balance = np.concatenate(([opening_balance], new_balance[:-1]))
+    previous_anchored = np.concatenate(([anchored], has_known[:-1] | anchored))
+    mismatch = known & previous_anchored & (np.abs(printed - (previous_balance + signed)) > tolerance)
+    return old_balance, new_balance, mismatch
+
+
+class RunningBalance:
+    """
+    Balance carried from one block of transactions of a statement into the
+    next (chunks of a CSV, pages of a PDF).
+
+    Until an opening balance or a printed balance is seen the balance is not
+    anchored: it counts from 0 and is not reconciled with printed balances.
+    A balance printed before the first transaction of a block is the one
+    after the previous block's last transaction: reconcile_previous() sets
+    `correction` to the balances that transaction takes, for the caller
+    holding it to apply.
+    """
+
+    def __init__(self, balance=0.0, anchored=False, last_row=None):
+        self.balance = balance
+        self.anchored = anchored
+        # (signed amount, balance before it, anchored before it) of the last transaction
+        self.last_row = last_row
+        self.correction = None
+
+    def anchor(self, balance):
+        """
+        Continue from a balance printed before the next transaction, e.g. an
+        opening or brought forward balance line
+        """
+        self.balance = balance
+        self.anchored = True
+
+    def reconcile_previous(self, balance):
+        """
+        Anchor a balance printed before the first transaction of a block and
+        reconcile it with the last transaction of the blocks before, as
+        reconstruct_balances would have within one block
+        Sets `correction` to that transaction's (old_balance, new_balance,
+        mismatch), None when the statement opens with the balance.
+        """
+        if self.last_row is not None:
+            signed, previous, previous_anchored = self.last_row
+            new_balance = float(np.round(balance, BALANCE_DECIMALS))
+            self.correction = (float(np.round(new_balance - signed, BALANCE_DECIMALS)), new_balance,
+                               previous_anchored and abs(balance - (previous + signed)) > BALANCE_TOLERANCE)
+        self.anchor(balance)
+
+    def reconstruct(self, signed_amounts, printed_balances=None):
+        """
+        reconstruct_balances for the next block, continuing from this balance
+        Returns (old_balance, new_balance, mismatch).
+        """
+        old_balance, new_balance, mismatch = reconstruct_balances(signed_amounts, printed_balances,
+                                                                  self.balance, self.anchored)
+        count = len(new_balance)
+        if count:
+            previous_anchored = self.anchored or (printed_balances is not None
+                                                  and not np.isnan(printed_balances[:-1]).all())
+            self.last_row = (float(signed_amounts[-1]), float(new_balance[-2]) if count > 1 else self.balance,
+                             bool(previous_anchored))
+            self.balance = float(new_balance[-1])
+            if printed_balances is not None and not np.isnan(printed_balances).all():
+                self.anchored = True
+        return old_balance, new_balance, mismatch
+
+    def to_dict(self):
+        return {'balance': self.balance, 'anchored': self.anchored,
+                'last_row': None if self.last_row is None else list(self.last_row)}
+
+    @classmethod
+    def from_dict(cls, data):
+        last_row = data.get('last_row')
+        return cls(data['balance'], data['anchored'], None if last_row is None else tuple(last_row))
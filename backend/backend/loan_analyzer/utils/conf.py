@@ -0,0 +1,10 @@
+def get_setting(name, default):
+    """
+    Read an optional Django setting, falling back to `default` when the
+    utilities are used outside a configured Django project
+    """
+    from django.conf import settings
+
+    if not settings.configured:
+        return default
+    return getattr(settings, name, default)
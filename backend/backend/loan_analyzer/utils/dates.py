@@ -0,0 +1,123 @@
+from datetime import datetime
+
+import numpy as np
+
+# strptime formats of the dates matched by line_classifier.DATE_PATTERNS, plus
+# the ISO dates of XLSX cells; day-first formats are tried before month-first
+# and four-digit years before two-digit ones
+DATE_FORMATS = ['%d %b %Y', '%d %b %y', '%d-%b-%Y', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%b %d, %Y',
+                '%d/%m/%y', '%d-%m-%y', '%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y', '%m-%d-%Y']
+
+# Distinct date strings a statement's date format is detected from
+DATE_SAMPLE_SIZE = 200
+
+
+def _normalize(text):
+    # "Jan 05,2024" is read like "Jan 05, 2024"
+    return ' '.join(str(text).replace(',', ', ').split())
+
+
+def _strptime(text, date_format):
+    try:
+        return datetime.strptime(text, date_format).date()
+    except ValueError:
+        return None
+
+
+def parse_statement_date(text):
+    """
+    Returns the date of a statement date string, or None if it does not
+    match any of DATE_FORMATS
+    """
+    text = _normalize(text)
+    for date_format in DATE_FORMATS:
+        date = _strptime(text, date_format)
+        if date is not None:
+            return date
+    return None
+
+
+def detect_date_format(date_strings, sample_size=DATE_SAMPLE_SIZE):
+    """
+    The DATE_FORMATS entry that parses the most of the first sample_size
+    distinct date strings of a statement, or None if none parses any
+    Ties go to the earlier format, so ambiguous dates such as 03/02/2024
+    are read day-first unless the sample shows a month-first date.
+    """
+    sample = []
+    seen = set()
+    for text in date_strings:
+        if text not in seen:
+            seen.add(text)
+            sample.append(_normalize(text))
+            if len(sample) >= sample_size:
+                break
+
+    best_format, best_count = None, 0
+    for date_format in DATE_FORMATS:
+        count = sum(_strptime(text, date_format) is not None for text in sample)
+        if count > best_count:
+            best_format, best_count = date_format, count
+    return best_format
+
+
+class DateParser:
+    """
+    Parses the dates of one statement.
+
+    Every string is tried with the statement's dominant format first (see
+    detect_date_format) and only falls back to the other DATE_FORMATS when
+    it does not match. Statements repeat the same few dates, so each
+    distinct string is parsed once and looked up afterwards.
+    """
+
+    def __init__(self, date_format=None):
+        self.date_format = date_format
+        self._parsed = {}
+
+    @classmethod
+    def for_statement(cls, date_strings):
+        return cls(detect_date_format(date_strings))
+
+    def parse(self, text):
+        """
+        Returns the date of a date string, or None if it cannot be parsed
+        """
+        try:
+            return self._parsed[text]
+        except KeyError:
+            pass
+        date = None
+        if self.date_format is not None:
+            date = _strptime(_normalize(text), self.date_format)
+        if date is None:
+            date = parse_statement_date(text)
+        self._parsed[text] = date
+        return date
+
+    def column(self, date_strings):
+        """
+        The dates as a datetime64[D] array, NaT where a string cannot be parsed
+        """
+        parse = self.parse
+        return np.array([parse(text) for text in date_strings], dtype='datetime64[D]')
+
+
+def statement_dates(transactions):
+    """
+    datetime64[D] column of the dates of a statement's TransactionRecords,
+    parsed with the format detected from them
+    """
+    date_strings = [transaction.date for transaction in transactions]
+    return DateParser.for_statement(date_strings).column(date_strings)
+
+
+def date_range(dates):
+    """
+    'YYYY-MM-DD to YYYY-MM-DD' from the earliest to the latest parsed date,
+    or None when no date could be parsed
+    """
+    parsed = dates[~np.isnat(dates)]
+    if not len(parsed):
+        return None
+    return f"{parsed.min()} to {parsed.max()}"
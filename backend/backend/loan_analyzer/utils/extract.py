@@ -1,42 +1,201 @@
-import pandas as pd
+import hashlib
+import logging
 import numpy as np
 import pdfplumber
-import re
-import pickle
 import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pdfminer.pdftypes import PDFStream, resolve1
+from .balances import RunningBalance
+from .conf import get_setting
+from .features import annotate_transactions, build_feature_columns, build_feature_matrix, fraud_scores
+from .line_classifier import LineClassifier
+from .metrics import PAGES_EXTRACTED, STAGE_SECONDS, STATEMENT_LINES, STATEMENTS_ANALYZED, timed
+from .model_registry import get_model
+from .ocr import ocr_available, ocr_pages
+from .pdf_tables import extract_table_transactions
+from .dates import DateParser, statement_dates
+from .summary import StreamingSummary, summarize_columns
+from .tabular import extract_tabular_transactions, is_tabular
+from .transactions import TYPE_CODES, TransactionRecord
+from .velocity import model_velocity_features, uses_velocity_features
 
-def extract_text_from_pdf(pdf_path):
+logger = logging.getLogger(__name__)
+
+_page_pool = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+
+# Transactions of text statements whose balances are reconstructed together
+BALANCE_BLOCK_ROWS = 512
+
+
+def _get_page_pool(workers):
+    """
+    Returns the process pool used for page-parallel extraction. Workers are
+    spawned rather than forked so the pool is safe to start from a threaded
+    server, and the pool is kept for the lifetime of the process.
+    """
+    global _page_pool, _page_pool_workers
+    with _page_pool_lock:
+        if _page_pool is None or _page_pool_workers != workers:
+            if _page_pool is not None:
+                _page_pool.shutdown(wait=False)
+            _page_pool = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+            _page_pool_workers = workers
+        return _page_pool
+
+
+def _hash_xobjects(digest, resources, seen):
+    xobjects = resolve1(resources.get('XObject')) if resources else None
+    for name in sorted(xobjects or {}):
+        stream = resolve1(xobjects[name])
+        if not isinstance(stream, PDFStream) or id(stream) in seen:
+            continue
+        seen.add(id(stream))
+        # Images are hashed as stored, without decoding them
+        data = stream.get_rawdata()
+        digest.update(data if data is not None else stream.get_data())
+        _hash_xobjects(digest, resolve1(stream.get('Resources')), seen)
+
+
+def page_fingerprint(page):
+    """
+    SHA-256 of a page's size, raw content streams and the images and forms
+    it draws
+    Unchanged pages of a re-uploaded statement fingerprint the same, so the
+    fingerprint is known without extracting the page. Scanned pages share
+    their content stream and differ only in their image.
+    """
+    digest = hashlib.sha256(repr((page.width, page.height)).encode('utf-8'))
+    for stream in page.page_obj.contents:
+        digest.update(resolve1(stream).get_data())
+    _hash_xobjects(digest, page.page_obj.resources, set())
+    return digest.hexdigest()
+
+
+def _extract_page(page, page_num):
+    """
+    Extract one page. Returns (text, seconds); text is None when the page
+    has no readable text or could not be extracted.
+    """
+    started = time.perf_counter()
+    try:
+        text = page.extract_text()
+
+        logger.debug("Page %d text length: %d", page_num, len(text) if text else 0)
+        if not (text and len(text.strip()) > 0):
+            logger.warning("Page %d contains no readable text", page_num)
+            text = None
+    except Exception as page_error:
+        logger.warning("Error extracting text from page %d: %s", page_num, page_error)
+        logger.debug("Page %d properties: %s", page_num, page.attrs if hasattr(page, 'attrs') else 'No attrs')
+        text = None
+    return text, time.perf_counter() - started
+
+
+def _record_page(text, seconds):
+    """
+    Record one extracted page in the metrics. Pages extracted on the process
+    pool are recorded here, in the parent, from the timings they return.
+    """
+    STAGE_SECONDS.observe(seconds, stage='page_extract')
+    PAGES_EXTRACTED.inc(result='text' if text else 'empty')
+
+
+def extract_page_text(page, page_num):
+    """
+    Extract one page in the current process and record it in the metrics
+    Returns the page text, or None when it has no readable text
+    """
+    text, seconds = _extract_page(page, page_num)
+    _record_page(text, seconds)
+    return text
+
+
+def ocr_missing_pages(pdf_path, pdf, page_nums):
+    """
+    OCR pages (1-based page_nums) that have no text layer, when OCR is available
+    Returns {page_num: text} for the pages OCR could read
+    """
+    if not page_nums or not ocr_available():
+        return {}
+    return ocr_pages(pdf_path, [(page_num, page_fingerprint(pdf.pages[page_num - 1])) for page_num in page_nums])
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """
+    Process pool worker: open the PDF and extract pages [start, stop).
+    Returns a list of (page_num, text, seconds) in page order.
+    """
+    results = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for index in range(start, stop):
+            text, seconds = _extract_page(pdf.pages[index], index + 1)
+            results.append((index + 1, text, seconds))
+    return results
+
+
+def extract_text_from_pdf(pdf_path, workers=None, page_timings=None):
     """
     Extract text from PDF bank statement
     Returns concatenated text from all pages
+
+    Statements with at least PDF_PARALLEL_MIN_PAGES pages are split into
+    contiguous page ranges and extracted on a process pool of `workers`
+    processes (PDF_EXTRACT_WORKERS by default); smaller ones are extracted
+    sequentially. Both modes produce exactly the same text. If a list is
+    passed as `page_timings`, one {'page', 'seconds', 'chars'} entry per
+    page is appended to it.
     """
-    full_text = ""
+    if workers is None:
+        workers = get_setting('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1))
+    min_pages = get_setting('PDF_PARALLEL_MIN_PAGES', 8)
+
     try:
-        print(f"File size: {os.path.getsize(pdf_path)} bytes")
-        
-        with pdfplumber.open(pdf_path) as pdf:
-           
-            print(f"PDF opened successfully")
-            print(f"Number of pages: {len(pdf.pages)}")
-            
+        logger.debug("File size: %d bytes", os.path.getsize(pdf_path))
+
+        with timed('pdf_open'):
+            pdf = pdfplumber.open(pdf_path)
+
+        with pdf:
+            page_count = len(pdf.pages)
+            logger.debug("PDF opened successfully, %d pages", page_count)
+
             if not pdf.pages:
                 raise Exception("PDF contains no pages")
-                
-            for page_num, page in enumerate(pdf.pages, 1):
+
+            page_results = None
+            if workers > 1 and page_count >= min_pages:
                 try:
-                    text = page.extract_text()
-                    
-                    # DEBUGGING SECTION
-                    print(f"Page {page_num} text length: {len(text) if text else 0}")
-                    if text and len(text.strip()) > 0:
-                        full_text += text + "\n"
-                    else:
-                        print(f"Warning: Page {page_num} contains no readable text")
-                except Exception as page_error:
-                    print(f"Warning: Error extracting text from page {page_num}: {str(page_error)}")
-                    
-                    print(f"Page {page_num} properties: {page.attrs if hasattr(page, 'attrs') else 'No attrs'}")
-                    continue
+                    page_results = _extract_pages_parallel(pdf_path, page_count, workers)
+                except Exception as pool_error:
+                    logger.warning("Parallel extraction failed, falling back to sequential: %s", pool_error)
+
+            if page_results is None:
+                page_results = []
+                for page_num, page in enumerate(pdf.pages, 1):
+                    text, seconds = _extract_page(page, page_num)
+                    page_results.append((page_num, text, seconds))
+
+            # Scanned pages have no text layer, read them with OCR instead
+            ocr_texts = ocr_missing_pages(pdf_path, pdf, [page_num for page_num, text, _ in page_results if not text])
+
+        for _, text, seconds in page_results:
+            _record_page(text, seconds)
+        page_results = [(page_num, text or ocr_texts.get(page_num), seconds)
+                        for page_num, text, seconds in page_results]
+
+        if page_timings is not None:
+            page_timings.extend(
+                {'page': page_num, 'seconds': seconds, 'chars': len(text) if text else 0}
+                for page_num, text, seconds in page_results
+            )
+
+        full_text = "".join(text + "\n" for _, text, _ in page_results if text)
                     
         if not full_text.strip():
             raise Exception("No readable text could be extracted from the PDF")
@@ -44,313 +203,460 @@ def extract_text_from_pdf(pdf_path):
         return full_text
         
     except Exception as e:
-        print(f"Detailed error while processing PDF: {str(e)}")
+        logger.error("Detailed error while processing PDF: %s", e)
         raise Exception(f"Error processing PDF: {str(e)}")
 
-def clean_amount(amount_str):
+
+def _extract_pages_parallel(pdf_path, page_count, workers, first_page=0):
     """
-    Clean and convert amount string to float
-    Handles various number formats including European style
+    Split the pages from first_page (0-based) on into one contiguous range
+    per worker and merge the results back in page order
+    """
+    workers = min(workers, page_count - first_page)
+    step = -(-(page_count - first_page) // workers)
+    pool = _get_page_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, pdf_path, start, min(start + step, page_count))
+        for start in range(first_page, page_count, step)
+    ]
+    page_results = []
+    for future in futures:
+        page_results.extend(future.result())
+    return page_results
+
+def iter_page_texts(pdf_path):
     """
+    Lazily extract the PDF one page at a time
+    Yields the text of every page that has readable text
+    """
+    found_text = False
     try:
-        # Remove any currency symbols and whitespace
-        cleaned = re.sub(r'[£$€\s,]', '', str(amount_str))
-        
-        # Handle negative amounts with parentheses
-        if '(' in cleaned and ')' in cleaned:
-            cleaned = cleaned.replace('(', '-').replace(')', '')
-            
-        # Handle European number format (1.234,56 -> 1234.56)
-        if ',' in cleaned and '.' in cleaned:
-            if cleaned.index(',') > cleaned.index('.'):
-                cleaned = cleaned.replace('.', '').replace(',', '.')
-            else:
-                cleaned = cleaned.replace(',', '')
-        elif ',' in cleaned:
-            cleaned = cleaned.replace(',', '.')
-            
-        return float(cleaned)
-    except (ValueError, AttributeError):
-        return None
+        with timed('pdf_open'):
+            pdf = pdfplumber.open(pdf_path)
 
-def extract_transactions(pdf_path):
+        with pdf:
+            if not pdf.pages:
+                raise Exception("PDF contains no pages")
+
+            for page_num, page in enumerate(pdf.pages, 1):
+                text = extract_page_text(page, page_num) or ocr_missing_pages(pdf_path, pdf, [page_num]).get(page_num)
+                # Release pdfminer's layout objects so memory stays flat on long statements
+                page.close()
+                if text:
+                    found_text = True
+                    yield text
+
+        if not found_text:
+            raise Exception("No readable text could be extracted from the PDF")
+
+    except Exception as e:
+        logger.error("Detailed error while processing PDF: %s", e)
+        raise Exception(f"Error processing PDF: {str(e)}")
+
+
+def iter_statement_lines(page_texts):
     """
-    Extract and structure transaction data from PDF bank statement
-    Returns list of transaction dictionaries with specified fields
+    Split page texts into lines, one page at a time
     """
-    transactions = []
-    
-    statement_text = extract_text_from_pdf(pdf_path)
-    
-    lines = statement_text.split('\n')
-    current_balance = None
-    
-    # Regular expressions for different date formats
-    date_patterns = [
-        r'\d{2}\s+[A-Za-z]{3}\s+\d{2}',   # DD MMM YY
-        r'\d{2}-[A-Za-z]{3}-\d{4}',        # DD-MMM-YYYY
-        r'\d{2}/\d{2}/\d{4}',              # DD/MM/YYYY
-        r'\d{2}-\d{2}-\d{4}',              # DD-MM-YYYY
-        r'\d{2}\.\d{2}\.\d{4}',            # DD.MM.YYYY
-        r'[A-Za-z]{3}\s+\d{2},\s*\d{4}',   # MMM DD, YYYY
-        r'\d{1,2}/\d{1,2}/\d{2,4}',        # D/M/YY or DD/MM/YYYY
-        r'\d{1,2}-\d{1,2}-\d{2,4}'         # D-M-YY or DD-MM-YYYY
-    ]
-    date_pattern = '|'.join(date_patterns)
-    
-    amount_patterns = [
-        r'\(?\$?\s*[\d,]+\.?\d*\)?',       # Handles (1234.56) and $1,234.56
-        r'\(?\s*[\d,]+\.?\d*\)?',          # Basic number format with optional decimal
-        r'\(?\s*[\d\.]+,?\d*\)?',          # European format with optional decimal
-        r'\(?\$\s*[\d,]+\.?\d*\)?',        # USD format
-        r'\(?\€\s*[\d\.]+,?\d*\)?',        # EUR format
-        r'\(?\£\s*[\d,]+\.?\d*\)?',        # GBP format
-        r'\(?\d+(?:[.,]\d{2})?\)?'         # Simple number with optional decimals
+    for text in page_texts:
+        yield from text.split('\n')
+
+
+def _balanced_records(rows, printed, balance):
+    """
+    TransactionRecords of a block of parsed rows, with the balances
+    reconstructed by the RunningBalance `balance`
+    `printed` maps row indexes to the balance printed after them.
+    """
+    signed_amounts = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    printed_balances = np.full(len(rows), np.nan)
+    printed_balances[list(printed)] = list(printed.values())
+    old_balance, new_balance, mismatch = balance.reconstruct(signed_amounts, printed_balances)
+    return [
+        TransactionRecord(amount, old, new, type_code, date, description, balance_mismatch=flag)
+        for (amount, _, type_code, date, description), old, new, flag in zip(
+            rows, old_balance.tolist(), new_balance.tolist(), mismatch.tolist()
+        )
     ]
-    amount_pattern = '|'.join(amount_patterns)
-
-    # Transaction type keywords - expanded
-    transaction_keywords = {
-        'CASH_OUT': ['ATM', 'WITHDRAWAL', 'WITHDRAW', 'CASH OUT', 'CASHOUT'],
-        'CASH_IN': ['DEPOSIT', 'DEP', 'CASH IN', 'CASHIN', 'CREDIT'],
-        'DEBIT': ['DEBIT', 'POS', 'PURCHASE', 'PAYMENT TO', 'PAID TO', 'DR'],
-        'PAYMENT': ['PAYMENT', 'BILL PAY', 'AUTOPAY', 'PMT', 'FEE', 'DIRECT DEBIT'],
-        'TRANSFER': ['TRANSFER', 'TRF', 'XFER', 'ACH', 'IMPS', 'NEFT', 'UPI', 'SWIFT', 'CR']
-    }
 
-    # DEBUGGING SECTION 
+
+def parse_transactions(lines, balance=None):
+    """
+    Parse statement lines into TransactionRecords
+    Yields transactions in blocks of BALANCE_BLOCK_ROWS, whose balances are
+    reconstructed from the signed amounts by `balance`, the RunningBalance
+    carried in from earlier lines of the statement. Opening, closing and
+    brought/carried forward balance lines anchor the balance and are
+    reconciled with it; they are not transactions. One printed before the
+    first transaction of `lines` belongs to the last transaction before
+    them, see RunningBalance.reconcile_previous.
+    """
+    if balance is None:
+        balance = RunningBalance()
+    classifier = LineClassifier()
+
     total_lines = 0
-    lines_with_dates = 0
-    lines_with_amounts = 0
+    total_transactions = 0
+    rows = []
+    printed = {}
     
     for line in lines:
         total_lines += 1
-        if not line.strip():
+        description = line.strip()
+        if not description:
             continue
             
         try:
-            date_match = re.search(date_pattern, line)
-            if date_match:
-                lines_with_dates += 1
-            
-        
-            debit_amount = None
-            credit_amount = None
-            
-            columns = line.split()
-            
-            is_debit = 'DR' in line.upper() or '(DR)' in line.upper()
-            is_credit = 'CR' in line.upper() or '(CR)' in line.upper()
-            
-            amount_matches = re.findall(amount_pattern, line)
-            if amount_matches:
-                lines_with_amounts += 1
-                
-                for amount_str in amount_matches:
-                    amount = clean_amount(amount_str)
-                    if amount is not None:
-                        
-                        if is_debit or '(' in amount_str or amount < 0:
-                            debit_amount = abs(amount)
-                        elif is_credit or amount > 0:
-                            credit_amount = abs(amount)
-                        else:
-                           
-                            credit_amount = abs(amount)
-            
-            if not (date_match and (debit_amount is not None or credit_amount is not None)):
-                continue
-                
-            transaction_date = date_match.group(0)
-            
-            line_upper = line.upper()
-            transaction_type = None
-            
-            for type_name, keywords in transaction_keywords.items():
-                if any(keyword.upper() in line_upper for keyword in keywords):
-                    transaction_type = type_name
-                    break
-            
-            if transaction_type is None:
-                if debit_amount is not None:
-                    transaction_type = 'DEBIT'
+            printed_balance = classifier.printed_balance(line)
+            if printed_balance is not None:
+                # The balance after the last transaction, or the one the statement opens with
+                if rows:
+                    printed[len(rows) - 1] = printed_balance
                 else:
-                    transaction_type = 'CASH_IN'
-            
-            amount = debit_amount if debit_amount is not None else credit_amount
-            
-            # Calculate balances
-            if current_balance is None:
-                # Look for balance in the line
-                balance_matches = re.findall(amount_pattern, line)
-                if balance_matches:
-                    current_balance = clean_amount(balance_matches[-1])
-                    
-            new_balance = current_balance
-            if current_balance is not None:
-                if debit_amount is not None:
-                    old_balance = current_balance + debit_amount
-                else:
-                    old_balance = current_balance - credit_amount
+                    balance.reconcile_previous(printed_balance)
+                continue
+
+            parsed = classifier.classify(line)
+            if parsed is None:
+                continue
+
+            if parsed.debit_amount is not None:
+                amount, signed_amount = parsed.debit_amount, -parsed.debit_amount
             else:
-                old_balance = 0
-                new_balance = 0
-            
-            transaction = {
-                'amount': abs(amount),
-                'oldbalanceOrg': old_balance,
-                'newbalanceOrig': new_balance,
-                'oldbalanceDest': 0,
-                'newbalanceDest': 0,
-                'type_CASH_IN': 1 if transaction_type == 'CASH_IN' else 0,
-                'type_CASH_OUT': 1 if transaction_type == 'CASH_OUT' else 0,
-                'type_DEBIT': 1 if transaction_type == 'DEBIT' else 0,
-                'type_PAYMENT': 1 if transaction_type == 'PAYMENT' else 0,
-                'type_TRANSFER': 1 if transaction_type == 'TRANSFER' else 0,
-                'is_large_transaction': abs(amount) >= 5000,
-                'balance_difference': new_balance - old_balance,
-                'transaction_date': transaction_date,
-                'description': line.strip()
-            }
-            
-            transactions.append(transaction)
-            current_balance = new_balance
+                amount, signed_amount = parsed.credit_amount, parsed.credit_amount
+            row = (amount, signed_amount, TYPE_CODES[parsed.transaction_type], parsed.date, description)
             
         except Exception as e:
-            print(f"Error processing line: {line}")
-            print(f"Error details: {str(e)}")
+            logger.warning("Error processing line %r: %s", line, e)
             continue
-    
-    print(f"Processed {total_lines} lines")
-    print(f"Found {lines_with_dates} lines with dates")
-    print(f"Found {lines_with_amounts} lines with amounts")
-    print(f"Extracted {len(transactions)} transactions")
-    
-    return transactions
 
-def analyze_transactions(transactions):
+        # A block is completed once the next transaction shows up, so balance
+        # lines right after its last row are still reconciled with it
+        if len(rows) >= BALANCE_BLOCK_ROWS:
+            yield from _balanced_records(rows, printed, balance)
+            rows, printed = [], {}
+        rows.append(row)
+        total_transactions += 1
+
+    if rows:
+        yield from _balanced_records(rows, printed, balance)
+
+    lines_with_dates = classifier.lines_with_dates
+    lines_with_amounts = classifier.lines_with_amounts
+    STATEMENT_LINES.observe(total_lines, kind='lines')
+    STATEMENT_LINES.observe(lines_with_dates, kind='dates')
+    STATEMENT_LINES.observe(lines_with_amounts, kind='amounts')
+    STATEMENT_LINES.observe(total_transactions, kind='transactions')
+    logger.debug("Processed %d lines: %d with dates, %d with amounts, %d transactions",
+                 total_lines, lines_with_dates, lines_with_amounts, total_transactions)
+
+
+def extract_transactions(pdf_path):
+    """
+    Extract and structure transaction data from PDF bank statement
+    Returns a list of TransactionRecords
+    """
+    statement_text = extract_text_from_pdf(pdf_path)
+
+    with timed('line_parse'):
+        return list(parse_transactions(statement_text.split('\n')))
+
+
+def extract_statement(path):
+    """
+    Extract the transactions of a PDF, CSV or XLSX statement
+    Returns (transactions, feature columns). CSV and XLSX statements are
+    mapped straight into feature columns. PDFs are read as a table when
+    PDF_EXTRACTION_ENGINE is 'table' (the default) and a statement table
+    header is found; otherwise the page text is parsed line by line and
+    columns is None, to be built from the transactions when they are scored.
+    """
+    if is_tabular(path):
+        with timed('tabular_read'):
+            return extract_tabular_transactions(path)
+
+    if get_setting('PDF_EXTRACTION_ENGINE', 'table') == 'table':
+        try:
+            extracted = extract_table_transactions(path)
+        except Exception as e:
+            logger.warning("Table extraction failed, falling back to text: %s", e)
+            extracted = None
+        if extracted is not None and extracted[0]:
+            return extracted
+
+    return extract_transactions(path), None
+
+
+def _no_transactions_result(path):
+    source = 'statement' if is_tabular(path) else 'PDF'
+    return {
+        "error": f"No transactions could be extracted from the {source}",
+        "transactions": [],
+        "summary": None
+    }
+
+def _apply_fraud_scores(transactions, summary, fraud_probabilities):
+    """
+    Add the fraud analysis to a statement summary and annotate its transactions
+    """
+    probabilities, high_risk_transactions, fraud_probability_percent = fraud_scores(fraud_probabilities)
+    fraud_count = int(high_risk_transactions.sum())
+
+    summary['fraud_analysis'] = {
+        'total_fraudulent': fraud_count,
+        'fraud_percentage': round((fraud_count / len(transactions)) * 100, 2),
+        'average_fraud_probability': round(float(probabilities.mean()) * 100, 2)
+    }
+
+    annotate_transactions(transactions, high_risk_transactions, fraud_probability_percent)
+
+
+def analyze_transactions(transactions, columns=None):
     """
     Analyze extracted transactions and provide summary statistics
     Also performs fraud detection on each transaction
+    `columns` can be passed when the feature columns are already built
     """
     if not transactions:
         return {"error": "No transactions found"}
         
-    df = pd.DataFrame(transactions)
-    
-    # Load fraud detection model and column names using relative paths
+    if columns is None:
+        with timed('feature_build'):
+            columns = build_feature_columns(transactions)
+    with timed('date_parse'):
+        dates = statement_dates(transactions)
+    with timed('summary'):
+        summary = summarize_columns(columns, transactions, dates)
+
+    # Score with the model loaded once per worker by the model registry
     try:
-        import os
-        from django.conf import settings
-
-        # Define paths relative to the Django project
-        BASE_DIR = settings.BASE_DIR
-        MODEL_PATH = os.path.join(BASE_DIR, 'loan_analyzer', 'utils', 'random_forest_fraud_model.pkl')
-        COLUMNS_PATH = os.path.join(BASE_DIR, 'loan_analyzer', 'utils', 'column_names.pkl')
-
-        # Load the model and column names
-        with open(MODEL_PATH, 'rb') as file:
-            fraud_model = pickle.load(file)
-        with open(COLUMNS_PATH, 'rb') as file:
-            column_names = pickle.load(file)
-            
-        # Debug print statements
-        print(f"Model loaded from: {MODEL_PATH}")
-        print(f"Columns loaded from: {COLUMNS_PATH}")
-
-        fraud_check_df = df[['amount', 'oldbalanceOrg', 'newbalanceOrig', 
-                            'oldbalanceDest', 'newbalanceDest', 'type_CASH_IN',
-                            'type_CASH_OUT', 'type_DEBIT', 'type_PAYMENT',
-                            'type_TRANSFER', 'is_large_transaction', 
-                            'balance_difference']]
-        
-        fraud_check_df = fraud_check_df.reindex(columns=column_names, fill_value=0)
-        
-        fraud_predictions = fraud_model.predict(fraud_check_df)
-        fraud_probabilities = fraud_model.predict_proba(fraud_check_df)
-        
-        fraud_threshold = 0.5  # 50% probability threshold for fraud
-        high_risk_transactions = [prob[1] > fraud_threshold for prob in fraud_probabilities]
-        fraud_count = sum(high_risk_transactions)
-        
-        avg_fraud_probability = round(np.mean([prob[1] for prob in fraud_probabilities]) * 100, 2)
+        model_version = get_model()
         
-        summary = {
-            'total_transactions': len(df),
-            'total_cash_out': df['type_CASH_OUT'].sum(),
-            'total_cash_in': df['type_CASH_IN'].sum(),
-            'total_transfers': df['type_TRANSFER'].sum(),
-            'total_payments': df['type_PAYMENT'].sum(),
-            'total_debits': df['type_DEBIT'].sum(),
-            'large_transactions': df['is_large_transaction'].sum(),
-            'avg_transaction_amount': round(df['amount'].mean(), 2),
-            'max_transaction_amount': df['amount'].max(),
-            'min_transaction_amount': df['amount'].min(),
-            'date_range': f"{df['transaction_date'].iloc[0]} to {df['transaction_date'].iloc[-1]}",
-            'total_debit_amount': round(df[df['balance_difference'] < 0]['amount'].sum(), 2),
-            'total_credit_amount': round(df[df['balance_difference'] > 0]['amount'].sum(), 2),
-            'fraud_analysis': {
-                'total_fraudulent': int(fraud_count),
-                'fraud_percentage': round((fraud_count / len(df)) * 100, 2),
-                'average_fraud_probability': avg_fraud_probability
-            }
-        }
+        column_names = model_version.column_names
+        with timed('feature_build'):
+            matrix = build_feature_matrix({**columns, **model_velocity_features(column_names, columns, dates)},
+                                          column_names)
+
+        # One predict_proba pass; predicted classes are derived from the threshold
+        fraud_probabilities = model_version.predict_proba(matrix)
         
-        for i, transaction in enumerate(transactions):
-            transaction['is_fraudulent'] = bool(high_risk_transactions[i])
-            transaction['fraud_probability'] = round(float(fraud_probabilities[i][1]) * 100, 2)
+        _apply_fraud_scores(transactions, summary, fraud_probabilities)
             
         return summary
         
     except Exception as e:
-        print(f"Error in fraud detection: {str(e)}")
+        logger.error("Error in fraud detection: %s", e)
         # Return basic summary without fraud analysis
-        return {
-            'total_transactions': len(df),
-            'total_cash_out': df['type_CASH_OUT'].sum(),
-            'total_cash_in': df['type_CASH_IN'].sum(),
-            'total_transfers': df['type_TRANSFER'].sum(),
-            'total_payments': df['type_PAYMENT'].sum(),
-            'total_debits': df['type_DEBIT'].sum(),
-            'large_transactions': df['is_large_transaction'].sum(),
-            'avg_transaction_amount': round(df['amount'].mean(), 2),
-            'max_transaction_amount': df['amount'].max(),
-            'min_transaction_amount': df['amount'].min(),
-            'date_range': f"{df['transaction_date'].iloc[0]} to {df['transaction_date'].iloc[-1]}",
-            'total_debit_amount': round(df[df['balance_difference'] < 0]['amount'].sum(), 2),
-            'total_credit_amount': round(df[df['balance_difference'] > 0]['amount'].sum(), 2)
-        }
+        return summary
+
+def _analyze_incrementally(path):
+    return not is_tabular(path) and get_setting('INCREMENTAL_ANALYSIS', True)
+
 
 def analyze_bank_statement(pdf_path):
     """
-    Main function to analyze bank statement PDF
+    Main function to analyze bank statement PDF (or CSV/XLSX export)
     Returns dictionary containing transactions and summary
+    PDFs are analyzed page by page with the page cache when
+    INCREMENTAL_ANALYSIS is on (see incremental.py).
     """
+    if _analyze_incrementally(pdf_path):
+        from .incremental import analyze_bank_statement_incremental
+
+        return analyze_bank_statement_incremental(pdf_path)
+
     try:
         # Extract transactions
-        transactions = extract_transactions(pdf_path)
+        transactions, columns = extract_statement(pdf_path)
         
         if not transactions:
-            return {
-                "error": "No transactions could be extracted from the PDF",
-                "transactions": [],
-                "summary": None
-            }
+            STATEMENTS_ANALYZED.inc(outcome='empty')
+            return _no_transactions_result(pdf_path)
             
         # Analyze transactions
-        summary = analyze_transactions(transactions)
+        summary = analyze_transactions(transactions, columns)
         
+        STATEMENTS_ANALYZED.inc(outcome='succeeded')
         return {
             "transactions": transactions,
             "summary": summary
         }
         
     except Exception as e:
+        STATEMENTS_ANALYZED.inc(outcome='failed')
         return {
             "error": str(e),
             "transactions": [],
             "summary": None
         }
+
+
+
+def analyze_bank_statements(pdf_paths):
+    """
+    Analyze several bank statements (PDF, CSV or XLSX) with a single model call
+    Transactions of every file are extracted first, their feature matrices
+    are stacked and scored together, and the probabilities are split back
+    per file. PDFs analyzed incrementally contribute the rows of their new
+    pages only. Returns one analyze_bank_statement-style result per path,
+    in the same order.
+    """
+    from .incremental import IncrementalStatement
+
+    results = [None] * len(pdf_paths)
+    # (result index, IncrementalStatement) and (result index, transactions, columns, dates)
+    statements = []
+    scored_files = []
+    for index, pdf_path in enumerate(pdf_paths):
+        try:
+            if _analyze_incrementally(pdf_path):
+                statements.append((index, IncrementalStatement(pdf_path)))
+                continue
+            transactions, columns = extract_statement(pdf_path)
+        except Exception as e:
+            STATEMENTS_ANALYZED.inc(outcome='failed')
+            results[index] = {"error": str(e), "transactions": [], "summary": None}
+            continue
+
+        if not transactions:
+            STATEMENTS_ANALYZED.inc(outcome='empty')
+            results[index] = _no_transactions_result(pdf_path)
+            continue
+
+        if columns is None:
+            with timed('feature_build'):
+                columns = build_feature_columns(transactions)
+        with timed('date_parse'):
+            dates = statement_dates(transactions)
+        with timed('summary'):
+            summary = summarize_columns(columns, transactions, dates)
+        STATEMENTS_ANALYZED.inc(outcome='succeeded')
+        scored_files.append((index, transactions, columns, dates))
+        results[index] = {"transactions": transactions, "summary": summary}
+
+    # Statements whose pages were all cached are finished without scores, like on their own
+    new_statements = [position for position, (_, statement) in enumerate(statements) if statement.new_transactions]
+    statement_probabilities = [None] * len(statements)
+    if scored_files or new_statements:
+        try:
+            model_version = get_model()
+            column_names = model_version.column_names
+            matrices = [statements[position][1].feature_matrix(model_version) for position in new_statements]
+            with timed('feature_build'):
+                matrices += [
+                    build_feature_matrix({**columns, **model_velocity_features(column_names, columns, dates)},
+                                         column_names)
+                    for _, _, columns, dates in scored_files
+                ]
+            fraud_probabilities = model_version.predict_proba(np.concatenate(matrices))
+
+            split_points = np.cumsum([len(matrix) for matrix in matrices])[:-1]
+            file_probabilities = np.split(fraud_probabilities, split_points)
+            for position, probabilities in zip(new_statements, file_probabilities):
+                statement_probabilities[position] = probabilities
+            for (index, transactions, _, _), probabilities in zip(scored_files,
+                                                                  file_probabilities[len(new_statements):]):
+                _apply_fraud_scores(transactions, results[index]['summary'], probabilities)
+        except Exception as e:
+            logger.error("Error in fraud detection: %s", e)
+
+    for (index, statement), probabilities in zip(statements, statement_probabilities):
+        try:
+            results[index] = statement.finish(probabilities)
+        except Exception as e:
+            STATEMENTS_ANALYZED.inc(outcome='failed')
+            results[index] = {"error": str(e), "transactions": [], "summary": None}
+
+    return results
+
+def iter_batches(items, batch_size):
+    """
+    Group an iterable into lists of at most batch_size items
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def score_transactions(transactions, dates=None, history=None):
+    """
+    Run fraud detection on a batch of transactions
+    Annotates each transaction in place and returns the fraud probabilities
+    When the model uses velocity features they are computed from the
+    batch's datetime64 `dates`, with windows reaching back into `history`,
+    the (transactions, dates) of the statement before the batch.
+    """
+    model_version = get_model()
+    column_names = model_version.column_names
+    with timed('feature_build'):
+        columns = build_feature_columns(transactions)
+        if dates is not None and uses_velocity_features(column_names):
+            previous, previous_dates = history if history is not None else ([], dates[:0])
+            window_columns = build_feature_columns(previous + transactions)
+            columns.update(model_velocity_features(column_names, window_columns,
+                                                   np.concatenate([previous_dates, dates]),
+                                                   slice(len(previous), None)))
+        matrix = build_feature_matrix(columns, column_names)
+    fraud_probabilities = model_version.predict_proba(matrix)
+
+    probabilities, is_fraudulent, fraud_probability_percent = fraud_scores(fraud_probabilities)
+    annotate_transactions(transactions, is_fraudulent, fraud_probability_percent)
+    return probabilities
+
+
+def analyze_bank_statement_stream(pdf_path, batch_size=None):
+    """
+    Streaming variant of analyze_bank_statement
+    Pages are read, parsed and scored lazily, so the first batch is
+    available before the last page is extracted and memory stays flat.
+    Yields {"transactions": [...]} for every scored batch, followed by a
+    final {"summary": {...}} (or {"error": ...} if nothing was found).
+    Velocity features only look back over the previous batch: a window
+    longer than that (more than batch_size transactions, or days spanning
+    earlier batches) is undercounted compared to analyze_bank_statement.
+    """
+    if batch_size is None:
+        batch_size = get_setting('ANALYSIS_STREAM_BATCH_SIZE', 500)
+
+    summary = StreamingSummary()
+    transactions = parse_transactions(iter_statement_lines(iter_page_texts(pdf_path)))
+    date_parser = None
+    history = None
+
+    try:
+        for batch in iter_batches(transactions, batch_size):
+            with timed('date_parse'):
+                date_strings = [transaction.date for transaction in batch]
+                # The statement's date format is detected from the first batch
+                if date_parser is None:
+                    date_parser = DateParser.for_statement(date_strings)
+                dates = date_parser.column(date_strings)
+            try:
+                # Velocity windows look back one batch only, so memory stays bounded
+                fraud_probabilities = score_transactions(batch, dates, history)
+            except Exception as e:
+                logger.error("Error in fraud detection: %s", e)
+                fraud_probabilities = None
+            history = (batch, dates)
+            summary.add(batch, fraud_probabilities, dates)
+            yield {"transactions": batch}
+    except Exception as e:
+        STATEMENTS_ANALYZED.inc(outcome='failed')
+        yield {"error": str(e)}
+        return
+
+    if not summary.total_transactions:
+        STATEMENTS_ANALYZED.inc(outcome='empty')
+        yield {"error": "No transactions could be extracted from the PDF"}
+        return
+
+    STATEMENTS_ANALYZED.inc(outcome='succeeded')
+    yield {"summary": summary.result()}
     
 if __name__ == "__main__":
     pdf_path = "/home/alex/Documents/loan/backend/ml/bank1.pdf"
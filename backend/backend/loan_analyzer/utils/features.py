@@ -0,0 +1,90 @@
+import numpy as np
+
+from .transactions import LARGE_TRANSACTION_AMOUNT, TRANSACTION_TYPES
+
+# Features passed to the fraud model, before reindexing to its column_names
+FEATURE_COLUMNS = ['amount', 'oldbalanceOrg', 'newbalanceOrig',
+                   'oldbalanceDest', 'newbalanceDest', 'type_CASH_IN',
+                   'type_CASH_OUT', 'type_DEBIT', 'type_PAYMENT',
+                   'type_TRANSFER', 'is_large_transaction',
+                   'balance_difference']
+
+FRAUD_THRESHOLD = 0.5  # 50% probability threshold for fraud
+
+
+def build_feature_columns(transactions):
+    """
+    Turn a list of TransactionRecords into one float64 NumPy array per
+    model feature. Only the stored values are read from the records; the
+    type_* one-hot flags and the derived features are expanded here, at the
+    model boundary, with vectorized operations.
+    """
+    count = len(transactions)
+    amount = np.fromiter((transaction.amount for transaction in transactions), dtype=np.float64, count=count)
+    old_balance = np.fromiter((transaction.old_balance for transaction in transactions),
+                              dtype=np.float64, count=count)
+    new_balance = np.fromiter((transaction.new_balance for transaction in transactions),
+                              dtype=np.float64, count=count)
+    type_codes = np.fromiter((transaction.type_code for transaction in transactions), dtype=np.int8, count=count)
+    balance_mismatch = np.fromiter((transaction.balance_mismatch for transaction in transactions),
+                                   dtype=bool, count=count)
+    return expand_feature_columns(amount, old_balance, new_balance, type_codes, balance_mismatch)
+
+
+def expand_feature_columns(amount, old_balance, new_balance, type_codes, balance_mismatch):
+    """
+    Expand the stored transaction values (float64 amount and balances,
+    int8 type codes into TRANSACTION_TYPES) into the model feature columns
+    The bool balance_mismatch flags are kept as a column too, for the summary.
+    """
+    count = len(amount)
+    columns = {
+        'amount': amount,
+        'oldbalanceOrg': old_balance,
+        'newbalanceOrig': new_balance,
+        'oldbalanceDest': np.zeros(count),
+        'newbalanceDest': np.zeros(count),
+    }
+    for code, type_name in enumerate(TRANSACTION_TYPES):
+        columns[f'type_{type_name}'] = (type_codes == code).astype(np.float64)
+    columns['is_large_transaction'] = (amount >= LARGE_TRANSACTION_AMOUNT).astype(np.float64)
+    columns['balance_difference'] = new_balance - old_balance
+    columns['balance_mismatch'] = balance_mismatch
+    return columns
+
+
+def build_feature_matrix(columns, column_names):
+    """
+    Lay the feature columns out as a C-contiguous float32 matrix in the
+    model's column_names order. Columns the statement does not provide are
+    left at 0, like DataFrame.reindex(fill_value=0) did.
+    float32 is the dtype the tree ensemble evaluates with, so the model does
+    not have to convert the input again.
+    """
+    count = len(next(iter(columns.values()))) if columns else 0
+    matrix = np.zeros((count, len(column_names)), dtype=np.float32)
+    for index, column in enumerate(column_names):
+        values = columns.get(column)
+        if values is not None:
+            matrix[:, index] = values
+    return matrix
+
+
+def fraud_scores(fraud_probabilities, threshold=FRAUD_THRESHOLD):
+    """
+    Vectorized thresholding of the positive-class probabilities
+    Returns (probabilities, is_fraudulent, fraud_probability_percent)
+    """
+    probabilities = np.ascontiguousarray(fraud_probabilities[:, 1])
+    return probabilities, probabilities > threshold, np.round(probabilities * 100, 2)
+
+
+def annotate_transactions(transactions, is_fraudulent, fraud_probability_percent):
+    """
+    Attach the per-transaction fraud flags computed by fraud_scores
+    """
+    for transaction, flag, probability in zip(transactions, is_fraudulent.tolist(),
+                                              fraud_probability_percent.tolist()):
+        transaction.is_fraudulent = flag
+        transaction.fraud_probability = probability
+
@@ -0,0 +1,314 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pdfplumber
+
+from .balances import RunningBalance
+from .conf import get_setting
+from .dates import statement_dates
+from .extract import (_extract_pages_parallel, _no_transactions_result, _record_page, extract_page_text,
+                      ocr_missing_pages, page_fingerprint, parse_transactions)
+from .features import annotate_transactions, build_feature_columns, build_feature_matrix, fraud_scores
+from .metrics import PAGE_CACHE_LOOKUPS, PAGES_EXTRACTED, STATEMENTS_ANALYZED, timed
+from .model_registry import get_model
+from .pdf_tables import ColumnLayout, page_chunk, read_table_page
+from .result_cache import current_model_version, get_page_cache
+from .summary import StreamingSummary
+from .tabular import TabularStatementReader, records_from_columns
+from .velocity import model_velocity_features, uses_velocity_features
+
+logger = logging.getLogger(__name__)
+
+
+def _page_key(engine, fingerprint, state):
+    # A page parses differently depending on the balance (and table layout)
+    # carried in from the pages before it, so that state is part of the key
+    return hashlib.sha256(json.dumps([engine, fingerprint, state], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _prefetch_texts(pdf_path, pdf, first_page):
+    """
+    Extract the pages from first_page (1-based) to the end on the page
+    process pool, like extract_text_from_pdf does for long statements, and
+    OCR the ones without a text layer together
+    Returns {page_num: text}, empty when there are too few pages for it
+    """
+    page_count = len(pdf.pages)
+    workers = get_setting('PDF_EXTRACT_WORKERS', min(4, os.cpu_count() or 1))
+    if workers <= 1 or page_count - first_page + 1 < get_setting('PDF_PARALLEL_MIN_PAGES', 8):
+        return {}
+    try:
+        page_results = _extract_pages_parallel(pdf_path, page_count, workers, first_page - 1)
+    except Exception as pool_error:
+        logger.warning("Parallel extraction failed, falling back to sequential: %s", pool_error)
+        return {}
+    for _, text, seconds in page_results:
+        _record_page(text, seconds)
+    texts = {page_num: text for page_num, text, _ in page_results}
+    texts.update(ocr_missing_pages(pdf_path, pdf, [page_num for page_num, text in texts.items() if not text]))
+    return texts
+
+
+def _read_text_page(pdf_path, pdf, page_num, state, prefetched):
+    if page_num in prefetched:
+        text = prefetched[page_num]
+    else:
+        text = (extract_page_text(pdf.pages[page_num - 1], page_num)
+                or ocr_missing_pages(pdf_path, pdf, [page_num]).get(page_num))
+    if not text:
+        return [], state, None
+    balance = RunningBalance.from_dict(state)
+    with timed('line_parse'):
+        transactions = list(parse_transactions(text.split('\n'), balance))
+    return transactions, balance.to_dict(), balance.correction
+
+
+def _read_table_page(pdf_path, pdf, page_num, state, prefetched):
+    with timed('page_table_extract'):
+        layout = ColumnLayout.from_dict(state['layout']) if state['layout'] else None
+        rows, layout = read_table_page(pdf.pages[page_num - 1], layout)
+        if layout is None:
+            return [], state, None
+
+        PAGES_EXTRACTED.inc(result='text' if rows else 'empty')
+        reader = TabularStatementReader(RunningBalance.from_dict(state['balance']))
+        if rows:
+            reader.add_chunk(page_chunk(rows, layout))
+
+    transactions = []
+    if reader.dates:
+        transactions = records_from_columns(reader.feature_columns(), reader.type_code_column(),
+                                            reader.dates, reader.descriptions)
+    return transactions, {'layout': layout.to_dict(), 'balance': reader.balance.to_dict()}, reader.balance.correction
+
+
+class PageResult:
+    """
+    Transactions of one page, the parser state after it and, once scored,
+    the page's StreamingSummary
+    `correction` holds the balances of the last transaction before the page
+    when the page starts with a printed balance (RunningBalance.correction).
+    """
+
+    def __init__(self, key, transactions, state, summary=None, correction=None):
+        self.key = key
+        self.transactions = transactions
+        self.state = state
+        self.summary = summary
+        self.correction = correction
+        # Set when a later page corrected this page's last transaction
+        self.corrected = False
+
+
+def _reconcile_page_boundaries(pages):
+    """
+    Apply the balances printed at the top of a page to the last transaction
+    of the pages before it, as parsing the whole statement at once does
+    The page holding that transaction is scored again, and not cached since
+    its entry is keyed by its own content and state, not the next page's.
+    """
+    last = None
+    for result in pages:
+        if result.correction is not None and last is not None:
+            transaction = last.transactions[-1]
+            transaction.old_balance, transaction.new_balance, transaction.balance_mismatch = result.correction
+            last.summary = None
+            last.corrected = True
+        if result.transactions:
+            last = result
+
+
+def _read_pages(pdf_path, pdf, engine, cache, model_version):
+    """
+    Walk the pages with `engine`, taking every page found in the page cache
+    from there and extracting the others
+    The text engine extracts everything from the first uncached page on in
+    parallel, since new pages are usually appended at the end.
+    Returns a PageResult per page, or None when the table engine finds no
+    table header in the first PDF_TABLE_HEADER_SEARCH_PAGES pages.
+    """
+    if engine == 'table':
+        read_page, state = _read_table_page, {'layout': None, 'balance': RunningBalance().to_dict()}
+        header_search_pages = get_setting('PDF_TABLE_HEADER_SEARCH_PAGES', 1)
+    else:
+        read_page, state = _read_text_page, RunningBalance().to_dict()
+
+    pages = []
+    prefetched = None
+    for page_num, page in enumerate(pdf.pages, 1):
+        key = _page_key(engine, page_fingerprint(page), state)
+        entry = cache.get(key, model_version)
+        if entry is not None:
+            PAGE_CACHE_LOOKUPS.inc(result='hit')
+            pages.append(PageResult(key, entry['transactions'], entry['state'],
+                                    StreamingSummary.from_dict(entry['summary']), entry['correction']))
+        else:
+            PAGE_CACHE_LOOKUPS.inc(result='miss')
+            if prefetched is None:
+                prefetched = _prefetch_texts(pdf_path, pdf, page_num) if engine == 'text' else {}
+            transactions, page_state, correction = read_page(pdf_path, pdf, page_num, state, prefetched)
+            pages.append(PageResult(key, transactions, page_state, correction=correction))
+            # Release pdfminer's layout objects, the other engine may still read the page
+            page.close()
+        state = pages[-1].state
+
+        if engine == 'table' and state['layout'] is None and page_num >= header_search_pages:
+            # Remember that these pages have no table so re-uploads skip the header search
+            for result in pages:
+                if result.summary is None:
+                    cache.set(result.key, model_version, {'transactions': [], 'state': result.state,
+                                                          'summary': StreamingSummary().to_dict(),
+                                                          'correction': None}, evict=False)
+            logger.debug("No statement table header found, reading pages as text")
+            return None
+    _reconcile_page_boundaries(pages)
+    return pages
+
+
+def _new_page_rows(pages):
+    # Positions of the transactions of the uncached pages within the statement
+    rows = []
+    offset = 0
+    for result in pages:
+        if result.summary is None:
+            rows.append(np.arange(offset, offset + len(result.transactions)))
+        offset += len(result.transactions)
+    return np.concatenate(rows) if rows else np.empty(0, dtype=np.intp)
+
+
+def _read_statement_pages(pdf_path, cache, model_version):
+    with timed('pdf_open'):
+        pdf = pdfplumber.open(pdf_path)
+
+    with pdf:
+        if not pdf.pages:
+            raise Exception("PDF contains no pages")
+
+        pages = None
+        if get_setting('PDF_EXTRACTION_ENGINE', 'table') == 'table':
+            try:
+                pages = _read_pages(pdf_path, pdf, 'table', cache, model_version)
+            except Exception as e:
+                logger.warning("Table extraction failed, falling back to text: %s", e)
+            if pages is not None and not any(result.transactions for result in pages):
+                pages = None
+        if pages is None:
+            pages = _read_pages(pdf_path, pdf, 'text', cache, model_version)
+    return pages
+
+
+class IncrementalStatement:
+    """
+    A PDF statement read page by page through the page cache, before the
+    transactions of its new (uncached) pages are scored.
+
+    analyze_bank_statement_incremental scores feature_matrix() on its own;
+    analyze_bank_statements stacks the matrices of several statements into
+    one model call and hands each its rows with finish().
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self.cache = get_page_cache()
+        self.model_version = current_model_version()
+        self.pages = _read_statement_pages(pdf_path, self.cache, self.model_version)
+        self.new_pages = [result for result in self.pages if result.summary is None]
+        self.new_transactions = [transaction for result in self.new_pages for transaction in result.transactions]
+
+        # Dates are parsed for the whole statement, with the format detected
+        # from all its pages, so they do not depend on which pages were cached
+        self.transactions = [transaction for result in self.pages for transaction in result.transactions]
+        with timed('date_parse'):
+            self.dates = statement_dates(self.transactions)
+
+    def feature_matrix(self, model):
+        """
+        Feature rows of the transactions of the new pages, laid out for `model`
+        Velocity features look back into the cached pages, which keep their
+        scores, so they assume that changed pages do not move earlier
+        transactions in time.
+        """
+        with timed('feature_build'):
+            columns = build_feature_columns(self.new_transactions)
+            if uses_velocity_features(model.column_names):
+                columns.update(model_velocity_features(model.column_names, build_feature_columns(self.transactions),
+                                                       self.dates, _new_page_rows(self.pages)))
+            return build_feature_matrix(columns, model.column_names)
+
+    def finish(self, fraud_probabilities):
+        """
+        Annotate the new pages with their predict_proba rows (None when
+        scoring failed), store the scored ones in the page cache and merge
+        the statement summary from the per-page summaries
+        Returns the analyze_bank_statement result.
+        """
+        probabilities = None
+        if fraud_probabilities is not None:
+            probabilities, is_fraudulent, fraud_probability_percent = fraud_scores(fraud_probabilities)
+            annotate_transactions(self.new_transactions, is_fraudulent, fraud_probability_percent)
+
+        offset = 0
+        for result in self.new_pages:
+            count = len(result.transactions)
+            result.summary = StreamingSummary()
+            result.summary.add(result.transactions,
+                               None if probabilities is None else probabilities[offset:offset + count])
+            offset += count
+            # Unscored pages are not cached, they are scored again on the next upload
+            if result.summary.scored and not result.corrected:
+                self.cache.set(result.key, self.model_version,
+                               {'transactions': result.transactions, 'state': result.state,
+                                'summary': result.summary.to_dict(), 'correction': result.correction},
+                               evict=False)
+        if self.new_pages:
+            self.cache.evict()
+        logger.debug("Analyzed %d of %d pages of %s, the others were cached",
+                     len(self.new_pages), len(self.pages), self.pdf_path)
+
+        if not self.transactions:
+            STATEMENTS_ANALYZED.inc(outcome='empty')
+            return _no_transactions_result(self.pdf_path)
+
+        with timed('summary'):
+            summary = StreamingSummary()
+            for result in self.pages:
+                summary.merge(result.summary)
+            summary.add_dates(self.dates)
+
+        STATEMENTS_ANALYZED.inc(outcome='succeeded')
+        return {
+            "transactions": self.transactions,
+            "summary": summary.result()
+        }
+
+
+def analyze_bank_statement_incremental(pdf_path):
+    """
+    analyze_bank_statement for PDFs, reusing the results of pages seen before
+    Pages are fingerprinted by their content streams and looked up in the
+    page cache together with the state the parser carries into them, so a
+    re-uploaded statement that gained a few pages only extracts and scores
+    the new or changed ones. The summary is merged from per-page summaries.
+    Returns a dictionary with transactions and summary, or an error.
+    """
+    try:
+        statement = IncrementalStatement(pdf_path)
+        fraud_probabilities = None
+        if statement.new_transactions:
+            try:
+                model = get_model()
+                fraud_probabilities = model.predict_proba(statement.feature_matrix(model))
+            except Exception as e:
+                logger.error("Error in fraud detection: %s", e)
+        return statement.finish(fraud_probabilities)
+
+    except Exception as e:
+        STATEMENTS_ANALYZED.inc(outcome='failed')
+        return {
+            "error": str(e),
+            "transactions": [],
+            "summary": None
+        }
@@ -0,0 +1,133 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import AnalysisJob
+from .offload import analyze_bank_statement_pooled
+from .report import build_file_report
+from .result_cache import file_sha256
+from .statement_index import index_statement
+from .uploads import get_upload_store
+
+logger = logging.getLogger(__name__)
+
+# Progress reported while a job runs, once each stage starts
+PROGRESS_ANALYZING = 10
+PROGRESS_REPORTING = 80
+PROGRESS_INDEXING = 90
+PROGRESS_DONE = 100
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def requeue_stale_jobs(timeout=None):
+    """
+    Put RUNNING jobs back in the queue whose heartbeat is older than
+    `timeout` seconds (ANALYSIS_JOB_TIMEOUT), i.e. whose process crashed or
+    was killed while analyzing them. Jobs started before heartbeats were
+    recorded go by their start time.
+    Returns the number of requeued jobs.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'ANALYSIS_JOB_TIMEOUT', 300)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    requeued = AnalysisJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=AnalysisJob.RUNNING,
+    ).update(status=AnalysisJob.QUEUED, progress=0, started_at=None, heartbeat_at=None)
+    if requeued:
+        logger.warning("Requeued %d analysis jobs left running by a previous process", requeued)
+    return requeued
+
+
+def _get_executor():
+    """
+    Returns the bounded worker pool, creating it on first use. Jobs left
+    QUEUED by a previous process, or RUNNING without a heartbeat for
+    ANALYSIS_JOB_TIMEOUT, are picked up when the pool starts.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            max_workers = getattr(settings, 'ANALYSIS_JOB_WORKERS', 2)
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+            requeue_stale_jobs()
+            for job_id in AnalysisJob.objects.filter(status=AnalysisJob.QUEUED).values_list('id', flat=True):
+                _executor.submit(run_job, job_id)
+        return _executor
+
+
+def enqueue_analysis(filename, file_path, account_id='', digest=''):
+    """
+    Record a queued analysis job for a stored upload and hand it to the
+    worker pool. Returns the AnalysisJob immediately.
+    The result is indexed under account_id when one is given; `digest` is
+    the sha256 of the upload, computed from the file when empty.
+    """
+    executor = _get_executor()
+    job = AnalysisJob.objects.create(filename=filename, file_path=file_path, account_id=account_id,
+                                     content_sha256=digest)
+    executor.submit(run_job, job.id)
+    return job
+
+
+def _heartbeat(job, **fields):
+    job.heartbeat_at = timezone.now()
+    AnalysisJob.objects.filter(id=job.id).update(heartbeat_at=job.heartbeat_at, **fields)
+
+
+def _set_progress(job, progress):
+    job.progress = progress
+    _heartbeat(job, progress=progress)
+
+
+def run_job(job_id):
+    """
+    Claim a queued job and run the analysis. The status update doubles as a
+    lock, so a job submitted twice is only ever analyzed once.
+    The analysis itself runs on the offload process pool, with the job's
+    heartbeat refreshed every ANALYSIS_JOB_HEARTBEAT seconds while it waits.
+    `progress` moves through the PROGRESS_* stages: analyzing the file,
+    building the report, indexing it under the account, done.
+    """
+    close_old_connections()
+    try:
+        now = timezone.now()
+        claimed = AnalysisJob.objects.filter(id=job_id, status=AnalysisJob.QUEUED).update(
+            status=AnalysisJob.RUNNING, progress=PROGRESS_ANALYZING, started_at=now, heartbeat_at=now
+        )
+        if not claimed:
+            return
+
+        job = AnalysisJob.objects.get(id=job_id)
+        try:
+            digest = job.content_sha256 or file_sha256(job.file_path)
+            result = analyze_bank_statement_pooled(job.file_path, digest, lambda: _heartbeat(job),
+                                                   getattr(settings, 'ANALYSIS_JOB_HEARTBEAT', 30))
+            _set_progress(job, PROGRESS_REPORTING)
+            job.result = build_file_report(job.filename, result)
+            if job.account_id:
+                _set_progress(job, PROGRESS_INDEXING)
+                job.result['statement_id'] = str(index_statement(job.account_id, job.filename, digest, result).id)
+            job.status = AnalysisJob.SUCCEEDED
+        except Exception as analysis_error:
+            job.error = str(analysis_error)
+            job.status = AnalysisJob.FAILED
+
+        job.progress = PROGRESS_DONE
+        job.finished_at = timezone.now()
+        job.save(update_fields=['result', 'error', 'status', 'progress', 'finished_at'])
+
+        # The upload is only protected from eviction while its job is pending
+        get_upload_store().evict()
+    except Exception as e:
+        logger.exception("Error running analysis job %s: %s", job_id, e)
+    finally:
+        close_old_connections()
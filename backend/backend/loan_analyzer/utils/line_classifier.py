@@ -0,0 +1,193 @@
+import re
+
+# Regular expressions for different date formats
+DATE_PATTERNS = [
+    r'\d{2}\s+[A-Za-z]{3}\s+(?:\d{4}|\d{2})(?!\d)',  # DD MMM YYYY or DD MMM YY, not a truncated year
+    r'\d{2}-[A-Za-z]{3}-\d{4}',        # DD-MMM-YYYY
+    r'\d{2}/\d{2}/\d{4}',              # DD/MM/YYYY
+    r'\d{2}-\d{2}-\d{4}',              # DD-MM-YYYY
+    r'\d{2}\.\d{2}\.\d{4}',            # DD.MM.YYYY
+    r'[A-Za-z]{3}\s+\d{2},\s*\d{4}',   # MMM DD, YYYY
+    r'\d{1,2}/\d{1,2}/\d{2,4}',        # D/M/YY or DD/MM/YYYY
+    r'\d{1,2}-\d{1,2}-\d{2,4}'         # D-M-YY or DD-MM-YYYY
+]
+
+AMOUNT_PATTERNS = [
+    r'\(?\$?\s*[\d,]+\.?\d*\)?',       # Handles (1234.56) and $1,234.56
+    r'\(?\s*[\d,]+\.?\d*\)?',          # Basic number format with optional decimal
+    r'\(?\s*[\d\.]+,?\d*\)?',          # European format with optional decimal
+    r'\(?\$\s*[\d,]+\.?\d*\)?',        # USD format
+    r'\(?\€\s*[\d\.]+,?\d*\)?',        # EUR format
+    r'\(?\£\s*[\d,]+\.?\d*\)?',        # GBP format
+    r'\(?\d+(?:[.,]\d{2})?\)?'         # Simple number with optional decimals
+]
+
+# Transaction type keywords - expanded
+TRANSACTION_KEYWORDS = {
+    'CASH_OUT': ['ATM', 'WITHDRAWAL', 'WITHDRAW', 'CASH OUT', 'CASHOUT'],
+    'CASH_IN': ['DEPOSIT', 'DEP', 'CASH IN', 'CASHIN', 'CREDIT'],
+    'DEBIT': ['DEBIT', 'POS', 'PURCHASE', 'PAYMENT TO', 'PAID TO', 'DR'],
+    'PAYMENT': ['PAYMENT', 'BILL PAY', 'AUTOPAY', 'PMT', 'FEE', 'DIRECT DEBIT'],
+    'TRANSFER': ['TRANSFER', 'TRF', 'XFER', 'ACH', 'IMPS', 'NEFT', 'UPI', 'SWIFT', 'CR']
+}
+
+# Lines printing the account balance rather than a transaction
+BALANCE_LINE_KEYWORDS = ['OPENING BALANCE', 'CLOSING BALANCE', 'BEGINNING BALANCE', 'ENDING BALANCE',
+                         'PREVIOUS BALANCE', 'BALANCE BROUGHT FORWARD', 'BALANCE CARRIED FORWARD',
+                         'BALANCE FORWARD', 'BROUGHT FORWARD', 'CARRIED FORWARD', 'BALANCE B/F', 'BALANCE C/F']
+
+# AMOUNT_PATTERNS without the alternatives that can never be chosen: the
+# basic, USD and simple-number patterns only match where the first pattern
+# already matches, and the first matching alternative wins. findall returns
+# exactly the same matches with about a quarter less work per line.
+_AMOUNT_SCAN_PATTERNS = [AMOUNT_PATTERNS[0], AMOUNT_PATTERNS[2], AMOUNT_PATTERNS[4], AMOUNT_PATTERNS[5]]
+
+_AMOUNT_NOISE_RE = re.compile(r'[£$€\s,]')
+
+
+def clean_amount(amount_str):
+    """
+    Clean and convert amount string to float
+    Handles various number formats including European style
+    """
+    try:
+        # Remove any currency symbols and whitespace
+        cleaned = _AMOUNT_NOISE_RE.sub('', str(amount_str))
+
+        # Handle negative amounts with parentheses
+        if '(' in cleaned and ')' in cleaned:
+            cleaned = cleaned.replace('(', '-').replace(')', '')
+
+        # Handle European number format (1.234,56 -> 1234.56)
+        if ',' in cleaned and '.' in cleaned:
+            if cleaned.index(',') > cleaned.index('.'):
+                cleaned = cleaned.replace('.', '').replace(',', '.')
+            else:
+                cleaned = cleaned.replace(',', '')
+        elif ',' in cleaned:
+            cleaned = cleaned.replace(',', '.')
+
+        return float(cleaned)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _parse_amount(amount_str):
+    # Plain numbers such as "1234.56" are the common case and float() gives
+    # the same result clean_amount would, without the regex substitution
+    try:
+        return float(amount_str)
+    except ValueError:
+        return clean_amount(amount_str)
+
+
+class ParsedLine:
+    """
+    Result of classifying one statement line
+    """
+    __slots__ = ('date', 'debit_amount', 'credit_amount', 'transaction_type')
+
+    def __init__(self, date, debit_amount, credit_amount, transaction_type):
+        self.date = date
+        self.debit_amount = debit_amount
+        self.credit_amount = credit_amount
+        self.transaction_type = transaction_type
+
+
+class LineClassifier:
+    """
+    Precompiled, single-pass classifier for bank statement lines.
+
+    Date and amount alternations are compiled once and each line is
+    upper-cased once. Transaction keywords are compiled into one combined
+    alternation that rejects lines without any keyword in a single scan,
+    plus one alternation per type that is searched in TRANSACTION_KEYWORDS
+    order, so the first matching type still wins even when keywords overlap
+    ('DIRECT DEBIT' and 'DEBIT', 'CREDIT' and 'CR').
+    """
+
+    def __init__(self, date_patterns=DATE_PATTERNS, amount_patterns=_AMOUNT_SCAN_PATTERNS,
+                 transaction_keywords=TRANSACTION_KEYWORDS, balance_keywords=BALANCE_LINE_KEYWORDS):
+        self.date_re = re.compile('|'.join(date_patterns))
+        self.amount_re = re.compile('|'.join(amount_patterns))
+        self.balance_re = re.compile('|'.join(re.escape(keyword.upper()) for keyword in balance_keywords))
+
+        self.type_res = [
+            (type_name, re.compile('|'.join(re.escape(keyword.upper()) for keyword in keywords)))
+            for type_name, keywords in transaction_keywords.items()
+        ]
+        self.keyword_re = re.compile('|'.join(type_re.pattern for _, type_re in self.type_res))
+
+        # Counters for the debugging summary
+        self.lines_with_dates = 0
+        self.lines_with_amounts = 0
+
+    def keyword_type(self, line_upper):
+        """
+        Returns the first transaction type whose keywords occur in the line
+        """
+        if self.keyword_re.search(line_upper) is None:
+            return None
+        for type_name, type_re in self.type_res:
+            if type_re.search(line_upper):
+                return type_name
+        return None
+
+    def printed_balance(self, line):
+        """
+        Balance printed on an opening, closing or brought/carried forward
+        balance line: the last amount after the keyword. Returns None when
+        the line is not a balance line.
+        """
+        line_upper = line.upper()
+        match = self.balance_re.search(line_upper)
+        if match is None:
+            return None
+        for amount_str in reversed(self.amount_re.findall(line_upper, match.end())):
+            amount = _parse_amount(amount_str)
+            if amount is not None:
+                return amount
+        return None
+
+    def classify(self, line):
+        """
+        Classify a non-empty statement line
+        Returns a ParsedLine, or None when the line is not a transaction
+        """
+        date_match = self.date_re.search(line)
+        if date_match:
+            self.lines_with_dates += 1
+
+        line_upper = line.upper()
+        is_debit = 'DR' in line_upper
+
+        debit_amount = None
+        credit_amount = None
+        amount_matches = self.amount_re.findall(line)
+        if amount_matches:
+            self.lines_with_amounts += 1
+
+            # Only the last debit and the last credit amount on the line are
+            # kept, so scan from the end and stop once both are known
+            for amount_str in reversed(amount_matches):
+                amount = _parse_amount(amount_str)
+                if amount is None:
+                    continue
+                if is_debit or '(' in amount_str or amount < 0:
+                    if debit_amount is None:
+                        debit_amount = abs(amount)
+                        if is_debit or credit_amount is not None:
+                            break
+                elif credit_amount is None:
+                    credit_amount = abs(amount)
+                    if debit_amount is not None:
+                        break
+
+        if not (date_match and (debit_amount is not None or credit_amount is not None)):
+            return None
+
+        transaction_type = self.keyword_type(line_upper)
+        if transaction_type is None:
+            transaction_type = 'DEBIT' if debit_amount is not None else 'CASH_IN'
+
+        return ParsedLine(date_match.group(0), debit_amount, credit_amount, transaction_type)
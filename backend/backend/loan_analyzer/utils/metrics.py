@@ -0,0 +1,229 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond parsing up to whole statements
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Buckets for per-statement counts (lines, dates, amounts, transactions)
+COUNT_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Counter:
+    """
+    Monotonically increasing count, one series per label combination
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus sense: one _bucket series
+    per upper bound plus _sum and _count, for every label combination
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def drain(self):
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series):
+        with self._lock:
+            for key, (counts, total, count) in series.items():
+                current = self._series.get(key)
+                if current is None:
+                    current = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+                current[0] = [mine + theirs for mine, theirs in zip(current[0], counts)]
+                current[1] += total
+                current[2] += count
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (('le', _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class MetricsRegistry:
+    """
+    Process-local collection of metrics rendered in the Prometheus text
+    exposition format. Each server worker process keeps its own values,
+    so scrape every worker (or run a single one) to see all requests.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def drain(self):
+        """
+        Take the values recorded so far and reset them, e.g. in a pool
+        worker process to hand its metrics back with a task's result
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.drain() for metric in metrics}
+
+    def merge(self, values):
+        """
+        Add values returned by drain() in another process
+        """
+        for name, metric_values in values.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(metric_values)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    'loan_analyzer_stage_seconds',
+    'Time spent in each stage of statement analysis',
+    ('stage',),
+)
+STATEMENT_LINES = registry.histogram(
+    'loan_analyzer_statement_lines',
+    'Per-statement counts of parsed lines, lines with dates, lines with amounts and transactions',
+    ('kind',),
+    buckets=COUNT_BUCKETS,
+)
+PAGES_EXTRACTED = registry.counter(
+    'loan_analyzer_pages_extracted_total',
+    'PDF pages extracted, by whether readable text was found',
+    ('result',),
+)
+STATEMENTS_ANALYZED = registry.counter(
+    'loan_analyzer_statements_analyzed_total',
+    'Statements analyzed, by outcome',
+    ('outcome',),
+)
+TRANSACTIONS_SCORED = registry.counter(
+    'loan_analyzer_transactions_scored_total',
+    'Transactions scored by the fraud model',
+)
+RESULT_CACHE_LOOKUPS = registry.counter(
+    'loan_analyzer_result_cache_lookups_total',
+    'Result cache lookups, by hit or miss',
+    ('result',),
+)
+OCR_PAGES = registry.counter(
+    'loan_analyzer_ocr_pages_total',
+    'Pages without a text layer sent to OCR, by outcome (text, empty, timeout, failed)',
+    ('result',),
+)
+PAGE_CACHE_LOOKUPS = registry.counter(
+    'loan_analyzer_page_cache_lookups_total',
+    'Per-page result lookups of incremental statement analysis, by hit or miss',
+    ('result',),
+)
+
+
+def timed(stage):
+    """
+    Context manager recording the duration of `stage` in loan_analyzer_stage_seconds
+    """
+    return STAGE_SECONDS.time(stage=stage)
@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from .features import FEATURE_COLUMNS
+from .tree_engine import CompiledForest
+from .velocity import VELOCITY_COLUMNS
+
+# Version of the bundle layout, bumped when the arrays or manifest change
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+# Every export writes its arrays into a new directory with this prefix
+ARRAYS_PREFIX = 'arrays-'
+
+
+def manifest_path(directory):
+    return os.path.join(directory, MANIFEST_NAME)
+
+
+def _array_directory(manifest):
+    return os.path.dirname(next(iter(manifest['arrays'].values()))['file'])
+
+
+def _read_manifest(directory):
+    with open(manifest_path(directory)) as file:
+        return json.load(file)
+
+
+def export_model_bundle(model, column_names, directory, fingerprint):
+    """
+    Write a fitted tree ensemble as a model bundle: one .npy file per
+    CompiledForest node array and a manifest.json with the feature schema,
+    the array dtypes and shapes, and the fingerprint of the source pickles
+    Arrays are never rewritten in place: workers serving the bundle keep
+    them memory-mapped, and a truncated mapping crashes them with SIGBUS.
+    Each export writes a new arrays-* directory, then atomically replaces
+    the manifest that points to it, so a reload reads either the old or
+    the new bundle and an interrupted export is never loaded. Array
+    directories older than the previous export are removed; workers still
+    mapping them keep reading the unlinked files.
+    Returns the manifest.
+    """
+    forest = CompiledForest.from_estimator(model)
+    column_names = list(column_names)
+    if len(column_names) != forest.n_features:
+        raise ValueError(f"The model has {forest.n_features} features but {len(column_names)} column names")
+
+    os.makedirs(directory, exist_ok=True)
+    try:
+        previous = _array_directory(_read_manifest(directory))
+    except (OSError, ValueError, KeyError, StopIteration):
+        previous = None
+
+    array_directory = os.path.basename(tempfile.mkdtemp(prefix=ARRAYS_PREFIX, dir=directory))
+    # mkdtemp creates it private to this user, workers may run as another one
+    os.chmod(os.path.join(directory, array_directory), 0o755)
+    arrays = {}
+    for name in CompiledForest.ARRAYS:
+        array = np.ascontiguousarray(getattr(forest, name))
+        file = os.path.join(array_directory, f'{name}.npy')
+        np.save(os.path.join(directory, file), array)
+        arrays[name] = {'file': file, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'fingerprint': fingerprint,
+        'column_names': column_names,
+        'n_features': forest.n_features,
+        'n_estimators': forest.n_estimators,
+        'max_depth': forest.max_depth,
+        'classes': forest.classes_.tolist(),
+        'arrays': arrays,
+    }
+    temporary_path = manifest_path(directory) + '.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temporary_path, manifest_path(directory))
+
+    # A worker may have read the previous manifest but not mapped its arrays yet
+    for entry in os.listdir(directory):
+        if entry.startswith(ARRAYS_PREFIX) and entry not in (array_directory, previous):
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    return manifest
+
+
+def check_feature_schema(column_names):
+    """
+    Raise ValueError unless every model column is a feature that
+    build_feature_columns or the velocity features provide; any other column
+    would silently be scored as 0
+    """
+    known = set(FEATURE_COLUMNS) | set(VELOCITY_COLUMNS)
+    unknown = [name for name in column_names if name not in known]
+    if unknown:
+        raise ValueError(f"Model bundle expects features the analysis does not build: {', '.join(unknown)}")
+
+
+def load_model_bundle(directory, mmap_mode='r'):
+    """
+    Load a model bundle written by export_model_bundle
+    The node arrays are memory-mapped read-only, so loading takes a few
+    milliseconds and worker processes share the pages of the same files.
+    The manifest is checked against the arrays on disk and the analysis
+    feature schema; a mismatch raises ValueError.
+    Returns (CompiledForest, manifest).
+    """
+    manifest = _read_manifest(directory)
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported model bundle format {manifest.get('format')!r}, expected {BUNDLE_FORMAT}")
+
+    column_names = manifest['column_names']
+    if len(column_names) != manifest['n_features']:
+        raise ValueError(f"Model bundle lists {len(column_names)} column names for {manifest['n_features']} features")
+    check_feature_schema(column_names)
+
+    arrays = {}
+    for name in CompiledForest.ARRAYS:
+        spec = manifest['arrays'][name]
+        array = np.load(os.path.join(directory, spec['file']), mmap_mode=mmap_mode, allow_pickle=False)
+        if array.dtype.str != spec['dtype'] or list(array.shape) != spec['shape']:
+            raise ValueError(f"Model bundle array '{name}' is {array.dtype.str}{list(array.shape)}, "
+                             f"the manifest expects {spec['dtype']}{spec['shape']}")
+        arrays[name] = array
+
+    node_count = len(arrays['feature'])
+    if (len(arrays['roots']) != manifest['n_estimators'] or len(arrays['children']) != 2 * node_count
+            or len(arrays['threshold']) != node_count
+            or arrays['leaf_proba'].shape != (node_count, len(manifest['classes']))):
+        raise ValueError("Model bundle arrays do not describe one forest")
+
+    forest = CompiledForest(max_depth=manifest['max_depth'], n_features=manifest['n_features'],
+                            classes=np.array(manifest['classes']), **arrays)
+    return forest, manifest
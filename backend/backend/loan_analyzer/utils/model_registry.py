@@ -0,0 +1,388 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+from .metrics import TRANSACTIONS_SCORED, timed
+from .model_bundle import load_model_bundle, manifest_path
+from .tree_engine import CompiledForest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VERSION = 'default'
+
+# Inference backends: 'sklearn' always calls the pickled model, 'compiled'
+# evaluates the flattened forest, 'auto' uses the compiled forest for
+# batches up to compiled_max_rows rows and sklearn (with its n_jobs) above
+INFERENCE_BACKENDS = ('sklearn', 'compiled', 'auto')
+
+
+def _file_sha256(path):
+    """
+    Hash a file in chunks so large pickles are not read into memory twice
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_mtimes(*paths):
+    return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+
+def _source_files(model_path, columns_path):
+    # A version without columns_path is a model bundle directory, watched through its manifest
+    return (manifest_path(model_path),) if columns_path is None else (model_path, columns_path)
+
+
+def version_label(name, fingerprint):
+    """
+    Short identifier of a named model version, as used in cache keys
+    """
+    return f"{name}:{fingerprint[:12]}"
+
+
+def model_fingerprint(model_path, columns_path):
+    """
+    Content hash of a model + columns pickle pair
+    """
+    return hashlib.sha256((_file_sha256(model_path) + _file_sha256(columns_path)).encode('utf-8')).hexdigest()
+
+
+class ModelVersion:
+    """
+    A loaded fraud model together with the feature columns it was trained on.
+    Versions loaded from a model bundle have no sklearn model and always
+    score with the memory-mapped compiled forest.
+    The model and columns of an instance never change after it is loaded, so a
+    reference obtained from the registry stays consistent even if a reload
+    swaps in a newer version.
+    """
+
+    def __init__(self, name, model, column_names, model_path, columns_path, fingerprint, mtimes):
+        self.name = name
+        self.model = model
+        self.column_names = list(column_names)
+        self.model_path = model_path
+        self.columns_path = columns_path
+        self.fingerprint = fingerprint
+        self.mtimes = mtimes
+        self.loaded_at = time.time()
+        self.backend = 'sklearn'
+        self.compiled_max_rows = 1000
+        self.compiled = None
+
+    def compile(self, backend, compiled_max_rows=1000):
+        """
+        Select the inference backend, flattening the forest if it is used.
+        Models that cannot be compiled keep using sklearn.
+        """
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'")
+        self.compiled_max_rows = compiled_max_rows
+        if backend == 'sklearn':
+            return
+        try:
+            self.compiled = CompiledForest.from_estimator(self.model)
+            self.backend = backend
+        except (ValueError, AttributeError) as e:
+            logger.warning("Fraud model '%s' cannot be compiled, using sklearn: %s", self.name, e)
+
+    @property
+    def version(self):
+        """
+        Short identifier of the exact model + columns pair that is loaded
+        """
+        return version_label(self.name, self.fingerprint)
+
+    def predict_proba(self, matrix):
+        """
+        Class probabilities for a float32 feature matrix laid out in
+        column_names order
+        """
+        with timed('model_inference'):
+            proba = self._predict_proba(matrix)
+        TRANSACTIONS_SCORED.inc(len(matrix))
+        return proba
+
+    def _predict_proba(self, matrix):
+        use_compiled = self.compiled is not None and (
+            self.backend == 'compiled' or len(matrix) <= self.compiled_max_rows
+        )
+        # The flattened trees have no missing-value routing, leave NaN to sklearn
+        if self.model is None or (use_compiled and not np.isnan(matrix).any()):
+            return self.compiled.predict_proba(matrix)
+
+        # Wrap the matrix without copying it so sklearn still validates the
+        # feature names the model was fitted with; pandas is only loaded for this
+        import pandas as pd
+
+        return self.model.predict_proba(pd.DataFrame(matrix, columns=self.column_names, copy=False))
+
+    def warm_up(self):
+        """
+        Run one inference so lazily initialised model state is built before
+        the first real request is scored
+        """
+        self._predict_proba(np.zeros((1, len(self.column_names)), dtype=np.float32))
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of fraud models.
+
+    Models are unpickled once per worker and shared by every request. Several
+    named versions can be registered side by side; `get()` returns the default
+    one unless a name is given. Source files are re-checked at most every
+    `reload_interval` seconds and a changed pickle is loaded and swapped in
+    atomically, so in-flight requests keep the version they started with.
+    """
+
+    def __init__(self, reload_interval=5.0, n_jobs=None, backend='sklearn', compiled_max_rows=1000):
+        self.reload_interval = reload_interval
+        # Overrides the pickled estimator's n_jobs, e.g. -1 to score batches on all cores
+        self.n_jobs = n_jobs
+        self.backend = backend
+        self.compiled_max_rows = compiled_max_rows
+        self.default_version = None
+        self._versions = {}
+        self._last_checked = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def register(self, name, model_path, columns_path=None, default=False, warm_up=True):
+        """
+        Load a model version from disk and make it available under `name`
+        Without columns_path, model_path is a model bundle directory written
+        by the export_model command.
+        """
+        entry = self._load(name, model_path, columns_path, warm_up)
+        with self._lock:
+            self._versions[name] = entry
+            self._last_checked[name] = time.monotonic()
+            self._load_locks.setdefault(name, threading.Lock())
+            if default or self.default_version is None:
+                self.default_version = name
+        return entry
+
+    def unregister(self, name):
+        with self._lock:
+            self._versions.pop(name, None)
+            self._last_checked.pop(name, None)
+            if self.default_version == name:
+                self.default_version = next(iter(self._versions), None)
+
+    def versions(self):
+        """
+        Returns a mapping of registered names to their loaded versions
+        """
+        with self._lock:
+            return {name: entry.version for name, entry in self._versions.items()}
+
+    def get(self, name=None):
+        """
+        Return the loaded ModelVersion for `name` (or the default version),
+        reloading it first if its files changed on disk
+        """
+        name = name or self.default_version
+        if name is None or name not in self._versions:
+            raise LookupError(f"Fraud model version '{name}' is not loaded")
+
+        now = time.monotonic()
+        if now - self._last_checked.get(name, 0) >= self.reload_interval:
+            self._last_checked[name] = now
+            self.reload_if_changed(name)
+
+        return self._versions[name]
+
+    def reload_if_changed(self, name, warm_up=True):
+        """
+        Reload `name` when its pickles changed on disk. The cheap mtime check
+        runs first and the content hash decides whether a reload is needed,
+        so touching a file without changing it does not reload the model.
+        Returns True if a new version was swapped in.
+        """
+        current = self._versions.get(name)
+        if current is None:
+            return False
+
+        try:
+            mtimes = _file_mtimes(*_source_files(current.model_path, current.columns_path))
+        except OSError as e:
+            logger.warning("Cannot stat fraud model '%s': %s", name, e)
+            return False
+        if mtimes == current.mtimes:
+            return False
+
+        with self._load_locks[name]:
+            current = self._versions.get(name)
+            if current is None or mtimes == current.mtimes:
+                return False
+            try:
+                entry = self._load(name, current.model_path, current.columns_path, warm_up)
+            except Exception as e:
+                logger.warning("Reloading fraud model '%s' failed, keeping %s: %s", name, current.version, e)
+                return False
+
+            if entry.fingerprint == current.fingerprint:
+                # Same content, only the mtime moved: keep the loaded model
+                current.mtimes = entry.mtimes
+                entry = current
+                changed = False
+            else:
+                changed = True
+
+            with self._lock:
+                self._versions[name] = entry
+
+        if changed:
+            logger.info("Fraud model '%s' reloaded as %s", name, entry.version)
+        return changed
+
+    def _load(self, name, model_path, columns_path, warm_up):
+        if columns_path is None:
+            return self._load_bundle(name, model_path, warm_up)
+
+        mtimes = _file_mtimes(model_path, columns_path)
+        fingerprint = model_fingerprint(model_path, columns_path)
+
+        with open(model_path, 'rb') as file:
+            model = pickle.load(file)
+        if self.n_jobs is not None and hasattr(model, 'n_jobs'):
+            model.n_jobs = self.n_jobs
+        with open(columns_path, 'rb') as file:
+            column_names = pickle.load(file)
+
+        entry = ModelVersion(name, model, column_names, model_path, columns_path, fingerprint, mtimes)
+        entry.compile(self.backend, self.compiled_max_rows)
+        if warm_up:
+            entry.warm_up()
+        return entry
+
+    def _load_bundle(self, name, bundle_path, warm_up):
+        mtimes = _file_mtimes(manifest_path(bundle_path))
+        forest, manifest = load_model_bundle(bundle_path)
+        # The bundle keeps the fingerprint of the pickles it was exported
+        # from, so both share result cache entries
+        entry = ModelVersion(name, None, manifest['column_names'], bundle_path, None, manifest['fingerprint'], mtimes)
+        entry.compiled = forest
+        entry.backend = 'compiled'
+        if warm_up:
+            entry.warm_up()
+        return entry
+
+
+registry = ModelRegistry()
+
+# When loading the configured models last failed, so get_model retries at
+# most once per reload_interval instead of on every request
+_failed_load_at = None
+_configured_load_lock = threading.Lock()
+
+
+def _configured_versions():
+    """
+    Returns (FRAUD_MODEL_VERSIONS or the bundled pickles, default version name)
+    """
+    from django.conf import settings
+
+    utils_dir = os.path.join(settings.BASE_DIR, 'loan_analyzer', 'utils')
+    versions = getattr(settings, 'FRAUD_MODEL_VERSIONS', None) or {
+        DEFAULT_VERSION: {
+            'model_path': os.path.join(utils_dir, 'random_forest_fraud_model.pkl'),
+            'columns_path': os.path.join(utils_dir, 'column_names.pkl'),
+        }
+    }
+    return versions, getattr(settings, 'FRAUD_MODEL_DEFAULT_VERSION', None) or next(iter(versions))
+
+
+# Fingerprints of configured pickles by path, with the (mtime, size) they were computed for
+_file_fingerprints = {}
+
+
+def configured_model_version():
+    """
+    Version of the default fraud model, as get_model().version reports it,
+    without loading the model: the version already loaded in this process,
+    or else the fingerprint of the configured files (the manifest of a
+    bundle, or the pickles, hashed again only when their mtime or size
+    changes). Lets processes that only look up cached results, such as the
+    ASGI server in front of the offload pool, skip unpickling the model.
+    Returns 'none' when the model files cannot be read.
+    """
+    loaded = registry.versions().get(registry.default_version)
+    if loaded is not None:
+        return loaded
+
+    versions, name = _configured_versions()
+    paths = versions.get(name, {})
+    try:
+        if 'bundle_path' in paths:
+            with open(manifest_path(paths['bundle_path'])) as file:
+                fingerprint = json.load(file)['fingerprint']
+        else:
+            files = (paths['model_path'], paths['columns_path'])
+            signature = tuple((stat.st_mtime_ns, stat.st_size) for stat in map(os.stat, files))
+            cached = _file_fingerprints.get(files)
+            if cached is not None and cached[0] == signature:
+                fingerprint = cached[1]
+            else:
+                fingerprint = model_fingerprint(*files)
+                _file_fingerprints[files] = (signature, fingerprint)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Cannot fingerprint fraud model '%s': %s", name, e)
+        return 'none'
+    return version_label(name, fingerprint)
+
+
+def load_configured_models():
+    """
+    Register the model versions configured in Django settings.
+
+    FRAUD_MODEL_VERSIONS maps version names to {'model_path', 'columns_path'}
+    or to {'bundle_path'} for a model bundle written by export_model; when
+    it is not set the bundled pickles are registered as 'default'.
+    """
+    from django.conf import settings
+
+    versions, default_name = _configured_versions()
+    registry.reload_interval = getattr(settings, 'FRAUD_MODEL_RELOAD_INTERVAL', registry.reload_interval)
+    registry.n_jobs = getattr(settings, 'FRAUD_MODEL_N_JOBS', registry.n_jobs)
+    registry.backend = getattr(settings, 'FRAUD_INFERENCE_BACKEND', registry.backend)
+    registry.compiled_max_rows = getattr(settings, 'FRAUD_COMPILED_MAX_ROWS', registry.compiled_max_rows)
+
+    for name, paths in versions.items():
+        try:
+            if 'bundle_path' in paths:
+                entry = registry.register(name, paths['bundle_path'], default=(name == default_name))
+            else:
+                entry = registry.register(name, paths['model_path'], paths['columns_path'],
+                                          default=(name == default_name))
+            logger.info("Fraud model '%s' loaded as %s", name, entry.version)
+        except Exception as e:
+            logger.warning("Could not load fraud model '%s': %s", name, e)
+
+
+def get_model(name=None):
+    """
+    Returns the ModelVersion to score with, loading the configured models on
+    first use if the app registry did not load them at startup
+    A failed load is retried at most once per reload_interval; until then
+    LookupError is raised straight away.
+    """
+    global _failed_load_at
+    if registry.default_version is None:
+        with _configured_load_lock:
+            retry_due = (_failed_load_at is None
+                         or time.monotonic() - _failed_load_at >= registry.reload_interval)
+            if registry.default_version is None and retry_due:
+                load_configured_models()
+                _failed_load_at = None if registry.default_version is not None else time.monotonic()
+    return registry.get(name)
@@ -0,0 +1,194 @@
+import importlib.util
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .conf import get_setting
+from .metrics import OCR_PAGES, STAGE_SECONDS
+from .result_cache import evict_directory
+
+logger = logging.getLogger(__name__)
+
+_ocr_pool = None
+_ocr_pool_workers = 0
+_ocr_pool_lock = threading.Lock()
+_available = None
+
+
+def ocr_available():
+    """
+    Whether OCR is enabled (OCR_ENABLED) and pytesseract and the tesseract
+    binary are installed. Checked once per process.
+    """
+    global _available
+    if not get_setting('OCR_ENABLED', True):
+        return False
+    if _available is None:
+        command = get_setting('TESSERACT_CMD', 'tesseract')
+        _available = importlib.util.find_spec('pytesseract') is not None and shutil.which(command) is not None
+        if not _available:
+            logger.warning("OCR is enabled but pytesseract or the %s binary is not installed, "
+                           "pages without a text layer are skipped", command)
+    return _available
+
+
+def _get_ocr_pool(workers):
+    """
+    Returns the process pool OCR runs on. It is separate from the page
+    extraction pool, so slow scanned pages never hold up text pages.
+    """
+    global _ocr_pool, _ocr_pool_workers
+    with _ocr_pool_lock:
+        if _ocr_pool is None or _ocr_pool_workers != workers:
+            if _ocr_pool is not None:
+                _ocr_pool.shutdown(wait=False)
+            _ocr_pool = ProcessPoolExecutor(max_workers=workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+            _ocr_pool_workers = workers
+        return _ocr_pool
+
+
+def _discard_ocr_pool(pool):
+    """
+    Drop a pool with a worker stuck past its time budget (e.g. rendering a
+    malformed page): its queued pages are cancelled and its processes
+    stopped, and the next statement starts a fresh pool
+    """
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    # ProcessPoolExecutor cannot stop a running task, so stop the processes themselves
+    for process in list((getattr(pool, '_processes', None) or {}).values()):
+        process.terminate()
+
+
+def _page_image(pdf_path, page_index, fingerprint, dpi, image_dir):
+    """
+    Render a page with pypdfium2, or load the rendering cached for its
+    fingerprint
+    """
+    from PIL import Image
+
+    image_path = os.path.join(image_dir, f"{fingerprint}-{dpi}.png")
+    try:
+        with Image.open(image_path) as cached:
+            image = cached.copy()
+        os.utime(image_path)
+        return image
+    except OSError:
+        pass
+
+    import pypdfium2 as pdfium
+
+    document = pdfium.PdfDocument(pdf_path)
+    try:
+        image = document[page_index].render(scale=dpi / 72, grayscale=True).to_pil()
+    finally:
+        document.close()
+
+    # Write to a temporary file first so other workers never read a partial image
+    os.makedirs(image_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=image_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            image.save(file, format='PNG')
+        os.replace(tmp_path, image_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return image
+
+
+def _ocr_page(pdf_path, page_index, fingerprint, options):
+    """
+    Process pool worker: OCR one page within options['timeout'] seconds
+    Returns (text, outcome, seconds); text is None unless OCR found text.
+    """
+    import pytesseract
+
+    started = time.perf_counter()
+    if options['tesseract_cmd']:
+        pytesseract.pytesseract.tesseract_cmd = options['tesseract_cmd']
+    try:
+        image = _page_image(pdf_path, page_index, fingerprint, options['dpi'], options['image_dir'])
+        text = pytesseract.image_to_string(image, lang=options['language'], timeout=options['timeout'])
+    except RuntimeError as e:
+        # pytesseract kills tesseract and raises RuntimeError when the time budget runs out
+        outcome = 'timeout' if 'timeout' in str(e).lower() else 'failed'
+        return None, outcome, time.perf_counter() - started
+    except Exception:
+        return None, 'failed', time.perf_counter() - started
+
+    text = text if text and text.strip() else None
+    return text, 'text' if text else 'empty', time.perf_counter() - started
+
+
+def ocr_pages(pdf_path, pages):
+    """
+    OCR pages without a text layer on the OCR process pool
+    `pages` is a list of (page_num, page fingerprint). Each page gets
+    OCR_PAGE_TIMEOUT seconds for tesseract plus OCR_RENDER_TIMEOUT for
+    rendering it, and the results are waited for within that budget for all
+    the pages, OCR_WORKERS at a time. Pages that time out or fail are left
+    out; when one times out, the pool is discarded.
+    Returns {page_num: text} for the pages where OCR found text.
+    """
+    if not pages or not ocr_available():
+        return {}
+
+    from django.conf import settings
+
+    options = {
+        'dpi': get_setting('OCR_DPI', 300),
+        'language': get_setting('OCR_LANGUAGE', 'eng'),
+        'timeout': get_setting('OCR_PAGE_TIMEOUT', 30),
+        'tesseract_cmd': get_setting('TESSERACT_CMD', 'tesseract'),
+        'image_dir': str(get_setting('OCR_IMAGE_CACHE_DIR',
+                                     os.path.join(settings.BASE_DIR.parent, 'cache', 'page_images'))),
+    }
+    workers = get_setting('OCR_WORKERS', 1)
+    pool = _get_ocr_pool(workers)
+    futures = [
+        (page_num, pool.submit(_ocr_page, pdf_path, page_num - 1, fingerprint, options))
+        for page_num, fingerprint in pages
+    ]
+    deadline = None
+    if options['timeout']:
+        rounds = -(-len(pages) // workers)
+        deadline = time.monotonic() + rounds * (options['timeout'] + get_setting('OCR_RENDER_TIMEOUT', 30))
+
+    texts = {}
+    timed_out = False
+    for page_num, future in futures:
+        try:
+            text, outcome, seconds = future.result(
+                timeout=None if deadline is None else max(0.0, deadline - time.monotonic())
+            )
+        except TimeoutError:
+            future.cancel()
+            logger.warning("OCR of page %d did not finish in time", page_num)
+            OCR_PAGES.inc(result='timeout')
+            timed_out = True
+            continue
+        except Exception as e:
+            logger.warning("OCR of page %d failed: %s", page_num, e)
+            OCR_PAGES.inc(result='failed')
+            continue
+        STAGE_SECONDS.observe(seconds, stage='page_ocr')
+        OCR_PAGES.inc(result=outcome)
+        logger.debug("OCR of page %d: %s in %.2fs", page_num, outcome, seconds)
+        if text:
+            texts[page_num] = text
+    if timed_out:
+        _discard_ocr_pool(pool)
+
+    evict_directory(options['image_dir'], '.png', get_setting('OCR_IMAGE_CACHE_MAX_BYTES', 512 * 1024 * 1024),
+                    get_setting('RESULT_CACHE_TTL', 7 * 24 * 3600))
+    return texts
@@ -0,0 +1,199 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .conf import get_setting
+from .metrics import RESULT_CACHE_LOOKUPS, registry as metrics_registry
+from .result_cache import get_result_cache, is_cacheable
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    """
+    Process pool initializer: set up Django in the spawned worker and load
+    the fraud model once, before the first statement is analyzed
+    """
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+
+    from .warmup import prewarm
+    prewarm()
+
+
+def _analyze_in_worker(pdf_path):
+    """
+    Returns (result, metrics): the stage timings and counters recorded in
+    the worker while analyzing, for the parent to export
+    """
+    from .extract import analyze_bank_statement
+
+    result = analyze_bank_statement(pdf_path)
+    return result, metrics_registry.drain()
+
+
+class PoolSaturated(Exception):
+    """
+    Raised when the offload pool has no room for more statements
+    """
+
+
+class AnalysisPool:
+    """
+    Bounded process pool that runs analyze_bank_statement off the event loop.
+
+    At most `max_pending` statements are admitted at a time (running on the
+    `workers` processes or waiting for one); `reserve()` refuses anything
+    beyond that so callers can push back with a 503 instead of queueing
+    without limit. Workers are spawned, so each one loads its own copy of
+    the fraud model. The metrics a worker records while analyzing are sent
+    back with the result and merged into this process's registry.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def reserve(self, count):
+        """
+        Admit `count` statements, raising PoolSaturated if that would
+        exceed max_pending
+        """
+        with self._lock:
+            if self.pending + count > self.max_pending:
+                raise PoolSaturated(f"{self.pending} of {self.max_pending} analysis slots in use")
+            self.pending += count
+
+    def release(self, count):
+        with self._lock:
+            self.pending = max(0, self.pending - count)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'),
+                                                     initializer=_init_worker)
+            return self._executor
+
+    def _discard_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _broken(self, executor, pdf_path, error):
+        # A worker died (e.g. killed for memory); start a fresh pool for the next request
+        logger.error("Analysis worker pool broke while analyzing %s: %s", pdf_path, error)
+        self._discard_executor(executor)
+        return {"error": "Analysis worker stopped unexpectedly", "transactions": [], "summary": None}
+
+    async def analyze(self, pdf_path):
+        """
+        Analyze one statement on the pool and return its result dictionary
+        """
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            result, metrics = await loop.run_in_executor(executor, _analyze_in_worker, pdf_path)
+        except BrokenProcessPool as e:
+            return self._broken(executor, pdf_path, e)
+        metrics_registry.merge(metrics)
+        return result
+
+    def run(self, pdf_path, heartbeat=None, interval=30):
+        """
+        analyze() for worker threads: blocks until the statement has been
+        analyzed on the pool, calling `heartbeat` every `interval` seconds
+        while it waits
+        Statements run this way are not admitted with reserve(); the callers
+        (the analysis job threads) are bounded themselves.
+        """
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_analyze_in_worker, pdf_path)
+            while True:
+                try:
+                    result, metrics = future.result(timeout=interval)
+                    break
+                except TimeoutError:
+                    if heartbeat is not None:
+                        heartbeat()
+        except BrokenProcessPool as e:
+            return self._broken(executor, pdf_path, e)
+        metrics_registry.merge(metrics)
+        return result
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_analysis_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = get_setting('ANALYSIS_PROCESS_WORKERS', min(4, os.cpu_count() or 1))
+            _pool = AnalysisPool(workers, get_setting('ANALYSIS_PROCESS_MAX_PENDING', workers * 4))
+        return _pool
+
+
+async def analyze_bank_statement_offloaded(pdf_path, digest):
+    """
+    Async analyze_bank_statement with the result cache in front
+    Cache hits are answered without touching the pool; misses are analyzed
+    on the process pool and stored for the next upload of the same file.
+    The cache key is built from the model files' fingerprint, so the
+    server process never loads the model itself, only the pool workers do.
+    """
+    from .model_registry import configured_model_version
+
+    model_version = await asyncio.to_thread(configured_model_version)
+    cache = get_result_cache()
+
+    result = await asyncio.to_thread(cache.get, digest, model_version)
+    if result is not None:
+        RESULT_CACHE_LOOKUPS.inc(result='hit')
+        return result
+    RESULT_CACHE_LOOKUPS.inc(result='miss')
+
+    result = await get_analysis_pool().analyze(pdf_path)
+    if is_cacheable(result):
+        try:
+            await asyncio.to_thread(cache.set, digest, model_version, result)
+        except Exception as e:
+            logger.warning("Could not cache analysis result: %s", e)
+    return result
+
+
+def analyze_bank_statement_pooled(pdf_path, digest, heartbeat=None, interval=30):
+    """
+    analyze_bank_statement_offloaded for worker threads, see AnalysisPool.run
+    """
+    from .model_registry import configured_model_version
+
+    model_version = configured_model_version()
+    cache = get_result_cache()
+
+    result = cache.get(digest, model_version)
+    if result is not None:
+        RESULT_CACHE_LOOKUPS.inc(result='hit')
+        return result
+    RESULT_CACHE_LOOKUPS.inc(result='miss')
+
+    result = get_analysis_pool().run(pdf_path, heartbeat, interval)
+    if is_cacheable(result):
+        try:
+            cache.set(digest, model_version, result)
+        except Exception as e:
+            logger.warning("Could not cache analysis result: %s", e)
+    return result
@@ -0,0 +1,177 @@
+import bisect
+import logging
+import re
+
+import pandas as pd
+import pdfplumber
+
+from .conf import get_setting
+from .line_classifier import DATE_PATTERNS
+from .metrics import PAGES_EXTRACTED, timed
+from .tabular import HEADER_SEARCH_ROWS, TabularStatementReader, map_columns, records_from_columns
+
+logger = logging.getLogger(__name__)
+
+# Words closer than this fraction of their height belong to the same header
+# cell ("Transaction Date"); table columns are separated by wider gaps
+HEADER_GAP_RATIO = 0.6
+
+# The statement date patterns plus ISO dates, matched as whole numbers so a
+# D-M-YY pattern never picks "24-01-05" out of "2024-01-05"
+_date_re = re.compile(r'(?<!\d)(?:\d{4}-\d{2}-\d{2}|' + '|'.join(DATE_PATTERNS) + r')(?!\d)')
+
+
+def group_rows(words, tolerance=3):
+    """
+    Group pdfplumber words into visual rows by their top coordinate
+    Returns rows of words sorted left to right
+    """
+    rows = []
+    current = []
+    current_top = None
+    for word in sorted(words, key=lambda word: (round(word['top']), word['x0'])):
+        if current and abs(word['top'] - current_top) > tolerance:
+            rows.append(sorted(current, key=lambda word: word['x0']))
+            current = []
+        if not current:
+            current_top = word['top']
+        current.append(word)
+    if current:
+        rows.append(sorted(current, key=lambda word: word['x0']))
+    return rows
+
+
+class ColumnLayout:
+    """
+    Column geometry of a statement table, detected from its header row.
+
+    Every header cell becomes a column; a word belongs to the column whose
+    x-range contains its horizontal centre, with column edges halfway
+    between neighbouring header cells. `roles` maps date, description,
+    debit, credit, amount and balance to column indexes.
+    """
+
+    def __init__(self, edges, roles):
+        self.edges = edges
+        self.roles = roles
+
+    @classmethod
+    def from_header(cls, row):
+        """
+        Returns the layout described by `row`, or None if it is not a
+        statement table header
+        """
+        cells = []
+        for word in row:
+            gap_limit = HEADER_GAP_RATIO * (word['bottom'] - word['top'])
+            if cells and word['x0'] - cells[-1]['x1'] < gap_limit:
+                cells[-1] = {'text': f"{cells[-1]['text']} {word['text']}",
+                             'x0': cells[-1]['x0'], 'x1': word['x1']}
+            else:
+                cells.append({'text': word['text'], 'x0': word['x0'], 'x1': word['x1']})
+
+        roles = map_columns([cell['text'] for cell in cells])
+        if roles is None or len(roles) < 3:
+            return None
+        edges = [(left['x1'] + right['x0']) / 2 for left, right in zip(cells, cells[1:])]
+        return cls(edges, roles)
+
+    def cells(self, row):
+        """
+        Split a row of words into {role: cell text}
+        """
+        columns = [[] for _ in range(len(self.edges) + 1)]
+        for word in row:
+            centre = (word['x0'] + word['x1']) / 2
+            columns[bisect.bisect_right(self.edges, centre)].append(word['text'])
+        return {role: ' '.join(columns[index]) for role, index in self.roles.items()}
+
+    def to_dict(self):
+        return {'edges': self.edges, 'roles': self.roles}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['edges'], data['roles'])
+
+
+def _find_layout(rows):
+    for index, row in enumerate(rows[:HEADER_SEARCH_ROWS]):
+        layout = ColumnLayout.from_header(row)
+        if layout is not None:
+            return index, layout
+    return None, None
+
+
+def read_table_page(page, layout):
+    """
+    Rows of one page that belong to the statement table
+    A header row on the page replaces `layout`, and only the rows below it
+    are table rows. Returns (rows, layout in effect), where layout is None
+    while no header has been seen.
+    """
+    rows = group_rows(page.extract_words())
+    header_index, page_layout = _find_layout(rows)
+    if page_layout is not None:
+        return rows[header_index + 1:], page_layout
+    return rows, layout
+
+
+def page_chunk(rows, layout):
+    """
+    Table rows of one page as a statement chunk for TabularStatementReader
+    Rows without a date in their date cell (headers, totals, wrapped
+    description lines) get an empty date and are skipped by the reader.
+    """
+    chunk = {role: [] for role in layout.roles}
+    for row in rows:
+        cells = layout.cells(row)
+        date_match = _date_re.search(cells['date'])
+        cells['date'] = date_match.group(0) if date_match else ''
+        for role, text in cells.items():
+            chunk[role].append(text)
+    return pd.DataFrame(chunk, dtype=object)
+
+
+def extract_table_transactions(pdf_path, header_search_pages=None):
+    """
+    Table-aware extraction of a PDF statement
+    The column layout is read from the table header and reused for
+    following pages until a page shows a new header, and every row is mapped
+    cell by cell to date, description, debit, credit and balance instead of
+    regex-scanning the page text.
+    Returns (transactions, feature columns) like extract_tabular_transactions,
+    or None when no table header is found in the first header_search_pages
+    pages, so the caller can fall back to the text engine.
+    """
+    if header_search_pages is None:
+        header_search_pages = get_setting('PDF_TABLE_HEADER_SEARCH_PAGES', 1)
+
+    reader = TabularStatementReader()
+    layout = None
+
+    with timed('pdf_open'):
+        pdf = pdfplumber.open(pdf_path)
+
+    with pdf:
+        for page_num, page in enumerate(pdf.pages, 1):
+            with timed('page_table_extract'):
+                rows, layout = read_table_page(page, layout)
+                page.close()
+
+                if layout is None:
+                    if page_num >= header_search_pages:
+                        logger.debug("No statement table header found in %s", pdf_path)
+                        return None
+                    continue
+
+                PAGES_EXTRACTED.inc(result='text' if rows else 'empty')
+                if rows:
+                    reader.add_chunk(page_chunk(rows, layout))
+
+    if not reader.dates:
+        return [], None
+
+    columns = reader.feature_columns()
+    logger.debug("Read %d table rows from %s", len(reader.dates), pdf_path)
+    records = records_from_columns(columns, reader.type_code_column(), reader.dates, reader.descriptions)
+    return records, columns
@@ -0,0 +1,44 @@
+def build_file_report(filename, result, top_k=None, rank_by=None):
+    """
+    Shape the output of analyze_bank_statement into the per-file entry
+    returned in `analysis_results` by the upload endpoint
+    Totals come from the statement summary; `largest_transactions` holds the
+    top_k transactions ranked by rank_by (see summary.top_transactions).
+    """
+    # Imported on first use so the views load without NumPy
+    from .summary import top_transactions
+
+    if result.get('error'):
+        raise Exception(result['error'])
+
+    summary = result.get('summary', {})
+    fraud_analysis = summary.get('fraud_analysis', {})
+    transactions = result.get('transactions', [])
+
+    largest_transactions = [
+        transaction.to_dict() for transaction in top_transactions(transactions, top_k, rank_by)
+    ]
+
+    total_transactions = len(transactions)
+    if 'total_amount' in summary:
+        total_amount = summary['total_amount']
+        average_transaction = summary['avg_transaction_amount']
+    else:
+        # Results cached before the summary carried the total
+        total_amount = sum(transaction.amount for transaction in transactions)
+        average_transaction = total_amount / total_transactions if total_transactions > 0 else 0
+
+    return {
+        'filename': filename,
+        'fraud_analysis': {
+            'total_fraudulent': fraud_analysis.get('total_fraudulent', 0),
+            'fraud_percentage': float(fraud_analysis.get('fraud_percentage', 0)),
+            'average_fraud_probability': float(fraud_analysis.get('average_fraud_probability', 0))
+        },
+        'transaction_analysis': {
+            'total_transactions': total_transactions,
+            'total_amount': round(total_amount, 2),
+            'average_transaction': round(average_transaction, 2),
+            'largest_transactions': largest_transactions
+        }
+    }
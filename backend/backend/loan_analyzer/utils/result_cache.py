@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from .conf import get_setting
+from .metrics import RESULT_CACHE_LOOKUPS
+from .transactions import TransactionRecord
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    if isinstance(value, TransactionRecord):
+        return value.to_dict()
+    # Summaries carry numpy scalars from pandas aggregations
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def file_sha256(path):
+    """
+    SHA-256 of a stored file, for callers that did not hash it while writing
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def current_model_version():
+    """
+    Version of the default fraud model, or 'none' when no model is loaded
+    """
+    from .model_registry import get_model
+
+    try:
+        return get_model().version
+    except Exception:
+        return 'none'
+
+
+def is_cacheable(result):
+    """
+    Whether an analysis result may be stored: it has no error and its
+    transactions were scored. A result left unscored by a failed model call
+    is not kept, it is analyzed again on the next upload.
+    """
+    summary = result.get('summary')
+    return not result.get('error') and bool(summary) and 'fraud_analysis' in summary
+
+
+class ResultCache:
+    """
+    Content-addressed on-disk cache of analyze_bank_statement results.
+
+    Entries are keyed by the SHA-256 of the uploaded file and record the
+    model version that produced them; an entry made by another model version
+    is treated as stale and removed. The cache is bounded by total size
+    (least recently used entries are evicted first) and by age.
+    """
+
+    def __init__(self, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    def _path(self, digest):
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, digest, model_version):
+        """
+        Returns the cached result for `digest`, or None on a miss
+        """
+        path = self._path(digest)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('model_version') != model_version or time.time() - entry.get('created_at', 0) > self.ttl:
+            self._remove(path)
+            return None
+
+        # Bump the modification time so eviction sees this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        result = entry['result']
+        result['transactions'] = [TransactionRecord.from_dict(transaction)
+                                  for transaction in result.get('transactions', [])]
+        return result
+
+    def set(self, digest, model_version, result, evict=True):
+        """
+        Store `result` under `digest`; pass evict=False when storing several
+        entries in a row and call evict() once afterwards
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        entry = {
+            'model_version': model_version,
+            'created_at': time.time(),
+            'result': result,
+        }
+
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(entry, file, default=_json_default)
+            os.replace(tmp_path, self._path(digest))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries, then the least recently used ones until the
+        cache fits in max_bytes
+        """
+        with self._lock:
+            evict_directory(self.directory, '.json', self.max_bytes, self.ttl)
+
+    def _remove(self, path):
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict_directory(directory, suffix, max_bytes, ttl, keep=()):
+    """
+    Remove the files ending in `suffix` that are older than ttl seconds,
+    then the least recently used ones until they fit in max_bytes
+    Paths in `keep` are never removed but count towards max_bytes.
+    """
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+
+    now = time.time()
+    entries = []
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if path in keep:
+            entries.append((stat.st_mtime, stat.st_size, None))
+        elif now - stat.st_mtime > ttl:
+            _remove(path)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+        if total <= max_bytes:
+            break
+        if path is not None:
+            _remove(path)
+            total -= size
+
+
+_cache = None
+
+
+def get_result_cache():
+    global _cache
+    if _cache is None:
+        from django.conf import settings
+
+        _cache = ResultCache(
+            get_setting('RESULT_CACHE_DIR', os.path.join(settings.BASE_DIR.parent, 'cache', 'results')),
+            get_setting('RESULT_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+            get_setting('RESULT_CACHE_TTL', 7 * 24 * 3600),
+        )
+    return _cache
+
+
+_page_cache = None
+
+
+def get_page_cache():
+    """
+    Cache of per-page results used by incremental analysis, kept apart from
+    the per-file results so the two are evicted independently
+    """
+    global _page_cache
+    if _page_cache is None:
+        from django.conf import settings
+
+        _page_cache = ResultCache(
+            get_setting('PAGE_CACHE_DIR', os.path.join(settings.BASE_DIR.parent, 'cache', 'pages')),
+            get_setting('PAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+            get_setting('RESULT_CACHE_TTL', 7 * 24 * 3600),
+        )
+    return _page_cache
+
+
+def analyze_bank_statements_cached(files):
+    """
+    Batch analysis with the content-addressed result cache in front
+    `files` is a list of (pdf_path, digest) pairs; digest may be None.
+    Hits are returned without opening the PDF or running the model, and all
+    misses are analyzed together with a single model call.
+    """
+    from .extract import analyze_bank_statements
+
+    model_version = current_model_version()
+    cache = get_result_cache()
+
+    results = [None] * len(files)
+    misses = []
+    for index, (pdf_path, digest) in enumerate(files):
+        if digest is None:
+            digest = file_sha256(pdf_path)
+        result = cache.get(digest, model_version)
+        if result is not None:
+            RESULT_CACHE_LOOKUPS.inc(result='hit')
+            results[index] = result
+        else:
+            RESULT_CACHE_LOOKUPS.inc(result='miss')
+            misses.append((index, pdf_path, digest))
+
+    if misses:
+        analyzed = analyze_bank_statements([pdf_path for _, pdf_path, _ in misses])
+        for (index, _, digest), result in zip(misses, analyzed):
+            results[index] = result
+            if not is_cacheable(result):
+                continue
+            try:
+                cache.set(digest, model_version, result, evict=False)
+            except Exception as e:
+                logger.warning("Could not cache analysis result: %s", e)
+        cache.evict()
+
+    return results
+
+
+def analyze_bank_statement_cached(pdf_path, digest=None):
+    """
+    analyze_bank_statement with the content-addressed result cache in front
+    A hit returns the stored result without opening the PDF or running the model
+    """
+    return analyze_bank_statements_cached([(pdf_path, digest)])[0]
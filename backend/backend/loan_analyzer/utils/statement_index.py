@@ -0,0 +1,92 @@
+import logging
+from datetime import date, timedelta
+
+from django.db import transaction as db_transaction
+
+from ..models import Statement, Transaction
+from .conf import get_setting
+from .result_cache import current_model_version
+
+logger = logging.getLogger(__name__)
+
+
+def index_statement(account_id, filename, digest, result, batch_size=None):
+    """
+    Store an analysis result and its transactions under a borrower account
+    Transactions are written with bulk_create in batches of batch_size rows
+    (STATEMENT_INDEX_BATCH_SIZE) inside one database transaction. A file
+    the account already has (same digest) replaces its earlier analysis,
+    so re-uploads do not count its transactions twice.
+    Returns the Statement.
+    """
+    if batch_size is None:
+        batch_size = get_setting('STATEMENT_INDEX_BATCH_SIZE', 1000)
+
+    # Imported on first use so the views load without NumPy
+    from .dates import statement_dates
+
+    transactions = result.get('transactions', [])
+    # datetime.date objects, None where a date could not be parsed
+    dates = statement_dates(transactions).astype(object).tolist()
+    with db_transaction.atomic():
+        statement, created = Statement.objects.update_or_create(
+            account_id=account_id,
+            content_sha256=digest,
+            defaults={
+                'filename': filename,
+                'model_version': current_model_version(),
+                'transaction_count': len(transactions),
+                'summary': result.get('summary'),
+            },
+        )
+        if not created:
+            statement.transactions.all().delete()
+
+        batch = []
+        for position, (record, record_date) in enumerate(zip(transactions, dates)):
+            batch.append(Transaction(
+                statement=statement,
+                account_id=account_id,
+                position=position,
+                date=record_date,
+                date_text=record.date,
+                description=record.description,
+                transaction_type=record.transaction_type,
+                amount=record.amount,
+                old_balance=record.old_balance,
+                new_balance=record.new_balance,
+                is_fraudulent=record.is_fraudulent,
+                fraud_probability=record.fraud_probability,
+            ))
+            if len(batch) >= batch_size:
+                Transaction.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Transaction.objects.bulk_create(batch)
+
+    logger.debug("Indexed %d transactions of %s under account %s", len(transactions), filename, account_id)
+    return statement
+
+
+def query_transactions(account_id, min_amount=None, min_fraud_probability=None, fraudulent=None,
+                       days=None, date_from=None, date_to=None, limit=100):
+    """
+    Transactions of every indexed statement of an account matching the
+    filters, most recent first
+    `days` keeps the transactions dated in the last `days` days; probabilities
+    are percentages like the analysis results.
+    """
+    queryset = Transaction.objects.filter(account_id=account_id)
+    if min_amount is not None:
+        queryset = queryset.filter(amount__gte=min_amount)
+    if min_fraud_probability is not None:
+        queryset = queryset.filter(fraud_probability__gte=min_fraud_probability)
+    if fraudulent is not None:
+        queryset = queryset.filter(is_fraudulent=fraudulent)
+    if days is not None:
+        date_from = max(date_from or date.min, date.today() - timedelta(days=days))
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    return list(queryset.order_by('-date', 'statement_id', 'position')[:limit])
@@ -0,0 +1,222 @@
+import numpy as np
+
+from .conf import get_setting
+from .dates import date_range
+from .features import FRAUD_THRESHOLD
+from .transactions import RANK_KEYS, TRANSACTION_TYPES, TYPE_CODES
+
+
+def summarize_columns(columns, transactions, dates):
+    """
+    Summary statistics of a statement computed from its feature columns
+    Every aggregate the analysis and the upload report need is computed
+    here in one pass over the columns. `dates` is the statement's
+    datetime64 date column (see dates.statement_dates); the date range
+    falls back to the first and last date strings when none parses.
+    """
+    amount = columns['amount']
+    balance_difference = columns['balance_difference']
+    total_amount = float(amount.sum())
+    return {
+        'total_transactions': len(amount),
+        'total_cash_out': int(columns['type_CASH_OUT'].sum()),
+        'total_cash_in': int(columns['type_CASH_IN'].sum()),
+        'total_transfers': int(columns['type_TRANSFER'].sum()),
+        'total_payments': int(columns['type_PAYMENT'].sum()),
+        'total_debits': int(columns['type_DEBIT'].sum()),
+        'large_transactions': int(columns['is_large_transaction'].sum()),
+        'total_amount': round(total_amount, 2),
+        'avg_transaction_amount': round(total_amount / len(amount), 2),
+        'max_transaction_amount': float(amount.max()),
+        'min_transaction_amount': float(amount.min()),
+        'date_range': date_range(dates) or f"{transactions[0].date} to {transactions[-1].date}",
+        'total_debit_amount': round(float(amount[balance_difference < 0].sum()), 2),
+        'total_credit_amount': round(float(amount[balance_difference > 0].sum()), 2),
+        'balance_mismatches': int(columns['balance_mismatch'].sum())
+    }
+
+
+class StreamingSummary:
+    """
+    Running version of the analyze_transactions summary. Batches are folded
+    in as they are scored, so the summary needs constant memory no matter
+    how long the statement is. Summaries of consecutive parts of a
+    statement can be merged, and their state saved with to_dict().
+    """
+
+    def __init__(self):
+        self.total_transactions = 0
+        self.type_counts = [0] * len(TRANSACTION_TYPES)
+        self.large_transactions = 0
+        self.total_amount = 0.0
+        self.max_amount = None
+        self.min_amount = None
+        self.first_date = None
+        self.last_date = None
+        # Earliest and latest parsed date, as ISO dates
+        self.min_date = None
+        self.max_date = None
+        self.total_debit_amount = 0.0
+        self.total_credit_amount = 0.0
+        self.fraud_count = 0
+        self.fraud_probability_sum = 0.0
+        self.balance_mismatches = 0
+        self.scored = True
+
+    def add(self, transactions, fraud_probabilities=None, dates=None):
+        """
+        Fold in a batch of transactions, with their fraud probabilities
+        once scored and their datetime64 `dates` when parsed
+        """
+        if not transactions:
+            return
+        if dates is not None:
+            self.add_dates(dates)
+        for transaction in transactions:
+            amount = transaction.amount
+            self.total_transactions += 1
+            self.type_counts[transaction.type_code] += 1
+            self.large_transactions += transaction.is_large
+            self.total_amount += amount
+            self.max_amount = amount if self.max_amount is None else max(self.max_amount, amount)
+            self.min_amount = amount if self.min_amount is None else min(self.min_amount, amount)
+            if self.first_date is None:
+                self.first_date = transaction.date
+            self.last_date = transaction.date
+            balance_difference = transaction.balance_difference
+            if balance_difference < 0:
+                self.total_debit_amount += amount
+            elif balance_difference > 0:
+                self.total_credit_amount += amount
+            self.balance_mismatches += transaction.balance_mismatch
+
+        if fraud_probabilities is None:
+            self.scored = False
+        else:
+            self.fraud_count += int((fraud_probabilities > FRAUD_THRESHOLD).sum())
+            self.fraud_probability_sum += float(fraud_probabilities.sum())
+
+    def add_dates(self, dates):
+        parsed = dates[~np.isnat(dates)]
+        if len(parsed):
+            self._extend_dates(str(parsed.min()), str(parsed.max()))
+
+    def _extend_dates(self, min_date, max_date):
+        # ISO dates compare like the dates themselves
+        self.min_date = min_date if self.min_date is None else min(self.min_date, min_date)
+        self.max_date = max_date if self.max_date is None else max(self.max_date, max_date)
+
+    def merge(self, other):
+        """
+        Fold in the summary of the transactions that follow this one's
+        """
+        if other.total_transactions:
+            if not self.total_transactions:
+                self.first_date = other.first_date
+            self.last_date = other.last_date
+            self.max_amount = other.max_amount if self.max_amount is None else max(self.max_amount,
+                                                                                   other.max_amount)
+            self.min_amount = other.min_amount if self.min_amount is None else min(self.min_amount,
+                                                                                   other.min_amount)
+        if other.min_date is not None:
+            self._extend_dates(other.min_date, other.max_date)
+        self.total_transactions += other.total_transactions
+        self.type_counts = [count + other_count for count, other_count in zip(self.type_counts, other.type_counts)]
+        self.large_transactions += other.large_transactions
+        self.total_amount += other.total_amount
+        self.total_debit_amount += other.total_debit_amount
+        self.total_credit_amount += other.total_credit_amount
+        self.fraud_count += other.fraud_count
+        self.fraud_probability_sum += other.fraud_probability_sum
+        self.balance_mismatches += other.balance_mismatches
+        self.scored = self.scored and other.scored
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, state):
+        summary = cls()
+        vars(summary).update(state)
+        return summary
+
+    def result(self):
+        if not self.total_transactions:
+            return {"error": "No transactions found"}
+
+        summary = {
+            'total_transactions': self.total_transactions,
+            'total_cash_out': self.type_counts[TYPE_CODES['CASH_OUT']],
+            'total_cash_in': self.type_counts[TYPE_CODES['CASH_IN']],
+            'total_transfers': self.type_counts[TYPE_CODES['TRANSFER']],
+            'total_payments': self.type_counts[TYPE_CODES['PAYMENT']],
+            'total_debits': self.type_counts[TYPE_CODES['DEBIT']],
+            'large_transactions': self.large_transactions,
+            'total_amount': round(self.total_amount, 2),
+            'avg_transaction_amount': round(self.total_amount / self.total_transactions, 2),
+            'max_transaction_amount': self.max_amount,
+            'min_transaction_amount': self.min_amount,
+            'date_range': (f"{self.min_date} to {self.max_date}" if self.min_date is not None
+                           else f"{self.first_date} to {self.last_date}"),
+            'total_debit_amount': round(self.total_debit_amount, 2),
+            'total_credit_amount': round(self.total_credit_amount, 2),
+            'balance_mismatches': self.balance_mismatches
+        }
+        if self.scored:
+            summary['fraud_analysis'] = {
+                'total_fraudulent': self.fraud_count,
+                'fraud_percentage': round((self.fraud_count / self.total_transactions) * 100, 2),
+                'average_fraud_probability': round(self.fraud_probability_sum / self.total_transactions * 100, 2)
+            }
+        return summary
+
+
+def top_k_indices(values, k):
+    """
+    Indexes of the k largest values, largest first
+    Selects with argpartition in O(n) and only sorts the k winners; ties
+    keep their statement order, like sorted(..., reverse=True)[:k]. NaN
+    values rank last.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = np.where(np.isnan(values), -np.inf, values)
+    count = len(values)
+    if k <= 0 or count == 0:
+        return np.empty(0, dtype=np.intp)
+
+    if k < count:
+        threshold = values[np.argpartition(values, count - k)[count - k]]
+        above = np.flatnonzero(values > threshold)
+        ties = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(count)
+
+    # lexsort sorts by the last key first: descending value, then position
+    return candidates[np.lexsort((candidates, -values[candidates]))]
+
+
+def rank_values(transactions, rank_by):
+    """
+    Column of the ranking attribute of each transaction, NaN where it is
+    not set (fraud_probability of unscored transactions)
+    balance_difference ranks by size, so large debits rank with large credits.
+    """
+    if rank_by not in RANK_KEYS:
+        raise ValueError(f"Cannot rank transactions by '{rank_by}', expected one of {', '.join(RANK_KEYS)}")
+    values = np.array([getattr(transaction, rank_by) for transaction in transactions], dtype=np.float64)
+    if rank_by == 'balance_difference':
+        values = np.abs(values)
+    return values
+
+
+def top_transactions(transactions, k=None, rank_by=None):
+    """
+    The k transactions ranking highest by rank_by, highest first
+    k and rank_by default to the REPORT_TOP_K and REPORT_RANK_BY settings.
+    """
+    if k is None:
+        k = get_setting('REPORT_TOP_K', 5)
+    if rank_by is None:
+        rank_by = get_setting('REPORT_RANK_BY', 'amount')
+    return [transactions[index] for index in top_k_indices(rank_values(transactions, rank_by), k).tolist()]
@@ -0,0 +1,320 @@
+import csv
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from .balances import RunningBalance
+from .conf import get_setting
+from .features import expand_feature_columns
+from .line_classifier import LineClassifier
+from .transactions import TRANSACTION_TYPES, TransactionRecord
+
+logger = logging.getLogger(__name__)
+
+TABULAR_EXTENSIONS = ('.csv', '.xlsx')
+
+# Header names banks use for each statement column, compared lower-cased
+COLUMN_ALIASES = {
+    'date': ['date', 'transaction date', 'trans date', 'posting date', 'posted date', 'value date',
+             'txn date', 'booking date'],
+    'description': ['description', 'details', 'transaction details', 'narrative', 'narration',
+                    'memo', 'particulars', 'reference', 'transaction description', 'payee'],
+    'debit': ['debit', 'debits', 'debit amount', 'withdrawal', 'withdrawals', 'withdrawal amount',
+              'money out', 'paid out', 'dr'],
+    'credit': ['credit', 'credits', 'credit amount', 'deposit', 'deposits', 'deposit amount',
+               'money in', 'paid in', 'cr'],
+    'amount': ['amount', 'transaction amount', 'value'],
+    'balance': ['balance', 'running balance', 'closing balance', 'available balance', 'ledger balance'],
+}
+
+# Rows scanned for the header line, statements often start with account details
+HEADER_SEARCH_ROWS = 20
+
+_AMOUNT_NOISE = r'[£$€\s,]'
+
+_classifier = LineClassifier()
+
+
+def is_tabular(path):
+    return os.path.splitext(path)[1].lower() in TABULAR_EXTENSIONS
+
+
+def map_columns(header):
+    """
+    Match a header row against COLUMN_ALIASES
+    Returns {role: column index}, or None if the row has no date column or
+    no amount (amount, debit or credit) column
+    """
+    mapping = {}
+    for index, name in enumerate(header):
+        if name is None:
+            continue
+        key = str(name).strip().lower()
+        for role, aliases in COLUMN_ALIASES.items():
+            if key in aliases and role not in mapping:
+                mapping[role] = index
+                break
+
+    if 'date' not in mapping or not ({'amount', 'debit', 'credit'} & mapping.keys()):
+        return None
+    return mapping
+
+
+def _find_header(rows):
+    for row_number, row in enumerate(rows):
+        if row_number >= HEADER_SEARCH_ROWS:
+            break
+        mapping = map_columns(row)
+        if mapping is not None:
+            return row_number, mapping
+    raise Exception("Could not find date and amount columns in the statement header")
+
+
+def _cell_text(value):
+    # XLSX date cells are read as datetimes, other cells may be numbers or missing
+    if hasattr(value, 'strftime'):
+        return value.strftime('%Y-%m-%d')
+    if value is None or value != value:
+        return ''
+    return str(value).strip()
+
+
+def _named_chunk(chunk, mapping):
+    """
+    Rename the mapped columns of a positional XLSX chunk to their roles,
+    turning date and description cells into text
+    """
+    named = pd.DataFrame({role: chunk.iloc[:, index] for role, index in mapping.items()})
+    for role in ('date', 'description'):
+        if role in named:
+            named[role] = named[role].map(_cell_text)
+    return named
+
+
+def _iter_csv_chunks(path, chunk_rows):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        header_row, mapping = _find_header(csv.reader(file))
+
+    # Text columns stay strings; amount columns are left to the C parser, which
+    # reads plain and thousands-separated numbers directly as floats
+    text_columns = {mapping[role]: str for role in ('date', 'description') if role in mapping}
+    reader = pd.read_csv(path, encoding='utf-8-sig', header=None, skiprows=header_row + 1,
+                         usecols=sorted(mapping.values()), dtype=text_columns, thousands=',',
+                         chunksize=chunk_rows, skip_blank_lines=True)
+    for chunk in reader:
+        # usecols keeps the original positions as column labels
+        yield pd.DataFrame({role: chunk[index] for role, index in mapping.items()})
+
+
+def _iter_xlsx_chunks(path, chunk_rows):
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of loading the whole workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header_row, mapping = _find_header(rows)
+
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunk_rows:
+                yield _named_chunk(pd.DataFrame(buffer), mapping)
+                buffer = []
+        if buffer:
+            yield _named_chunk(pd.DataFrame(buffer), mapping)
+    finally:
+        workbook.close()
+
+
+def iter_statement_chunks(path, chunk_rows=None):
+    """
+    Read a CSV or XLSX statement in chunks of at most chunk_rows rows
+    Yields DataFrames with the mapped columns renamed to their role
+    (date, description, debit, credit, amount, balance)
+    """
+    if chunk_rows is None:
+        chunk_rows = get_setting('TABULAR_CHUNK_ROWS', 50000)
+
+    if os.path.splitext(path)[1].lower() == '.xlsx':
+        yield from _iter_xlsx_chunks(path, chunk_rows)
+    else:
+        yield from _iter_csv_chunks(path, chunk_rows)
+
+
+def _text(values):
+    return values.fillna('').astype(str).str.strip()
+
+
+def parse_amounts(values):
+    """
+    Vectorized clean_amount for a column of amounts
+    Strips currency symbols, thousands separators, whitespace and CR/DR
+    suffixes, and turns (123.45), -123.45, 123.45- and 123.45 DR into
+    negatives. Unparseable cells are NaN.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.float64)
+
+    text = values.astype(str).str.replace(_AMOUNT_NOISE, '', regex=True).str.upper()
+    is_dr = text.str.endswith('DR')
+    text = text.str.removesuffix('DR').str.removesuffix('CR')
+    negative = text.str.startswith(('(', '-')) | text.str.endswith('-') | is_dr
+    text = text.str.strip('()-')
+    numbers = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64)
+    return np.where(negative.to_numpy(), -numbers, numbers)
+
+
+def _transaction_types(descriptions, is_debit):
+    """
+    Keyword transaction type per row, falling back to DEBIT for debits and
+    CASH_IN for credits like the PDF line classifier
+    Each distinct description is classified once; statements repeat the
+    same merchants and transfer references many times.
+    """
+    codes, uniques = pd.factorize(descriptions)
+    unique_types = np.array([_classifier.keyword_type(description.upper()) or '' for description in uniques]
+                            + [''], dtype=object)
+    # factorize codes missing values as -1, which picks the trailing ''
+    types = unique_types[codes]
+    return np.where(types == '', np.where(is_debit, 'DEBIT', 'CASH_IN'), types)
+
+
+class TabularStatementReader:
+    """
+    Maps statement chunks straight into the model's feature columns.
+
+    Amounts come from separate debit/credit columns or from one signed amount
+    column. Balances are reconstructed by a RunningBalance carried across
+    chunks (`balance`, a new one for a whole statement): a printed balance
+    is used as the row's newbalanceOrig and checked against the previous
+    balance, rows without one continue from the last known balance. Rows
+    with a balance but no amount (opening, closing or brought forward
+    balances) print the balance after the transaction above them, also
+    when it is in the previous chunk; when that chunk was read by another
+    reader, balance.correction is left for the caller.
+    Only the values a TransactionRecord stores are kept per chunk; the
+    one-hot and derived feature columns are expanded once by
+    feature_columns(). Every transaction is returned with the analysis, so
+    memory still grows with the length of the statement: chunking bounds
+    the rows parsed at a time, not what is kept.
+    """
+
+    def __init__(self, balance=None):
+        self.columns = {'amount': [], 'oldbalanceOrg': [], 'newbalanceOrig': []}
+        self.type_codes = []
+        self.mismatches = []
+        self.dates = []
+        self.descriptions = []
+        self.balance = balance if balance is not None else RunningBalance()
+
+    def add_chunk(self, chunk):
+        count = len(chunk)
+        debit = np.abs(parse_amounts(chunk['debit'])) if 'debit' in chunk else np.full(count, np.nan)
+        credit = np.abs(parse_amounts(chunk['credit'])) if 'credit' in chunk else np.full(count, np.nan)
+        if 'amount' in chunk:
+            signed = parse_amounts(chunk['amount'])
+            debit = np.where(np.isnan(debit) & (signed < 0), -signed, debit)
+            credit = np.where(np.isnan(credit) & (signed >= 0), signed, credit)
+        # Treat empty or zero debit cells as "no debit" so the credit is used
+        debit = np.where(debit == 0, np.nan, debit)
+
+        dates = _text(chunk['date'])
+        has_amount = ~(np.isnan(debit) & np.isnan(credit))
+        keep = (dates != '').to_numpy() & has_amount
+
+        printed = None
+        if 'balance' in chunk:
+            balance = parse_amounts(chunk['balance'])
+            printed = balance[keep]
+            balance_rows = np.flatnonzero(~has_amount & ~np.isnan(balance))
+            # Index of the transaction each balance row follows, -1 above the first one
+            follows = np.cumsum(keep)[balance_rows] - 1
+            if (follows < 0).any():
+                self.balance.reconcile_previous(float(balance[balance_rows[follows < 0][-1]]))
+                if self.balance.correction is not None and self.mismatches:
+                    # The last transaction of the previous chunk
+                    old_balance, new_balance, mismatch = self.balance.correction
+                    self.columns['oldbalanceOrg'][-1][-1] = old_balance
+                    self.columns['newbalanceOrig'][-1][-1] = new_balance
+                    self.mismatches[-1][-1] = mismatch
+                    self.balance.correction = None
+            printed[follows[follows >= 0]] = balance[balance_rows[follows >= 0]]
+
+        if not keep.any():
+            return
+
+        debit, credit, dates = debit[keep], credit[keep], dates[keep]
+        if 'description' in chunk:
+            descriptions = _text(chunk['description'][keep])
+        else:
+            descriptions = pd.Series([''] * len(dates), index=dates.index)
+
+        is_debit = ~np.isnan(debit)
+        amount = np.where(is_debit, debit, credit)
+        signed_amount = np.where(is_debit, -amount, amount)
+
+        old_balance, new_balance, mismatch = self.balance.reconstruct(signed_amount, printed)
+        self.mismatches.append(mismatch)
+
+        types = _transaction_types(descriptions, is_debit)
+        type_codes = np.zeros(len(amount), dtype=np.int8)
+        for code, type_name in enumerate(TRANSACTION_TYPES):
+            type_codes[types == type_name] = code
+        self.type_codes.append(type_codes)
+
+        for column, values in (('amount', amount), ('oldbalanceOrg', old_balance), ('newbalanceOrig', new_balance)):
+            self.columns[column].append(values)
+        self.dates.extend(dates.tolist())
+        self.descriptions.extend(descriptions.tolist())
+
+    def type_code_column(self):
+        return np.concatenate(self.type_codes)
+
+    def mismatch_column(self):
+        return np.concatenate(self.mismatches)
+
+    def feature_columns(self):
+        """
+        Returns the statement as one float64 array per model feature, the
+        layout build_feature_columns produces for PDF transactions
+        """
+        return expand_feature_columns(*(np.concatenate(self.columns[column])
+                                        for column in ('amount', 'oldbalanceOrg', 'newbalanceOrig')),
+                                      self.type_code_column(), self.mismatch_column())
+
+
+def records_from_columns(columns, type_codes, dates, descriptions):
+    """
+    Build the TransactionRecords returned with the analysis from the
+    statement's feature columns
+    """
+    return [
+        TransactionRecord(amount, old_balance, new_balance, type_code, date, description,
+                          balance_mismatch=mismatch)
+        for amount, old_balance, new_balance, type_code, date, description, mismatch in zip(
+            columns['amount'].tolist(), columns['oldbalanceOrg'].tolist(), columns['newbalanceOrig'].tolist(),
+            type_codes.tolist(), dates, descriptions, columns['balance_mismatch'].tolist(),
+        )
+    ]
+
+
+def extract_tabular_transactions(path, chunk_rows=None):
+    """
+    Extract a CSV or XLSX statement without any text or regex parsing pass
+    Returns (transactions, feature columns); columns is None when the
+    statement has no transactions
+    """
+    reader = TabularStatementReader()
+    for chunk in iter_statement_chunks(path, chunk_rows):
+        reader.add_chunk(chunk)
+
+    if not reader.dates:
+        return [], None
+
+    columns = reader.feature_columns()
+    logger.debug("Read %d transactions from %s", len(reader.dates), path)
+    records = records_from_columns(columns, reader.type_code_column(), reader.dates, reader.descriptions)
+    return records, columns
@@ -0,0 +1,98 @@
+# Transaction types in the order of the model's type_* one-hot features
+TRANSACTION_TYPES = ('CASH_IN', 'CASH_OUT', 'DEBIT', 'PAYMENT', 'TRANSFER')
+TYPE_CODES = {type_name: code for code, type_name in enumerate(TRANSACTION_TYPES)}
+
+LARGE_TRANSACTION_AMOUNT = 5000
+
+# Transaction attributes the largest transactions of a report can be ranked by
+RANK_KEYS = ('amount', 'fraud_probability', 'balance_difference')
+
+
+class TransactionRecord:
+    """
+    One parsed statement transaction.
+
+    Only the parsed values are stored: the transaction type is a single code
+    into TRANSACTION_TYPES and the derived model inputs (type_* one-hot
+    flags, is_large_transaction, balance_difference) are computed when
+    needed, vectorized at the model boundary by build_feature_columns.
+    `balance_mismatch` is set when the balance the statement printed after
+    the transaction disagrees with the reconstructed one (see balances.py).
+    `to_dict()` gives the dictionary the API has always returned.
+    """
+
+    __slots__ = ('amount', 'old_balance', 'new_balance', 'type_code', 'date', 'description',
+                 'is_fraudulent', 'fraud_probability', 'balance_mismatch')
+
+    def __init__(self, amount, old_balance, new_balance, type_code, date, description,
+                 is_fraudulent=None, fraud_probability=None, balance_mismatch=False):
+        self.amount = amount
+        self.old_balance = old_balance
+        self.new_balance = new_balance
+        self.type_code = type_code
+        self.date = date
+        self.description = description
+        # Set once the transaction has been scored
+        self.is_fraudulent = is_fraudulent
+        self.fraud_probability = fraud_probability
+        self.balance_mismatch = balance_mismatch
+
+    def __eq__(self, other):
+        if not isinstance(other, TransactionRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"TransactionRecord({self.date!r}, {self.transaction_type}, {self.amount!r}, "
+                f"{self.description!r})")
+
+    @property
+    def transaction_type(self):
+        return TRANSACTION_TYPES[self.type_code]
+
+    @property
+    def balance_difference(self):
+        return self.new_balance - self.old_balance
+
+    @property
+    def is_large(self):
+        return self.amount >= LARGE_TRANSACTION_AMOUNT
+
+    def to_dict(self):
+        """
+        JSON-ready dictionary with the keys and value types of the original
+        transaction dictionaries
+        """
+        type_code = self.type_code
+        data = {
+            'amount': self.amount,
+            'oldbalanceOrg': self.old_balance,
+            'newbalanceOrig': self.new_balance,
+            'oldbalanceDest': 0,
+            'newbalanceDest': 0,
+            'type_CASH_IN': 1 if type_code == 0 else 0,
+            'type_CASH_OUT': 1 if type_code == 1 else 0,
+            'type_DEBIT': 1 if type_code == 2 else 0,
+            'type_PAYMENT': 1 if type_code == 3 else 0,
+            'type_TRANSFER': 1 if type_code == 4 else 0,
+            'is_large_transaction': self.amount >= LARGE_TRANSACTION_AMOUNT,
+            'balance_difference': self.new_balance - self.old_balance,
+            'balance_mismatch': self.balance_mismatch,
+            'transaction_date': self.date,
+            'description': self.description
+        }
+        if self.is_fraudulent is not None:
+            data['is_fraudulent'] = self.is_fraudulent
+            data['fraud_probability'] = self.fraud_probability
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a record from its to_dict() form, e.g. a cached result
+        """
+        type_code = next((code for code, type_name in enumerate(TRANSACTION_TYPES)
+                          if data.get(f'type_{type_name}')), TYPE_CODES['DEBIT'])
+        return cls(data['amount'], data['oldbalanceOrg'], data['newbalanceOrig'], type_code,
+                   data['transaction_date'], data['description'],
+                   data.get('is_fraudulent'), data.get('fraud_probability'), data.get('balance_mismatch', False))
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+class CompiledForest:
+    """
+    A fitted tree-ensemble classifier flattened into NumPy node arrays.
+
+    All trees are stored in one set of arrays (children, split feature,
+    threshold, leaf class probabilities) and every row is routed through
+    every tree at once, one tree level per step. Leaves point back to
+    themselves, so rows that reach a leaf early simply stay there.
+
+    Probabilities are accumulated tree by tree in estimator order and divided
+    by the number of trees, like RandomForestClassifier.predict_proba with
+    n_jobs=1, so results are bit-for-bit identical to such a model for
+    float32 input without its per-estimator Python and joblib overhead. With
+    n_jobs > 1 sklearn adds the trees up in the order its threads finish, so
+    the two only agree up to floating point rounding.
+    """
+
+    # Node arrays of a forest, in the order they are stored in a model bundle
+    ARRAYS = ('roots', 'children', 'feature', 'threshold', 'leaf_proba')
+
+    def __init__(self, roots, children, feature, threshold, leaf_proba, max_depth, n_features, classes):
+        self.roots = roots
+        # children[2 * node] is the left child, children[2 * node + 1] the right one;
+        # the arrays may be read-only memory maps of a model bundle
+        self.children = children
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_proba = leaf_proba
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.classes_ = classes
+
+    @classmethod
+    def from_estimator(cls, model):
+        """
+        Flatten a fitted single-output forest of decision trees
+        (RandomForestClassifier, ExtraTreesClassifier)
+        """
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Only fitted single-output tree ensembles can be compiled")
+
+        n_classes = int(model.n_classes_)
+        roots, lefts, rights, features, thresholds, probas = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            is_leaf = left == -1
+            own_index = np.arange(tree.node_count, dtype=np.int64) + offset
+
+            roots.append(offset)
+            lefts.append(np.where(is_leaf, own_index, left + offset))
+            rights.append(np.where(is_leaf, own_index, right + offset))
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            # tree_.value holds per-node class fractions, which is what
+            # DecisionTreeClassifier.predict_proba returns for a leaf
+            probas.append(tree.value[:, 0, :n_classes].astype(np.float64))
+
+            max_depth = max(max_depth, int(tree.max_depth))
+            offset += tree.node_count
+
+        return cls(
+            roots=np.array(roots, dtype=np.int64),
+            children=np.stack([np.concatenate(lefts), np.concatenate(rights)], axis=1).ravel(),
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            leaf_proba=np.concatenate(probas),
+            max_depth=max_depth,
+            n_features=int(model.n_features_in_),
+            classes=model.classes_,
+        )
+
+    @property
+    def left(self):
+        return self.children[0::2]
+
+    @property
+    def right(self):
+        return self.children[1::2]
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """
+        Returns the flat index of the leaf each row reaches in each tree,
+        shape (n_samples, n_estimators)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got array of shape {X.shape}")
+
+        # Work on flat arrays: one entry per (row, tree) pair
+        n_samples = X.shape[0]
+        values = X.ravel()
+        row_offsets = np.repeat(np.arange(n_samples, dtype=np.int64) * self.n_features, self.n_estimators)
+        nodes = np.tile(self.roots, n_samples)
+        for _ in range(self.max_depth):
+            # sklearn sends a row left when value <= threshold
+            go_right = values[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+        return nodes.reshape(n_samples, self.n_estimators)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.leaf_proba.shape[1]), dtype=np.float64)
+        # Same summation order as RandomForestClassifier with n_jobs=1 so results match exactly
+        for tree_index in range(leaves.shape[1]):
+            proba += self.leaf_proba[leaves[:, tree_index]]
+        proba /= leaves.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+from .conf import get_setting
+from .result_cache import evict_directory
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_EXTENSIONS = ['.pdf', '.csv', '.xlsx']
+
+
+class _ContentHashMixin:
+    """
+    Hash uploaded files while Django receives them, so storing them does not
+    read the content again. The digest is set as `sha256` on the uploaded file.
+    """
+
+    def new_file(self, *args, **kwargs):
+        # MemoryFileUploadHandler.new_file stops the handler chain, set up first
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # Only the handler that keeps the file hashes it
+        if getattr(self, 'activated', True):
+            self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.content_hash.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(_ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(_ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+class StoredUpload:
+    """
+    An upload saved in the upload directory under a hashed name
+    """
+
+    def __init__(self, filename, path, digest, size):
+        self.filename = filename
+        self.path = path
+        self.digest = digest
+        self.size = size
+
+
+class UploadStore:
+    """
+    Upload directory with retention.
+
+    Files above FILE_UPLOAD_MAX_MEMORY_SIZE are already spooled to a
+    temporary file by Django and are moved into place instead of copied;
+    smaller ones are written from memory. Files older than max_age seconds
+    are evicted, then the least recently written ones until the directory
+    fits in max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def save(self, file):
+        """
+        Store an uploaded file
+        Returns a StoredUpload; the sha256 comes from the hashing upload
+        handlers, or is computed while the file is written.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        file_ext = os.path.splitext(file.name)[1].lower()
+
+        # Generate hashed filename
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        original_name = os.path.splitext(file.name)[0]
+        hash_input = f"{original_name}{timestamp}".encode('utf-8')
+        hashed_name = hashlib.sha256(hash_input).hexdigest()[:16]
+        unique_filename = f"{hashed_name}{file_ext}"
+        file_path = os.path.join(self.directory, unique_filename)
+
+        digest = getattr(file, 'sha256', None)
+        if digest is not None and hasattr(file, 'temporary_file_path'):
+            file_move_safe(file.temporary_file_path(), file_path)
+        else:
+            content_hash = hashlib.sha256()
+            with open(file_path, 'wb') as destination:
+                for chunk in file.chunks():
+                    if digest is None:
+                        content_hash.update(chunk)
+                    destination.write(chunk)
+            digest = digest or content_hash.hexdigest()
+
+        return StoredUpload(unique_filename, file_path, digest, file.size)
+
+    def evict(self):
+        """
+        Apply the retention policy. Files of queued or running analysis jobs
+        are kept until their job has finished.
+        """
+        from ..models import AnalysisJob
+
+        with self._lock:
+            pending = set(AnalysisJob.objects.filter(
+                status__in=[AnalysisJob.QUEUED, AnalysisJob.RUNNING]
+            ).values_list('file_path', flat=True))
+            evict_directory(self.directory, tuple(ALLOWED_EXTENSIONS), self.max_bytes, self.max_age, keep=pending)
+
+
+_store = None
+
+
+def get_upload_store():
+    global _store
+    if _store is None:
+        _store = UploadStore(
+            str(get_setting('UPLOAD_DIR', os.path.join(settings.BASE_DIR.parent, 'data'))),
+            get_setting('UPLOAD_MAX_BYTES', 2 * 1024 * 1024 * 1024),
+            get_setting('UPLOAD_RETENTION_SECONDS', 24 * 3600),
+        )
+    return _store
+
+
+def runs_in_background(file):
+    """
+    Whether an upload is large enough (UPLOAD_ASYNC_MIN_BYTES) to be queued
+    as an analysis job instead of being analyzed within the request
+    """
+    return file.size >= get_setting('UPLOAD_ASYNC_MIN_BYTES', 20 * 1024 * 1024)
@@ -0,0 +1,113 @@
+import numpy as np
+
+# Rolling windows of the velocity features, in days and in transactions
+VELOCITY_DAY_WINDOWS = (1, 7, 30)
+VELOCITY_TRANSACTION_WINDOWS = (5, 20)
+
+
+def _window_specs():
+    # name -> (window kind, feature column summed over the window or None to
+    # count transactions, window length)
+    specs = {}
+    for days in VELOCITY_DAY_WINDOWS:
+        specs[f'txn_count_{days}d'] = ('days', None, days)
+        specs[f'amount_sum_{days}d'] = ('days', 'amount', days)
+        specs[f'cash_out_count_{days}d'] = ('days', 'type_CASH_OUT', days)
+    for size in VELOCITY_TRANSACTION_WINDOWS:
+        specs[f'amount_sum_last_{size}'] = ('transactions', 'amount', size)
+        specs[f'cash_out_count_last_{size}'] = ('transactions', 'type_CASH_OUT', size)
+    specs['days_since_large_transaction'] = ('since', 'is_large_transaction', None)
+    return specs
+
+
+_WINDOWS = _window_specs()
+
+# Features a model can list in its column_names to be given per-statement
+# rolling aggregates; every window ends at (and includes) the transaction
+VELOCITY_COLUMNS = list(_WINDOWS)
+
+
+def _day_numbers(dates):
+    """
+    Days since the epoch of each date; dates that did not parse take the
+    date of the transaction before them (or the first parsed one)
+    """
+    parsed = ~np.isnat(dates)
+    if not parsed.any():
+        return np.zeros(len(dates), dtype=np.int64)
+    source = np.maximum.accumulate(np.where(parsed, np.arange(len(dates)), -1))
+    source[source < 0] = np.argmax(parsed)
+    return dates.astype(np.int64)[source]
+
+
+def velocity_features(columns, dates, names=None):
+    """
+    Rolling per-statement aggregates over the date-sorted transactions
+    `columns` are the statement's feature columns and `dates` its datetime64
+    date column. Transactions are ordered by date (ties keep statement
+    order) and every window is answered from prefix sums: the start of a
+    day window is found with one vectorized searchsorted, so the whole
+    statement takes a few passes over its columns instead of a scan per
+    transaction. days_since_large_transaction is -1 before the first large
+    transaction.
+    Returns {name: float64 column in statement order} for `names` (all of
+    VELOCITY_COLUMNS by default).
+    """
+    names = VELOCITY_COLUMNS if names is None else names
+    count = len(dates)
+    days = _day_numbers(dates)
+    order = np.argsort(days, kind='stable')
+    days = days[order]
+    position = np.arange(count)
+
+    starts = {}
+    prefixes = {}
+    features = {}
+    for name in names:
+        kind, source, window = _WINDOWS[name]
+
+        if kind == 'since':
+            values = np.asarray(columns[source])[order]
+            last = np.maximum.accumulate(np.where(values > 0, position, -1))
+            previous = np.concatenate(([-1], last[:-1]))
+            sorted_feature = np.where(previous >= 0, days - days[np.maximum(previous, 0)], -1).astype(np.float64)
+        else:
+            if (kind, window) not in starts:
+                if kind == 'days':
+                    starts[kind, window] = np.searchsorted(days, days - (window - 1), side='left')
+                else:
+                    starts[kind, window] = np.maximum(position - (window - 1), 0)
+            if source not in prefixes:
+                values = np.ones(count) if source is None else np.asarray(columns[source], dtype=np.float64)[order]
+                prefixes[source] = np.concatenate(([0.0], np.cumsum(values)))
+            prefix = prefixes[source]
+            sorted_feature = prefix[position + 1] - prefix[starts[kind, window]]
+
+        feature = np.empty(count)
+        feature[order] = sorted_feature
+        features[name] = feature
+    return features
+
+
+def uses_velocity_features(column_names):
+    """
+    Whether a model's column_names include any of VELOCITY_COLUMNS
+    """
+    return any(name in _WINDOWS for name in column_names)
+
+
+def model_velocity_features(column_names, columns, dates, rows=None):
+    """
+    The velocity features among a model's column_names, computed over the
+    statement described by `columns` and `dates` and restricted to `rows`
+    (a slice or index array) when given
+    Returns {} without any work when the model uses none of them, so models
+    trained on the per-transaction features score exactly as before.
+    """
+    names = [name for name in column_names if name in _WINDOWS]
+    if not names:
+        return {}
+    features = velocity_features(columns, dates, names)
+    if rows is not None:
+        features = {name: values[rows] for name, values in features.items()}
+    return features
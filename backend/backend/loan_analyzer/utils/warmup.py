@@ -0,0 +1,33 @@
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Modules of the analysis path; importing them loads NumPy, pandas and pdfplumber
+PREWARM_MODULES = ('loan_analyzer.utils.extract', 'loan_analyzer.utils.incremental')
+
+
+def prewarm():
+    """
+    Load what the first analysis request would otherwise load: the analysis
+    modules with their heavy dependencies, and the configured fraud models,
+    unpickled and warmed up
+    Runs at startup when ANALYSIS_PREWARM is set and in the offload pool's
+    workers; servers can also call it from a boot hook such as gunicorn's
+    post_fork. Loading twice is harmless, loaded models are kept.
+    Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    for module in PREWARM_MODULES:
+        importlib.import_module(module)
+
+    from .model_registry import get_model
+    try:
+        get_model()
+    except LookupError as e:
+        logger.warning("Fraud model not pre-warmed: %s", e)
+
+    seconds = time.perf_counter() - started
+    logger.info("Analysis pre-warmed in %.0f ms", seconds * 1000)
+    return seconds
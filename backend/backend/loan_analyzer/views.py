@@ -1,10 +1,52 @@
-from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.urls import reverse
+from asgiref.sync import sync_to_async
+import asyncio
+import json
 import os
-from datetime import datetime
-import hashlib
-from .utils.extract import analyze_bank_statement
+from datetime import date
+from .models import AnalysisJob, Statement
+from .utils.jobs import enqueue_analysis
+from .utils.metrics import registry as metrics_registry, timed
+from .utils.offload import PoolSaturated, analyze_bank_statement_offloaded, get_analysis_pool
+from .utils.report import build_file_report
+from .utils.result_cache import analyze_bank_statements_cached
+from .utils.statement_index import index_statement, query_transactions
+from .utils.transactions import RANK_KEYS
+from .utils.uploads import ALLOWED_EXTENSIONS, get_upload_store, runs_in_background
+
+
+def _invalid_file_type(file):
+    return JsonResponse({
+        'message': f'Invalid file type for {file.name}. Only PDF, CSV, and XLSX files are allowed.'
+    }, status=400)
+
+
+def _report_options(request):
+    """
+    Read the optional `top_k` and `rank_by` form fields, which choose how many
+    and which largest transactions each report lists
+    Returns (top_k, rank_by), None for fields that were not sent
+    """
+    top_k = request.POST.get('top_k') or None
+    rank_by = request.POST.get('rank_by') or None
+    if top_k is not None:
+        top_k = int(top_k)
+        if top_k < 0:
+            raise ValueError("top_k must not be negative")
+    if rank_by is not None and rank_by not in RANK_KEYS:
+        raise ValueError(f"rank_by must be one of {', '.join(RANK_KEYS)}")
+    return top_k, rank_by
+
+
+def _invalid_report_options(error):
+    return JsonResponse({
+        'message': f'Invalid report options: {str(error)}'
+    }, status=400)
+
 
 @csrf_exempt
 def upload_files(request):
@@ -13,74 +55,66 @@ def upload_files(request):
             files = request.FILES.getlist('files')
             uploaded_files = []
             analysis_results = []
+            jobs = []
+            pending_statements = []
+            run_async = request.POST.get('async', '').lower() in ('1', 'true', 'yes')
+            account_id = request.POST.get('account_id', '').strip()
+            try:
+                top_k, rank_by = _report_options(request)
+            except ValueError as e:
+                return _invalid_report_options(e)
 
-            upload_dir = os.path.join(settings.BASE_DIR.parent, 'data')
-            os.makedirs(upload_dir, exist_ok=True)
+            store = get_upload_store()
 
             for file in files:
-                allowed_extensions = ['.pdf', '.csv', '.xlsx']
                 file_ext = os.path.splitext(file.name)[1].lower()
                 
-                if file_ext not in allowed_extensions:
-                    return JsonResponse({
-                        'message': f'Invalid file type for {file.name}. Only PDF, CSV, and XLSX files are allowed.'
-                    }, status=400)
-
-                # Generate hashed filename
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                original_name = os.path.splitext(file.name)[0]
-                hash_input = f"{original_name}{timestamp}".encode('utf-8')
-                hashed_name = hashlib.sha256(hash_input).hexdigest()[:16]
-                unique_filename = f"{hashed_name}{file_ext}"
-                file_path = os.path.join(upload_dir, unique_filename)
-
-                with open(file_path, 'wb+') as destination:
-                    for chunk in file.chunks():
-                        destination.write(chunk)
-                
-                uploaded_files.append(unique_filename)
-
-                if file_ext.lower() == '.pdf':
-                    try:
-                        result = analyze_bank_statement(file_path)
-                        fraud_analysis = result.get('summary', {}).get('fraud_analysis', {})
-                        transactions = result.get('transactions', [])
-                        
-                        largest_transactions = sorted(
-                            transactions, 
-                            key=lambda x: abs(float(x.get('amount', 0))), 
-                            reverse=True
-                        )[:5]
-
-                        total_transactions = len(transactions)
-                        total_amount = sum(abs(float(t.get('amount', 0))) for t in transactions)
-                        average_transaction = total_amount / total_transactions if total_transactions > 0 else 0
-
-                        analysis_results.append({
-                            'filename': unique_filename,
-                            'fraud_analysis': {
-                                'total_fraudulent': fraud_analysis.get('total_fraudulent', 0),
-                                'fraud_percentage': float(fraud_analysis.get('fraud_percentage', 0)),
-                                'average_fraud_probability': float(fraud_analysis.get('average_fraud_probability', 0))
-                            },
-                            'transaction_analysis': {
-                                'total_transactions': total_transactions,
-                                'total_amount': round(total_amount, 2),
-                                'average_transaction': round(average_transaction, 2),
-                                'largest_transactions': largest_transactions
-                            }
-                        })
-                    except Exception as analysis_error:
-                        analysis_results.append({
-                            'filename': unique_filename,
-                            'error': str(analysis_error)
-                        })
+                if file_ext not in ALLOWED_EXTENSIONS:
+                    return _invalid_file_type(file)
 
-            return JsonResponse({
+                upload = store.save(file)
+                uploaded_files.append(upload.filename)
+
+                # PDFs are parsed as text, CSV and XLSX exports are read column-wise.
+                # Large statements are always analyzed in the background.
+                if run_async or runs_in_background(file):
+                    job = enqueue_analysis(upload.filename, upload.path, account_id, upload.digest)
+                    jobs.append({
+                        'filename': upload.filename,
+                        'job_id': str(job.id),
+                        'status': job.status,
+                        'status_url': reverse('job_status', args=[job.id])
+                    })
+                    continue
+
+                pending_statements.append(upload)
+
+            # Analyze all statements of the request together so the model runs once
+            if pending_statements:
+                results = analyze_bank_statements_cached(
+                    [(upload.path, upload.digest) for upload in pending_statements]
+                )
+                analysis_results = _build_reports(pending_statements, results, top_k, rank_by, account_id)
+
+            store.evict()
+
+            if run_async:
+                return JsonResponse({
+                    'message': 'Files uploaded successfully, analysis queued',
+                    'files': uploaded_files,
+                    'jobs': jobs
+                }, status=202)
+
+            response = {
                 'message': 'Files uploaded successfully',
                 'files': uploaded_files,
                 'analysis_results': analysis_results
-            })
+            }
+            if jobs:
+                response['message'] = f'Files uploaded successfully, {len(jobs)} large file(s) queued for analysis'
+                response['jobs'] = jobs
+            with timed('json_serialize'):
+                return JsonResponse(response)
 
         except Exception as e:
             return JsonResponse({
@@ -89,4 +123,220 @@ def upload_files(request):
 
     return JsonResponse({
         'message': 'Method not allowed'
-    }, status=405)
\ No newline at end of file
+    }, status=405)
+
+def _build_reports(uploads, results, top_k=None, rank_by=None, account_id=''):
+    """
+    Per-file reports of the analyzed statements, each indexed under
+    account_id when one was given
+    """
+    analysis_results = []
+    for upload, result in zip(uploads, results):
+        try:
+            report = build_file_report(upload.filename, result, top_k, rank_by)
+            if account_id:
+                report['statement_id'] = str(index_statement(account_id, upload.filename, upload.digest, result).id)
+            analysis_results.append(report)
+        except Exception as analysis_error:
+            analysis_results.append({
+                'filename': upload.filename,
+                'error': str(analysis_error)
+            })
+    return analysis_results
+
+
+@csrf_exempt
+def upload_stream(request):
+    """
+    Analyze one PDF statement and stream the result as newline-delimited
+    JSON while its pages are still being read: one {"transactions": [...]}
+    line per scored batch of ANALYSIS_STREAM_BATCH_SIZE transactions, then
+    a final {"summary": {...}} line, or {"error": ...} if the statement
+    could not be analyzed
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'message': 'Method not allowed'
+        }, status=405)
+
+    files = request.FILES.getlist('files')
+    if len(files) != 1:
+        return JsonResponse({
+            'message': 'Send exactly one PDF statement to stream its analysis'
+        }, status=400)
+    file = files[0]
+    if os.path.splitext(file.name)[1].lower() != '.pdf':
+        return JsonResponse({
+            'message': f'Invalid file type for {file.name}. Only PDF statements can be streamed.'
+        }, status=400)
+
+    from .utils.extract import analyze_bank_statement_stream
+
+    store = get_upload_store()
+    upload = store.save(file)
+
+    def lines():
+        try:
+            yield json.dumps({'filename': upload.filename}) + '\n'
+            for item in analyze_bank_statement_stream(upload.path):
+                if 'transactions' in item:
+                    item = {'transactions': [transaction.to_dict() for transaction in item['transactions']]}
+                yield json.dumps(item, cls=DjangoJSONEncoder) + '\n'
+        finally:
+            store.evict()
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+@csrf_exempt
+async def upload_files_async(request):
+    """
+    Async variant of upload_files for ASGI servers
+    Uploads are written to disk on worker threads and every statement of the
+    request is analyzed concurrently on the bounded process pool, so the
+    event loop stays free for other requests. When the pool is full the
+    request is rejected with 503 and a Retry-After header.
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'message': 'Method not allowed'
+        }, status=405)
+
+    pool = get_analysis_pool()
+    reserved = 0
+    try:
+        # Accessing request.FILES parses the multipart body and spools the
+        # files to disk, so it has to happen on the worker thread too
+        files = await asyncio.to_thread(lambda: request.FILES.getlist('files'))
+
+        for file in files:
+            if os.path.splitext(file.name)[1].lower() not in ALLOWED_EXTENSIONS:
+                return _invalid_file_type(file)
+        try:
+            top_k, rank_by = _report_options(request)
+        except ValueError as e:
+            return _invalid_report_options(e)
+        account_id = request.POST.get('account_id', '').strip()
+
+        try:
+            pool.reserve(len(files))
+            reserved = len(files)
+        except PoolSaturated as e:
+            response = JsonResponse({
+                'message': f'Server is busy analyzing other statements ({str(e)}), please retry later'
+            }, status=503)
+            response['Retry-After'] = str(getattr(settings, 'ANALYSIS_RETRY_AFTER', 5))
+            return response
+
+        store = get_upload_store()
+        stored = await asyncio.to_thread(lambda: [store.save(file) for file in files])
+        uploaded_files = [upload.filename for upload in stored]
+
+        results = await asyncio.gather(*(
+            analyze_bank_statement_offloaded(upload.path, upload.digest) for upload in stored
+        ))
+        # Indexing writes to the database, which Django only allows from sync code
+        analysis_results = await sync_to_async(_build_reports)(stored, results, top_k, rank_by, account_id)
+        await sync_to_async(store.evict)()
+
+        with timed('json_serialize'):
+            return JsonResponse({
+                'message': 'Files uploaded successfully',
+                'files': uploaded_files,
+                'analysis_results': analysis_results
+            })
+
+    except Exception as e:
+        return JsonResponse({
+            'message': f'Error uploading files: {str(e)}'
+        }, status=500)
+    finally:
+        pool.release(reserved)
+
+
+def job_status(request, job_id):
+    if request.method != 'GET':
+        return JsonResponse({
+            'message': 'Method not allowed'
+        }, status=405)
+
+    try:
+        job = AnalysisJob.objects.get(id=job_id)
+    except AnalysisJob.DoesNotExist:
+        return JsonResponse({
+            'message': f'Job {job_id} not found'
+        }, status=404)
+
+    return JsonResponse(job.to_dict())
+
+def metrics(request):
+    if request.method != 'GET':
+        return JsonResponse({
+            'message': 'Method not allowed'
+        }, status=405)
+
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def _query_options(params):
+    """
+    Parse the filters of the account transaction query
+    Raises ValueError for malformed values
+    """
+    options = {}
+    for name in ('min_amount', 'min_fraud_probability'):
+        if params.get(name):
+            options[name] = float(params[name])
+    if params.get('fraudulent'):
+        options['fraudulent'] = params['fraudulent'].lower() in ('1', 'true', 'yes')
+    if params.get('days'):
+        options['days'] = int(params['days'])
+        # Further back than date.min would overflow the date arithmetic
+        if not 0 <= options['days'] <= (date.today() - date.min).days:
+            raise ValueError("days out of range")
+    for name, option in (('from', 'date_from'), ('to', 'date_to')):
+        if params.get(name):
+            options[option] = date.fromisoformat(params[name])
+    max_limit = getattr(settings, 'STATEMENT_QUERY_MAX_LIMIT', 1000)
+    options['limit'] = min(int(params.get('limit') or 100), max_limit)
+    if options['limit'] < 1:
+        raise ValueError("limit must be at least 1")
+    return options
+
+
+def account_statements(request, account_id):
+    if request.method != 'GET':
+        return JsonResponse({
+            'message': 'Method not allowed'
+        }, status=405)
+
+    statements = Statement.objects.filter(account_id=account_id)
+    return JsonResponse({
+        'account_id': account_id,
+        'statements': [statement.to_dict() for statement in statements]
+    })
+
+def account_transactions(request, account_id):
+    """
+    Indexed transactions of every statement of an account, e.g. the
+    high-risk transactions over 5000 in the last 90 days with
+    ?min_amount=5000&fraudulent=true&days=90
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'message': 'Method not allowed'
+        }, status=405)
+
+    try:
+        options = _query_options(request.GET)
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({
+            'message': f'Invalid query: {str(e)}'
+        }, status=400)
+
+    transactions = query_transactions(account_id, **options)
+    return JsonResponse({
+        'account_id': account_id,
+        'count': len(transactions),
+        'transactions': [transaction.to_dict() for transaction in transactions]
+    })